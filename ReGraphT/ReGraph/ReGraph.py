@@ -1,9 +1,25 @@
 import json
+import math
+import heapq
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import Callable, Optional, Union
+
+from .code_store import CodeStore
+from .packed import write_packed, read_packed, is_packed
 
 __all__ = ['ReGraphEdge', 'ReGraphNode', 'ReGraph']
 
+# Version of the serialized graph format. Version 1 (no "version" key) inlines the `before` and
+# `after` code of every example; version 2 stores them by digest in a shared "code" table.
+REGRAPH_FORMAT_VERSION = 2
+
+# Scores `top_k_successors` can rank edges by, cached per node
+SUCCESSOR_SCORES: dict[str, Callable[['ReGraph', 'ReGraphEdge'], float]] = {
+    'support': lambda re_graph, edge: len(edge.examples),
+    'probability': lambda re_graph, edge: re_graph.transition_probability(edge),
+}
+
 @dataclass
 class ReGraphEdge(object):
     """ReGraphEdge denotes the state transition between two distinct optimization methods.
@@ -26,11 +42,15 @@ class ReGraphNode(object):
     name: Name of the optimization method
     in_edges: `ReGraphEdge` instances that terminate at this node
     out_edges: `ReGraphEdge` instances that originate from this node
+    support: Number of examples on the edges leaving this node, maintained by ReGraph
+    depth: Fewest transitions from the initial state to this node, None if unreachable, maintained by ReGraph
     """
     index: int
     name: str
     in_edges: list[ReGraphEdge] = field(default_factory=list) 
     out_edges: list[ReGraphEdge] = field(default_factory=list) 
+    support: int = 0
+    depth: Optional[int] = None
     
     def __str__(self):
         return f'{self.index} {self.name}'
@@ -73,40 +93,271 @@ class ReGraph(object):
         # Current state in ReGraph
         self.state = self.init_state
         
+        # Graphs loaded from a packed file are read-only, their examples are fetched on demand
+        self.read_only = False
+        
+        # Indices for constant-time lookup, kept in sync by `add_node` and `add_edge`
+        self.node_map: dict[str, ReGraphNode] = {}
+        self.edge_map: dict[tuple[int, int], ReGraphEdge] = {}
+        self.reindex()
+        
+        # Ranked successors per node index and score name, see `top_k_successors`
+        self.successor_cache: dict[int, dict[str, list[tuple[ReGraphEdge, float]]]] = {}
+        self.compute_statistics()
+        
+        # Array-backed view built by `to_csr`, dropped whenever the graph changes
+        self.csr = None
+        
+        # Most probable optimization paths from the initial state, see `compute_paths`.
+        # Loaded from the graph file or computed on first use, and recomputed in full on the first use
+        # after a change (see `get_paths`)
+        self.paths: Optional[dict] = None
+        self.paths_dirty = True
+        
+        # Similarity index over the examples of each edge, built by `get_example_index`
+        self.example_index = None
+        
     def reset(self):
         """
         Reset the current traversal state to the initial state.
         """
         self.state = self.init_state
         
+    def reindex(self):
+        """
+        Rebuild the name -> node and (src, tgt) -> edge indices from the node and edge lists.
+        The first node (edge) wins on duplicates, matching a linear scan.
+        """
+        self.node_map = {}
+        for node in self.regraph_nodes:
+            self.node_map.setdefault(node.name, node)
+        self.edge_map = {}
+        for edge in self.regraph_edges:
+            self.edge_map.setdefault((edge.src, edge.tgt), edge)
+        
+    def compute_statistics(self):
+        """
+        Recompute the support and depth of every node from scratch. `merge` keeps them up to date
+        incrementally afterwards.
+        """
+        for node in self.regraph_nodes:
+            node.support = 0
+            node.depth = None
+        for edge in self.regraph_edges:
+            self.regraph_nodes[edge.src].support += len(edge.examples)
+        self.init_state.depth = 0
+        self.update_depth(self.init_state)
+        self.successor_cache = {}
+
+    def update_depth(self, node: ReGraphNode):
+        """
+        Propagate the depth of a node to its successors, breadth-first, wherever it shortens their path.
+        The cached rankings of the predecessors of every node whose depth changed are dropped, for scores
+        that depend on the depth of an edge's target.
+        """
+        queue = deque([node])
+        while len(queue) > 0:
+            node = queue.popleft()
+            for edge in node.in_edges:
+                self.successor_cache.pop(edge.src, None)
+            for edge in node.out_edges:
+                successor = self.regraph_nodes[edge.tgt]
+                if successor.depth is None or successor.depth > node.depth + 1:
+                    successor.depth = node.depth + 1
+                    queue.append(successor)
+
+    def transition_probability(self, edge: ReGraphEdge) -> float:
+        """
+        Estimated probability of following an edge from its source, i.e. its share of the source's examples.
+        """
+        support = self.regraph_nodes[edge.src].support
+        return len(edge.examples) / support if support > 0 else 0.0
+
+    def top_k_successors(
+        self,
+        node: Union[ReGraphNode, int, None]=None,
+        k: int=1,
+        score: Union[str, Callable[[ReGraphEdge], float]]='support'
+    ) -> list[tuple[ReGraphEdge, float]]:
+        """
+        Return the `k` best edges leaving a node (the current state by default) with their scores, best first.
+        score: "support" (number of examples), "probability" (transition probability), or a function of
+            an edge. Rankings by name are cached per node until `merge` touches the node or the depth of one
+            of its successors changes; rankings by function are computed on every call
+        """
+        if node is None:
+            node = self.state
+        elif isinstance(node, int):
+            node = self.regraph_nodes[node]
+        if callable(score):
+            return self.rank_successors(node, score)[:k]
+        rankings = self.successor_cache.setdefault(node.index, {})
+        ranking = rankings.get(score)
+        if ranking is None:
+            scorer = SUCCESSOR_SCORES[score]
+            ranking = self.rank_successors(node, lambda edge: scorer(self, edge))
+            rankings[score] = ranking
+        return ranking[:k]
+
+    def rank_successors(self, node: ReGraphNode, score: Callable[[ReGraphEdge], float]) -> list[tuple[ReGraphEdge, float]]:
+        # An edge can appear more than once in `out_edges` of a graph loaded with duplicate edges
+        edges = list({id(edge): edge for edge in node.out_edges}.values())
+        ranking = [(edge, score(edge)) for edge in edges]
+        ranking.sort(key=lambda item: item[1], reverse=True)
+        return ranking
+
+    def compute_paths(self, k: int=5) -> dict:
+        """
+        Compute the `k` most probable complete optimization paths from the initial state, and the `k` most
+        probable paths from the initial state to every node, under the transition model of the examples:
+        a trajectory arriving at a node follows each out-edge with probability examples(edge) / arrivals(node)
+        and stops there with the remaining probability. Paths are found best-first and never revisit a node.
+        Each node is expanded at most `k` times, by its `k` most probable paths, which bounds the search to
+        O(k * edges) pushes. On an acyclic graph this is exact. On a graph with cycles, a simple path that
+        only extends the (k+1)-th most probable path to some node is missed when the `k` better paths to
+        that node cannot extend to its target without revisiting a node.
+        Returns {"k": k, "top": [path, ...], "to": [[path, ...] per node index]}, where a path is
+        {"nodes": [node index, ...], "probability": float, "support": fewest examples along the path}.
+        """
+        # Trajectories arriving at each node; every merged trajectory starts at the initial state
+        arrivals = [0] * len(self.regraph_nodes)
+        for edge in self.regraph_edges:
+            arrivals[edge.tgt] += len(edge.examples)
+        arrivals[self.init_state.index] += self.init_state.support
+        out_edges = [list({id(edge): edge for edge in node.out_edges}.values()) for node in self.regraph_nodes]
+
+        top = []
+        to = [[] for _ in self.regraph_nodes]
+        expanded = [0] * len(self.regraph_nodes)
+        # (cost, tie-breaker, nodes, support, complete), cost being the negative log-probability
+        heap = [(0.0, 0, (self.init_state.index,), math.inf, False)]
+        counter = 1
+        while len(heap) > 0:
+            cost, _, nodes, support, complete = heapq.heappop(heap)
+            path = {"nodes": list(nodes), "probability": math.exp(-cost), "support": support if support != math.inf else 0}
+            if complete:
+                if len(top) < k:
+                    top.append(path)
+                continue
+            index = nodes[-1]
+            if expanded[index] >= k:
+                continue
+            expanded[index] += 1
+            to[index].append(path)
+            total = max(arrivals[index], self.regraph_nodes[index].support)
+            if total == 0:
+                continue
+            stops = total - self.regraph_nodes[index].support
+            if stops > 0 and len(nodes) > 1:
+                heapq.heappush(heap, (cost - math.log(stops / total), counter, nodes, support, True))
+                counter += 1
+            for edge in out_edges[index]:
+                if len(edge.examples) == 0 or edge.tgt in nodes:
+                    continue
+                heapq.heappush(heap, (
+                    cost - math.log(len(edge.examples) / total), counter,
+                    nodes + (edge.tgt,), min(support, len(edge.examples)), False
+                ))
+                counter += 1
+        return {"k": k, "top": top, "to": to}
+
+    def get_paths(self, k: int=5) -> dict:
+        """
+        Return the paths of `compute_paths`, recomputing them only if the graph changed or more paths are asked for.
+        Paths are not refreshed incrementally after a `merge`: every merged trajectory starts at the initial
+        state, whose support it changes, so the probability of every path changes with it. Instead a `merge`
+        marks the paths stale and they are recomputed once on their next use, however many merges came in between.
+        """
+        if self.paths is None or self.paths_dirty or self.paths['k'] < k:
+            self.paths = self.compute_paths(k=max(k, self.paths['k'] if self.paths is not None else k))
+            self.paths_dirty = False
+        return self.paths
+
+    def most_supported_paths(self, k: int=5) -> list[dict]:
+        """
+        Return the `k` most probable complete optimization paths from the initial state, most probable first.
+        """
+        return self.get_paths(k)['top'][:k]
+
+    def most_probable_paths_to(self, node: Union[ReGraphNode, int], k: int=5) -> list[dict]:
+        """
+        Return the `k` most probable paths from the initial state to a node, most probable first.
+        These are the `k` shortest paths under the negative log-probability of their transitions,
+        up to the expansion bound of `compute_paths`.
+        """
+        if isinstance(node, ReGraphNode):
+            node = node.index
+        return self.get_paths(k)['to'][node][:k]
+
     @staticmethod
     def from_graph(graph: dict):
         """
         Construct a ReGraph object from a JSON-compatible dictionary.
+
+        Edges are grouped by (src, tgt) once, so loading is linear in the size of the graph.
+        When the edge table holds several edges with the same (src, tgt), each entry of a node's
+        `in` list wires only the first of them, while each entry of its `out` list wires all of
+        them in edge-table order.
+
+        Both the legacy format with inline example code and the version 2 format with a
+        content-addressed "code" table are accepted.
         """
         nodes = graph['node']
         edges = graph['edge']
+        code_store = None
+        if graph.get('version', 1) >= 2:
+            code_store = CodeStore.from_dict(graph['code'])
         regraph_nodes = []
         regraph_edges = []
+        edge_groups: dict[tuple[int, int], list[ReGraphEdge]] = {}
         for edge in edges:
-            regraph_edge = ReGraphEdge(src=edge['src'], tgt=edge['tgt'], examples=edge['examples'])
+            examples = edge['examples']
+            if code_store is not None:
+                examples = [
+                    {**example, "before": code_store.get(example['before']), "after": code_store.get(example['after'])}
+                    for example in examples
+                ]
+            regraph_edge = ReGraphEdge(src=edge['src'], tgt=edge['tgt'], examples=examples)
             regraph_edges.append(regraph_edge)
+            edge_groups.setdefault((regraph_edge.src, regraph_edge.tgt), []).append(regraph_edge)
         for node in nodes:
             regraph_node = ReGraphNode(node['index'], node['name'])
-            tgt = node['index']                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                 
+            tgt = node['index']
             for src in node['in']:
-                for edge in regraph_edges:
-                    if edge.src == src and edge.tgt == tgt:
-                        regraph_node.in_edges.append(edge)
-                        break
+                group = edge_groups.get((src, tgt))
+                if group:
+                    regraph_node.in_edges.append(group[0])
             src = node['index']
             for tgt in node['out']:
-                for edge in regraph_edges:
-                    if edge.src == src and edge.tgt == tgt:
-                        regraph_node.out_edges.append(edge)
+                regraph_node.out_edges.extend(edge_groups.get((src, tgt), []))
             regraph_nodes.append(regraph_node)
         regraph = ReGraph(regraph_nodes=regraph_nodes, regraph_edges=regraph_edges)
+        if graph.get('paths') is not None and len(graph['paths']['to']) == len(regraph_nodes):
+            regraph.paths = graph['paths']
+            regraph.paths_dirty = False
+        return regraph
+    
+    @staticmethod
+    def from_packed(path: str):
+        """
+        Construct a read-only ReGraph from a packed file written by `save_packed`.
+        Topology and example counts are loaded eagerly, example bodies are read from the
+        memory-mapped file when an edge's examples are first accessed.
+        """
+        regraph = ReGraph.from_graph(read_packed(path))
+        regraph.read_only = True
         return regraph
+
+    @staticmethod
+    def load(path: str):
+        """
+        Load a ReGraph from either a JSON file or a packed file.
+        """
+        if is_packed(path):
+            return ReGraph.from_packed(path)
+        with open(path, 'r') as f:
+            graph = json.load(f)
+        return ReGraph.from_graph(graph)
     
     def __str__(self):
         node_str = f"node:\n{"\n".join((str(node) for node in self.regraph_nodes))}"
@@ -117,82 +368,117 @@ class ReGraph(object):
         """
         Merge an LLM-generated optimization trajectory into the existing ReGraph.
         """
+        if self.read_only:
+            raise RuntimeError("Cannot merge into a read-only ReGraph")
+        self.csr = None
+        self.paths_dirty = True
         state: ReGraphNode = self.init_state
         last_code = code
         for step in trajectory:
-            # 1. Determine whether the current state already has an outgoing edge 
-            # that transitions to the next optimization method
-            merged = False
-            for edge in state.out_edges:
-                tgt: ReGraphNode = self.regraph_nodes[edge.tgt]
-                if tgt.name == step['method']:
-                    merged = True
-                    edge.examples.append({
-                        "name": name,
-                        "think": step['think'],
-                        "detail": step['detail'],
-                        "before": last_code,
-                        "after": step['code']
-                    })
-                    state = tgt # State transition
-                    last_code = step['code']
-                    break
-            # 2. If the current state does not have any edges pointing to an optimized state, 
-            # verify whether the optimization method is present in the current ReGraph
-            if not merged:
-                existed = False
-                optimization_node: ReGraphNode = None
-                for node in self.regraph_nodes:
-                    if node.name == step['method']:
-                        optimization_node = node
-                        existed = True
-                        break
-                # 2.1 When the optimization method is present in the current ReGraph, 
-                # create a new edge
-                if existed:
-                    edge = ReGraphEdge(src=state.index, tgt=optimization_node.index)
-                    edge.add_example({
-                        "name": name,
-                        "think": step['think'],
-                        "detail": step['detail'],
-                        "before": last_code,
-                        "after": step['code']
-                    })
-                    self.regraph_edges.append(edge)
-                    # TODO: Encapsulate the post-edge-addition operations
-                    state.add_out_edge(edge)
-                    optimization_node.add_in_edge(edge)
-                    state = optimization_node
-                    last_code = step['code']
-                # 2.2 When the optimization method is not present in the current ReGraph, 
-                # create it and add a new edge.
-                else:
-                    index = len(self.regraph_nodes)
-                    optimization_node = ReGraphNode(index=index, name=step['method'])
-                    self.regraph_nodes.append(optimization_node)
-                    edge = ReGraphEdge(src=state.index, tgt=optimization_node.index)
-                    # TODO: Encapsulate the post-edge-addition operations
-                    edge.add_example({
-                        "name": name,
-                        "think": step['think'],
-                        "detail": step['detail'],
-                        "before": last_code,
-                        "after": step['code'],
-                    })
-                    state.add_out_edge(edge)
-                    optimization_node.add_in_edge(edge)
-                    state = optimization_node
-                    last_code = step['code']
-
-    def save(self, save_path: str):
+            # 1. Find the optimization method in the current ReGraph, 
+            # create it if it is not present yet
+            optimization_node = self.get_node(step['method'])
+            if optimization_node is None:
+                optimization_node = self.add_node(step['method'])
+            # 2. Reuse the edge from the current state to the optimization method if it exists,
+            # otherwise create a new edge
+            edge = self.get_edge(state.index, optimization_node.index)
+            if edge is None:
+                edge = self.add_edge(state.index, optimization_node.index)
+            example = {
+                "name": name,
+                "think": step['think'],
+                "detail": step['detail'],
+                "before": last_code,
+                "after": step['code']
+            }
+            edge.add_example(example)
+            if self.example_index is not None:
+                self.example_index.add(edge, example)
+            # 3. Update the statistics touched by the new example
+            state.support += 1
+            self.successor_cache.pop(state.index, None)
+            if optimization_node.depth is None or optimization_node.depth > state.depth + 1:
+                optimization_node.depth = state.depth + 1
+                self.update_depth(optimization_node)
+            state = optimization_node # State transition
+            last_code = step['code']
+
+    def union(self, other: 'ReGraph'):
         """
-        Serialize the ReGraph into a JSON file.
+        Add the nodes, edges and examples of another ReGraph, e.g. one built from another shard of the
+        kernels. Nodes are matched by method name, the initial states with each other, and the examples
+        of edges between the same methods are appended to the existing edge.
+        """
+        if self.read_only:
+            raise RuntimeError("Cannot merge into a read-only ReGraph")
+        self.csr = None
+        self.paths_dirty = True
+        nodes = {other.init_state.index: self.init_state}
+        for node in other.regraph_nodes:
+            if node.index not in nodes:
+                nodes[node.index] = self.get_node(node.name) or self.add_node(node.name)
+        for other_edge in other.regraph_edges:
+            src, tgt = nodes[other_edge.src].index, nodes[other_edge.tgt].index
+            edge = self.get_edge(src, tgt)
+            if edge is None:
+                edge = self.add_edge(src, tgt)
+            for example in other_edge.examples:
+                edge.add_example(example)
+                if self.example_index is not None:
+                    self.example_index.add(edge, example)
+        self.compute_statistics()
+
+    def add_node(self, name: str) -> ReGraphNode:
+        """
+        Append a new optimization method to ReGraph.
+        """
+        node = ReGraphNode(index=len(self.regraph_nodes), name=name)
+        self.regraph_nodes.append(node)
+        self.node_map.setdefault(name, node)
+        self.csr = None
+        self.paths_dirty = True
+        return node
+
+    def add_edge(self, src: int, tgt: int) -> ReGraphEdge:
+        """
+        Append a new edge between two existing nodes and wire it into their adjacency lists.
+        """
+        edge = ReGraphEdge(src=src, tgt=tgt)
+        self.regraph_edges.append(edge)
+        self.regraph_nodes[src].add_out_edge(edge)
+        self.regraph_nodes[tgt].add_in_edge(edge)
+        self.edge_map.setdefault((src, tgt), edge)
+        self.csr = None
+        return edge
+
+    def get_node(self, name: str) -> Optional[ReGraphNode]:
+        """
+        Retrieve a node by its optimization method name.
+        """
+        return self.node_map.get(name)
+
+    def get_edge(self, src: int, tgt: int) -> Optional[ReGraphEdge]:
+        """
+        Retrieve the edge from node `src` to node `tgt`.
+        """
+        return self.edge_map.get((src, tgt))
+
+    def to_graph(self, inline: bool=False) -> dict:
+        """
+        Convert the ReGraph into a JSON-compatible dictionary.
+        inline: Write the legacy format with the code of every example inlined, instead of
+            referencing it by digest from a deduplicated, compressed "code" table
         """
         re_graph = {
             "node": [],
             "edge": [],
         }
         
+        code_store = None
+        if not inline:
+            re_graph["version"] = REGRAPH_FORMAT_VERSION
+            code_store = CodeStore()
         for node in self.regraph_nodes:
             node_dict = {
                 "index": node.index,
@@ -202,15 +488,67 @@ class ReGraph(object):
             }
             re_graph["node"].append(node_dict)
         for edge in self.regraph_edges:
+            examples = edge.examples
+            if code_store is not None:
+                examples = [
+                    {**example, "before": code_store.put(example['before']), "after": code_store.put(example['after'])}
+                    for example in examples
+                ]
             edge_dict = {
                 "src": edge.src,
                 "tgt": edge.tgt,
-                "examples": edge.examples,
+                "examples": examples,
             }
             re_graph["edge"].append(edge_dict)
-        
+        if code_store is not None:
+            re_graph["code"] = code_store.to_dict()
+        if self.paths is not None and not self.paths_dirty:
+            # Paths are only saved once computed (see `get_paths`), so that checkpoints and journal
+            # compactions do not recompute them after every merge
+            re_graph["paths"] = self.paths
+        return re_graph
+
+    def save(self, save_path: str, inline: bool=False):
+        """
+        Serialize the ReGraph into a JSON file.
+        inline: Write the legacy format with the code of every example inlined
+        """
+        re_graph = self.to_graph(inline=inline)
         with open(save_path, 'w') as f:
             json.dump(re_graph, f, indent=4)
+
+    def save_packed(self, save_path: str):
+        """
+        Serialize the ReGraph into a packed file that `from_packed` can load lazily.
+        """
+        write_packed(self.to_graph(inline=True), save_path)
+        
+    def to_csr(self):
+        """
+        Return a frozen, array-backed `ReGraphCSR` view of the graph for fast adjacency queries and
+        vectorised scoring. The view is built on first use and rebuilt after the graph changes.
+        Requires NumPy.
+        """
+        if self.csr is None:
+            from .csr import ReGraphCSR
+            self.csr = ReGraphCSR(self)
+        return self.csr
+        
+    def get_example_index(self):
+        """
+        Return the `ExampleIndex` ranking the examples of each edge by similarity to a code, created on first use.
+        Edges are indexed on their first query and kept up to date by `merge`. Requires NumPy.
+        """
+        if self.example_index is None:
+            from .example_index import ExampleIndex
+            self.example_index = ExampleIndex()
+        return self.example_index
+
+    def similar_examples(self, edge: ReGraphEdge, code: str, k: int=1) -> list[dict]:
+        """
+        Return the `k` examples of an edge whose `before` code is most similar to `code`, most similar first.
+        """
+        return [example for example, _ in self.get_example_index().query(edge, code, k=k)]
         
     def get_state(self, index: int) -> Optional[ReGraphNode]:
         """
@@ -1 +1,4 @@
-from .ReGraph import ReGraph, ReGraphEdge, ReGraphNode
\ No newline at end of file
+from .ReGraph import ReGraph, ReGraphEdge, ReGraphNode
+from .code_store import CodeStore
+from .journal import ReGraphJournal
+from .method_index import MethodIndex
\ No newline at end of file
@@ -0,0 +1,71 @@
+import base64
+import hashlib
+import zlib
+
+__all__ = ['CodeStore']
+
+class CodeStore(object):
+    def __init__(self):
+        """CodeStore is a content-addressed store for the code snippets referenced by ReGraph examples.
+        Each snippet is kept once under the SHA-256 digest of its text, so the `after` code of one
+        optimization step and the `before` code of the next one share a single entry.
+        codes: Mapping from digest to code
+        """
+        self.codes: dict[str, str] = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, digest: str):
+        return digest in self.codes
+
+    @staticmethod
+    def digest(code: str) -> str:
+        """
+        Compute the content address of a code snippet.
+        """
+        return hashlib.sha256(code.encode('utf-8')).hexdigest()
+
+    def put(self, code: str) -> str:
+        """
+        Add a code snippet to the store and return its digest.
+        """
+        digest = CodeStore.digest(code)
+        self.codes.setdefault(digest, code)
+        return digest
+
+    def get(self, digest: str) -> str:
+        """
+        Retrieve a code snippet by its digest.
+        """
+        return self.codes[digest]
+
+    @staticmethod
+    def compress(code: str) -> str:
+        """
+        Compress a code snippet into a JSON-compatible string (zlib, base64-encoded).
+        """
+        return base64.b64encode(zlib.compress(code.encode('utf-8'))).decode('ascii')
+
+    @staticmethod
+    def decompress(blob: str) -> str:
+        """
+        Inverse of `compress`.
+        """
+        return zlib.decompress(base64.b64decode(blob)).decode('utf-8')
+
+    def to_dict(self) -> dict[str, str]:
+        """
+        Serialize the store into a JSON-compatible dictionary mapping digests to compressed code.
+        """
+        return {digest: CodeStore.compress(code) for digest, code in self.codes.items()}
+
+    @staticmethod
+    def from_dict(blobs: dict[str, str]):
+        """
+        Construct a CodeStore from the dictionary produced by `to_dict`.
+        """
+        store = CodeStore()
+        for digest, blob in blobs.items():
+            store.codes[digest] = CodeStore.decompress(blob)
+        return store
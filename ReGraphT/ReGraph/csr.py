@@ -0,0 +1,144 @@
+from typing import Callable, Optional, Union
+
+import numpy as np
+
+from .ReGraph import ReGraph, ReGraphEdge
+
+__all__ = ['ReGraphCSR']
+
+
+def freeze(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+
+class ReGraphCSR(object):
+    def __init__(
+        self,
+        re_graph: ReGraph,
+        attributes: Optional[dict[str, Callable[[ReGraphEdge], float]]]=None
+    ):
+        """ReGraphCSR is a frozen, array-backed view of a ReGraph. Adjacency is stored in compressed
+        sparse row form, once by source (out-edges) and once by target (in-edges), and edge attributes
+        are NumPy arrays indexed by edge id, the position of the edge in `regraph_edges`. Successor and
+        predecessor queries return array slices, and candidate transitions are scored in bulk instead
+        of walking `ReGraphNode` edge lists. The view does not follow later changes to the graph.
+        re_graph: Graph to build the view from
+        attributes: Extra edge attributes, computed once per edge by the given functions. "count"
+            (number of examples) and "probability" (share of the source's examples) are always built
+        """
+        self.num_nodes = len(re_graph.regraph_nodes)
+        self.num_edges = len(re_graph.regraph_edges)
+        self.names: list[str] = [node.name for node in re_graph.regraph_nodes]
+        self.ids: dict[str, int] = {}
+        for node in re_graph.regraph_nodes:
+            self.ids.setdefault(node.name, node.index)
+
+        edges = re_graph.regraph_edges
+        src = np.fromiter((edge.src for edge in edges), dtype=np.int32, count=self.num_edges)
+        tgt = np.fromiter((edge.tgt for edge in edges), dtype=np.int32, count=self.num_edges)
+        counts = np.fromiter((len(edge.examples) for edge in edges), dtype=np.int64, count=self.num_edges)
+        self.src = freeze(src)
+        self.tgt = freeze(tgt)
+
+        # Out-edges sorted by (src, tgt) and in-edges by (tgt, src), so rows list their neighbours in
+        # ascending order and `edge_ids` can binary search a (src, tgt) pair
+        self.out_edges = freeze(np.lexsort((tgt, src)).astype(np.int32))
+        self.out_offsets = freeze(self.offsets(src))
+        self.out_targets = freeze(tgt[self.out_edges])
+        self.in_edges = freeze(np.lexsort((src, tgt)).astype(np.int32))
+        self.in_offsets = freeze(self.offsets(tgt))
+        self.in_sources = freeze(src[self.in_edges])
+        # Sorted src * num_nodes + tgt keys of the out-edges, for vectorised edge lookup
+        self.keys = freeze(src[self.out_edges].astype(np.int64) * self.num_nodes + self.out_targets)
+
+        # Number of examples leaving each node, and transition probabilities P(tgt | src)
+        self.out_counts = freeze(np.bincount(src, weights=counts, minlength=self.num_nodes).astype(np.int64))
+        totals = self.out_counts[src]
+        probabilities = np.divide(counts, totals, out=np.zeros(self.num_edges), where=totals > 0)
+        self.attributes: dict[str, np.ndarray] = {
+            'count': freeze(counts),
+            'probability': freeze(probabilities),
+        }
+        for name, attribute in (attributes or {}).items():
+            self.attributes[name] = freeze(np.fromiter((attribute(edge) for edge in edges), dtype=np.float64, count=self.num_edges))
+
+    def offsets(self, rows: np.ndarray) -> np.ndarray:
+        offsets = np.zeros(self.num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=self.num_nodes), out=offsets[1:])
+        return offsets
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory held by the arrays of the view.
+        """
+        arrays = [self.src, self.tgt, self.out_edges, self.out_offsets, self.out_targets, self.in_edges,
+                  self.in_offsets, self.in_sources, self.keys, self.out_counts, *self.attributes.values()]
+        return sum(array.nbytes for array in arrays)
+
+    def node_id(self, node: Union[int, str]) -> int:
+        return self.ids[node] if isinstance(node, str) else node
+
+    def successors(self, node: Union[int, str]) -> np.ndarray:
+        """
+        Targets of the out-edges of a node (by index or name), in ascending order.
+        """
+        node = self.node_id(node)
+        return self.out_targets[self.out_offsets[node]:self.out_offsets[node + 1]]
+
+    def predecessors(self, node: Union[int, str]) -> np.ndarray:
+        """
+        Sources of the in-edges of a node (by index or name), in ascending order.
+        """
+        node = self.node_id(node)
+        return self.in_sources[self.in_offsets[node]:self.in_offsets[node + 1]]
+
+    def successor_edges(self, node: Union[int, str]) -> np.ndarray:
+        """
+        Edge ids of the out-edges of a node, aligned with `successors`.
+        """
+        node = self.node_id(node)
+        return self.out_edges[self.out_offsets[node]:self.out_offsets[node + 1]]
+
+    def predecessor_edges(self, node: Union[int, str]) -> np.ndarray:
+        """
+        Edge ids of the in-edges of a node, aligned with `predecessors`.
+        """
+        node = self.node_id(node)
+        return self.in_edges[self.in_offsets[node]:self.in_offsets[node + 1]]
+
+    def edge_ids(self, src, tgt) -> np.ndarray:
+        """
+        Edge ids of (src, tgt) pairs given as scalars or arrays, -1 where there is no edge.
+        Of several edges with the same endpoints, the first one in `regraph_edges` is returned.
+        """
+        keys = np.asarray(src, dtype=np.int64) * self.num_nodes + np.asarray(tgt, dtype=np.int64)
+        if len(self.keys) == 0:
+            return np.full(keys.shape, -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[positions] == keys, self.out_edges[positions], -1)
+
+    def score(self, src, tgt, attribute: str='probability', default: float=0.0) -> np.ndarray:
+        """
+        Score candidate transitions (src, tgt), given as scalars or arrays, by an edge attribute;
+        transitions without an edge score `default`.
+        """
+        edge_ids = self.edge_ids(src, tgt)
+        values = self.attributes[attribute]
+        if len(values) == 0:
+            return np.full(edge_ids.shape, default, dtype=np.float64)
+        return np.where(edge_ids >= 0, values[np.maximum(edge_ids, 0)], default)
+
+    def top_successors(self, node: Union[int, str], k: int, attribute: str='count') -> list[tuple[int, float]]:
+        """
+        Return the `k` successors of a node with the highest edge attribute, as (target, value) pairs.
+        """
+        edge_ids = self.successor_edges(node)
+        values = self.attributes[attribute][edge_ids]
+        if k < len(values):
+            best = np.argpartition(-values, k)[:k]
+        else:
+            best = np.arange(len(values))
+        best = best[np.argsort(-values[best], kind='stable')]
+        return [(int(self.tgt[edge_ids[i]]), float(values[i])) for i in best]
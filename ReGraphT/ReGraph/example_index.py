@@ -0,0 +1,139 @@
+from typing import Optional
+
+import numpy as np
+
+from .ReGraph import ReGraphEdge
+from ReGraphT.utils import tokenize_code
+
+__all__ = ['MinHasher', 'ExampleIndex']
+
+# MinHash permutations are multiply-shift hashes (a * x + b) mod 2^64 >> 32 of 64-bit shingle ids,
+# so a signature fits in 32-bit values and an empty code gets the largest value everywhere
+MINHASH_EMPTY = (1 << 32) - 1
+# Odd multiplier combining the token ids of a shingle into a shingle id
+SHINGLE_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+class EdgeSignatures(object):
+    def __init__(self, edge: ReGraphEdge, num_perm: int):
+        """MinHash signatures of the examples of one edge, in a matrix grown by doubling.
+        edge: Indexed edge, whose first `count` examples have a signature
+        """
+        self.edge = edge
+        self.count = 0
+        self.matrix = np.empty((max(len(edge.examples), 8), num_perm), dtype=np.uint64)
+
+    def append(self, signature: np.ndarray):
+        if self.count == len(self.matrix):
+            self.matrix = np.concatenate([self.matrix, np.empty_like(self.matrix)])
+        self.matrix[self.count] = signature
+        self.count += 1
+
+
+class MinHasher(object):
+    def __init__(self, num_perm: int=64, ngram: int=3, seed: int=0, vocabulary: Optional[dict[str, int]]=None):
+        """MinHasher summarizes a code by a MinHash signature over its token n-grams, so that the share of equal
+        values of two signatures estimates the Jaccard similarity of the codes. Comments and formatting are ignored.
+        num_perm: Number of hash permutations of a signature, the error of the estimated
+            Jaccard similarity is about 1 / sqrt(num_perm)
+        ngram: Number of consecutive tokens of a shingle
+        seed: Seed of the hash permutations
+        vocabulary: Token ids of a saved hasher, signatures are only comparable between hashers sharing them
+        """
+        self.num_perm = num_perm
+        self.ngram = ngram
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(0, 1 << 63, size=(num_perm, 1), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, size=(num_perm, 1), dtype=np.uint64)
+        # Token -> id, shared by all the codes of the hasher
+        self.vocabulary: dict[str, int] = vocabulary if vocabulary is not None else {}
+
+    def shingles(self, code: str) -> np.ndarray:
+        """
+        Distinct ids of the token n-grams of a code, comments and formatting ignored.
+        """
+        tokens = tokenize_code(code)
+        ids = np.fromiter(
+            (self.vocabulary.setdefault(token, len(self.vocabulary)) for token in tokens),
+            dtype=np.uint64,
+            count=len(tokens)
+        )
+        n = min(self.ngram, len(ids))
+        if n == 0:
+            return ids
+        shingles = ids[:len(ids) - n + 1].copy()
+        for i in range(1, n):
+            shingles = shingles * SHINGLE_MULTIPLIER + ids[i:len(ids) - n + 1 + i]
+        return np.unique(shingles)
+
+    def signature(self, code: str) -> np.ndarray:
+        """
+        MinHash signature of a code, the minimum of each hash permutation over its shingles.
+        """
+        shingles = self.shingles(code)
+        if len(shingles) == 0:
+            return np.full(self.num_perm, MINHASH_EMPTY, dtype=np.uint64)
+        return ((self.a * shingles[None, :] + self.b) >> np.uint64(32)).min(axis=1)
+
+
+class ExampleIndex(object):
+    def __init__(self, num_perm: int=64, ngram: int=3, seed: int=0):
+        """ExampleIndex ranks the examples of a ReGraph edge by the similarity of their `before` code
+        to a query code, to pick the demonstration of a prompt. Each example is summarized once by a
+        MinHash signature over the token n-grams of its code, so a query compares one small integer
+        matrix per edge instead of the code itself. Edges are indexed on their first query, and
+        examples merged afterwards are added as they come.
+        num_perm: Number of hash permutations of a signature, the error of the estimated
+            Jaccard similarity is about 1 / sqrt(num_perm)
+        ngram: Number of consecutive tokens of a shingle
+        seed: Seed of the hash permutations
+        """
+        self.hasher = MinHasher(num_perm=num_perm, ngram=ngram, seed=seed)
+        # id(edge) -> signatures of its examples
+        self.edges: dict[int, EdgeSignatures] = {}
+
+    def __len__(self):
+        return len(self.edges)
+
+    def signature(self, code: str) -> np.ndarray:
+        return self.hasher.signature(code)
+
+    def index(self, edge: ReGraphEdge) -> EdgeSignatures:
+        """
+        Return the signatures of an edge's examples, computing those not indexed yet.
+        """
+        signatures = self.edges.get(id(edge))
+        if signatures is None or signatures.edge is not edge:
+            signatures = EdgeSignatures(edge, self.hasher.num_perm)
+            self.edges[id(edge)] = signatures
+        for i in range(signatures.count, len(edge.examples)):
+            signatures.append(self.signature(edge.examples[i]['before']))
+        return signatures
+
+    def add(self, edge: ReGraphEdge, example: dict):
+        """
+        Index an example just added to an edge. Edges that were never queried are left to their first query.
+        """
+        signatures = self.edges.get(id(edge))
+        if signatures is not None and signatures.edge is edge and signatures.count == len(edge.examples) - 1:
+            signatures.append(self.signature(example['before']))
+
+    def query(self, edge: ReGraphEdge, code: str, k: int=1, signature: Optional[np.ndarray]=None) -> list[tuple[dict, float]]:
+        """
+        Return the `k` examples of an edge whose `before` code is most similar to `code`, as (example, similarity)
+        pairs, most similar first. Similarities estimate the Jaccard similarity of the codes' token n-grams.
+        signature: Signature of `code`, to reuse it across the edges of a node
+        """
+        signatures = self.index(edge)
+        if signatures.count == 0:
+            return []
+        if signature is None:
+            signature = self.signature(code)
+        similarities = (signatures.matrix[:signatures.count] == signature).mean(axis=1)
+        if k < signatures.count:
+            best = np.argpartition(-similarities, k)[:k]
+        else:
+            best = np.arange(signatures.count)
+        best = best[np.argsort(-similarities[best], kind='stable')]
+        return [(edge.examples[i], float(similarities[i])) for i in best]
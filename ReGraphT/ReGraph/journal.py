@@ -0,0 +1,122 @@
+import os
+import json
+from typing import Iterable, Iterator, Optional
+
+from .ReGraph import ReGraph
+
+__all__ = ['ReGraphJournal']
+
+class ReGraphJournal(object):
+    def __init__(self, journal_path: str, seq: int=0, indices: Iterable[int]=()):
+        """ReGraphJournal is an append-only log of the trajectories merged into a ReGraph.
+        Each merge appends one JSON line, so checkpointing costs O(new data). `compact` folds
+        the log into a snapshot and truncates it; snapshot + journal rebuild the ReGraph by replay.
+        journal_path: Path of the JSONL journal file
+        seq: Sequence number of the last record already covered by the snapshot
+        indices: Indices of the kernels already merged into the ReGraph
+        """
+        self.journal_path = journal_path
+        self.seq = seq
+        self.indices: set[int] = set(indices)
+        self.file = open(journal_path, 'a')
+
+    def append(self, name: str, code: str, trajectory: list[dict], index: Optional[int]=None):
+        """
+        Record a trajectory merged into the ReGraph, with the same arguments as `ReGraph.merge`.
+        index: Index of the kernel the trajectory was generated for
+        """
+        self.seq += 1
+        if index is not None:
+            self.indices.add(index)
+        record = {
+            "seq": self.seq,
+            "index": index,
+            "name": name,
+            "code": code,
+            "trajectory": trajectory,
+        }
+        self.file.write(json.dumps(record) + '\n')
+
+    def sync(self):
+        """
+        Flush appended records to disk.
+        """
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def compact(self, re_graph: ReGraph, snapshot_path: str):
+        """
+        Atomically write a snapshot of `re_graph` covering every record so far, then truncate the journal.
+        Records that survive a crash between the two steps are skipped on replay by their sequence number.
+        """
+        self.sync()
+        graph = re_graph.to_graph()
+        graph['journal_seq'] = self.seq
+        graph['journal_indices'] = sorted(self.indices)
+        tmp_path = f"{snapshot_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(graph, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, snapshot_path)
+        self.file.seek(0)
+        self.file.truncate()
+        self.sync()
+
+    def close(self):
+        self.file.close()
+
+    @staticmethod
+    def records(journal_path: str) -> Iterator[dict]:
+        """
+        Iterate over the records of a journal. A torn last line left by a crash is ignored.
+        """
+        with open(journal_path, 'r') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    break
+
+    @staticmethod
+    def replay(snapshot_path: Optional[str], journal_path: str) -> tuple[ReGraph, int, set[int]]:
+        """
+        Rebuild a ReGraph from a snapshot and the journal appended after it.
+        Returns the ReGraph, the sequence number of the last record applied and the indices 
+        of the kernels merged so far.
+        """
+        seq = 0
+        indices = set()
+        if snapshot_path is None:
+            re_graph = ReGraph()
+        else:
+            with open(snapshot_path, 'r') as f:
+                graph = json.load(f)
+            re_graph = ReGraph.from_graph(graph)
+            seq = graph.get('journal_seq', 0)
+            indices.update(graph.get('journal_indices', []))
+        if os.path.exists(journal_path):
+            for record in ReGraphJournal.records(journal_path):
+                if record['seq'] <= seq:
+                    continue
+                re_graph.merge(name=record['name'], code=record['code'], trajectory=record['trajectory'])
+                seq = record['seq']
+                if record['index'] is not None:
+                    indices.add(record['index'])
+        return re_graph, seq, indices
+
+    @staticmethod
+    def merge_shards(shards: Iterable[tuple[Optional[str], str]]) -> tuple[ReGraph, set[int]]:
+        """
+        Combine the ReGraphs built on separate shards of the kernels into one, given the snapshot
+        (None if never compacted) and journal path of every shard. Each shard is replayed, then its
+        graph is added with `ReGraph.union`, in the order given.
+        Returns the combined ReGraph and the indices of the kernels merged into any shard.
+        """
+        re_graph = ReGraph()
+        indices = set()
+        for snapshot_path, journal_path in shards:
+            shard_graph, _, shard_indices = ReGraphJournal.replay(snapshot_path=snapshot_path, journal_path=journal_path)
+            re_graph.union(shard_graph)
+            indices.update(shard_indices)
+        return re_graph, indices
@@ -0,0 +1,240 @@
+import re
+import math
+import heapq
+from collections import Counter, defaultdict
+from typing import Optional
+
+from .ReGraph import ReGraph
+
+__all__ = ['MethodIndex']
+
+# Words naming a data type, which distinguish otherwise identical methods (e.g. float vs half loads)
+DTYPE_WORDS = {
+    'float', 'double', 'half', 'int', 'char', 'short', 'long', 'unsigned', 'bool',
+    'fp8', 'fp16', 'fp32', 'fp64', 'bf16', 'tf32', 'int4', 'int8', 'uint8',
+}
+# Inflections stripped before comparing the words of two names, longest first
+SUFFIXES = ('ings', 'ions', 'ing', 'ion', 'es', 'ed', 's', 'e')
+# Growth of the index after which the IDF weights are recomputed
+IDF_REFRESH_GROWTH = 1.25
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercase a text and reduce it to space-separated alphanumeric words.
+    """
+    return ' '.join(re.findall(r'[a-z0-9]+', text.lower()))
+
+
+def stem(word: str) -> str:
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def key_words(name: str) -> set[str]:
+    """
+    Words of a name that must match exactly: numbers, vector widths (float4) and data types.
+    """
+    return {word for word in normalize(name).split() if word in DTYPE_WORDS or any(c.isdigit() for c in word)}
+
+
+def same_words(a: str, b: str) -> bool:
+    """
+    Whether two names only differ in the inflection or the spacing of their words, e.g.
+    "grid stride loops" and "grid-stride loop", but not "shared memory" and "shared memory tiling".
+    """
+    a = [stem(word) for word in normalize(a).split()]
+    b = [stem(word) for word in normalize(b).split()]
+    return sorted(a) == sorted(b) or ''.join(a) == ''.join(b)
+
+
+def same_method(a: str, b: str) -> bool:
+    """
+    Whether two names spell the same method: the same words up to inflection and spacing, and the same
+    numbers and data types.
+    """
+    return same_words(a, b) and key_words(a) == key_words(b)
+
+
+def cosine(a: Counter, b: Counter) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    dot = sum(value * b[key] for key, value in a.items() if key in b)
+    if dot == 0:
+        return 0.0
+    return dot / (math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values())))
+
+
+class MethodIndex(object):
+    def __init__(
+        self,
+        ngram_range: tuple[int, int]=(2, 4),
+        description_weight: float=0.2,
+        accept_threshold: float=0.8,
+        reject_threshold: float=0.4
+    ):
+        """MethodIndex is an offline nearest-method index over the names and descriptions of
+        ReGraph optimization methods, used to relabel trajectory steps without an LLM round-trip.
+        Names are embedded as TF-IDF weighted character n-grams and searched through an inverted
+        index; the best candidates are reranked with the word overlap of their descriptions.
+        ngram_range: Smallest and largest character n-gram length
+        description_weight: Weight of the description similarity in the final score
+        accept_threshold: Score from which a query is relabeled to its nearest method, provided that
+            their names only differ in the inflection or spacing of their words and share their
+            numbers and data types; otherwise it is ambiguous
+        reject_threshold: Score below which a query is considered a new method. Queries scoring
+            in between are ambiguous and should be left to the LLM
+        """
+        self.ngram_range = ngram_range
+        self.description_weight = description_weight
+        self.accept_threshold = accept_threshold
+        self.reject_threshold = reject_threshold
+
+        self.names: list[str] = []
+        self.ids: dict[str, int] = {}
+        self.keys: dict[str, int] = {}
+        self.descriptions: list[Counter] = []
+        # character n-gram -> {method id: term frequency}
+        self.postings: dict[str, dict[int, int]] = defaultdict(dict)
+        # IDF weights of the n-grams and TF-IDF norms of the methods. Weights are a snapshot of the
+        # document frequencies, refreshed whenever the index has grown by IDF_REFRESH_GROWTH, so that
+        # adding a method only computes its own norm
+        self.weights: dict[str, float] = {}
+        self.weights_size = 0
+        self.norms: list[float] = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name: str):
+        return name in self.ids
+
+    @staticmethod
+    def from_regraph(re_graph: ReGraph, max_examples: int=3):
+        """
+        Build a MethodIndex over the nodes of a ReGraph, describing each method by the `detail`
+        of the first `max_examples` examples that transition into it.
+        """
+        index = MethodIndex()
+        for node in re_graph.regraph_nodes:
+            details = []
+            for edge in node.in_edges:
+                for i in range(min(len(edge.examples), max_examples - len(details))):
+                    details.append(edge.examples[i].get('detail', ''))
+                if len(details) >= max_examples:
+                    break
+            index.add(node.name, ' '.join(details))
+        return index
+
+    def ngrams(self, name: str) -> Counter:
+        padded = f' {normalize(name)} '
+        grams = Counter()
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            for i in range(len(padded) - n + 1):
+                grams[padded[i:i + n]] += 1
+        return grams
+
+    def idf(self, gram: str) -> float:
+        weight = self.weights.get(gram)
+        if weight is None:
+            # n-gram unseen when the weights were computed
+            weight = math.log(1 + self.weights_size) + 1
+        return weight
+
+    def norm(self, grams: Counter) -> float:
+        return math.sqrt(sum((tf * self.idf(gram)) ** 2 for gram, tf in grams.items()))
+
+    def add(self, name: str, description: str=""):
+        """
+        Add a method to the index. Adding a name that is already indexed is a no-op.
+        """
+        if name in self.ids:
+            return
+        method_id = len(self.names)
+        self.names.append(name)
+        self.ids[name] = method_id
+        self.keys.setdefault(normalize(name), method_id)
+        self.descriptions.append(Counter(normalize(description).split()))
+        grams = self.ngrams(name)
+        for gram, tf in grams.items():
+            self.postings[gram][method_id] = tf
+        if len(self.names) > self.weights_size * IDF_REFRESH_GROWTH:
+            self.compute_norms()
+        else:
+            self.norms.append(self.norm(grams))
+
+    def compute_norms(self):
+        """
+        Recompute the IDF weights from the current document frequencies, and the norms of all methods.
+        """
+        self.weights_size = len(self.names)
+        self.weights = {
+            gram: math.log((1 + self.weights_size) / (1 + len(posting))) + 1 for gram, posting in self.postings.items()
+        }
+        squares = [0.0] * len(self.names)
+        for gram, posting in self.postings.items():
+            idf = self.weights[gram]
+            for method_id, tf in posting.items():
+                squares[method_id] += (tf * idf) ** 2
+        self.norms = [math.sqrt(square) for square in squares]
+
+    def query(self, name: str, description: str="", k: int=1) -> list[tuple[str, float]]:
+        """
+        Return the `k` indexed methods most similar to a method name and description,
+        as (name, score) pairs with scores in [0, 1].
+        """
+        if len(self.names) == 0:
+            return []
+        # Names that are identical after normalization are the same method
+        method_id = self.keys.get(normalize(name))
+        if method_id is not None:
+            return [(self.names[method_id], 1.0)]
+
+        scores = defaultdict(float)
+        query_norm = 0.0
+        for gram, tf in self.ngrams(name).items():
+            idf = self.idf(gram)
+            query_norm += (tf * idf) ** 2
+            for method_id, method_tf in self.postings.get(gram, {}).items():
+                scores[method_id] += tf * method_tf * idf * idf
+        if query_norm == 0:
+            return []
+        query_norm = math.sqrt(query_norm)
+        candidates = heapq.nlargest(
+            max(k, 5),
+            scores.items(),
+            key=lambda item: item[1]
+        )
+
+        # Rerank the nearest names by the similarity of their descriptions
+        words = Counter(normalize(description).split())
+        results = []
+        for method_id, score in candidates:
+            score = score / (query_norm * self.norms[method_id])
+            if self.description_weight > 0 and len(words) > 0 and len(self.descriptions[method_id]) > 0:
+                score = (1 - self.description_weight) * score + self.description_weight * cosine(words, self.descriptions[method_id])
+            results.append((self.names[method_id], min(score, 1.0)))
+        results.sort(key=lambda item: item[1], reverse=True)
+        return results[:k]
+
+    def resolve(self, name: str, description: str="") -> tuple[str, Optional[str]]:
+        """
+        Decide how to relabel a method name. Returns one of
+        ("yes", <nearest method>): the name refers to an indexed method
+        ("no", None): the name is a new method
+        ("ambiguous", <nearest method>): the index cannot decide
+        """
+        results = self.query(name, description, k=1)
+        if len(results) == 0:
+            return "no", None
+        nearest, score = results[0]
+        if score >= self.accept_threshold:
+            if same_method(name, nearest):
+                return "yes", nearest
+            # Close spellings of different methods, e.g. float2 and float4 loads
+            return "ambiguous", nearest
+        if score < self.reject_threshold:
+            return "no", None
+        return "ambiguous", nearest
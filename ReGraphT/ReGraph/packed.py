@@ -0,0 +1,155 @@
+import json
+import mmap
+import struct
+import zlib
+from collections.abc import Sequence
+from typing import Optional
+
+from .code_store import CodeStore
+
+__all__ = ['PACKED_MAGIC', 'PackedReader', 'PackedExamples', 'write_packed', 'read_packed', 'is_packed']
+
+# Packed ReGraph file layout:
+#   PACKED_MAGIC
+#   code blobs      zlib-compressed UTF-8 code, one per distinct snippet
+#   example blobs   zlib-compressed JSON list with the examples of one edge, code referenced by digest
+#   index           JSON dictionary with the topology and the (offset, length) of every blob
+#   trailer         offset of the index, unsigned 64-bit little-endian
+PACKED_MAGIC = b'REGRAPHP'
+TRAILER = struct.Struct('<Q')
+
+
+class PackedReader(object):
+    def __init__(self, path: str):
+        """PackedReader memory-maps a packed ReGraph file and decodes blobs on demand.
+        Pages are shared through the OS page cache, so many processes reading the same
+        file only pay for the blobs they actually touch.
+        path: Path of the packed ReGraph file
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[:len(PACKED_MAGIC)] != PACKED_MAGIC:
+            raise ValueError(f"{path} is not a packed ReGraph file")
+        (index_offset,) = TRAILER.unpack(self.buffer[-TRAILER.size:])
+        self.index: dict = json.loads(self.buffer[index_offset:-TRAILER.size])
+        self.code_offsets: dict[str, list[int]] = self.index['code']
+
+    def blob(self, offset: int, length: int) -> bytes:
+        return zlib.decompress(self.buffer[offset:offset + length])
+
+    def code(self, digest: str) -> str:
+        """
+        Retrieve a code snippet by its digest.
+        """
+        offset, length = self.code_offsets[digest]
+        return self.blob(offset, length).decode('utf-8')
+
+    def examples(self, offset: int, length: int) -> list[dict]:
+        """
+        Decode the examples of one edge, resolving their code.
+        """
+        examples = json.loads(self.blob(offset, length))
+        for example in examples:
+            example['before'] = self.code(example['before'])
+            example['after'] = self.code(example['after'])
+        return examples
+
+
+class PackedExamples(Sequence):
+    def __init__(self, reader: PackedReader, offset: int, length: int, count: int):
+        """PackedExamples is a read-only, lazily loaded stand-in for `ReGraphEdge.examples`.
+        The number of examples is known up front; the examples themselves are decoded from
+        the packed file on first access and kept afterwards.
+        """
+        self.reader = reader
+        self.offset = offset
+        self.length = length
+        self.count = count
+        self.loaded: Optional[list[dict]] = None
+
+    def load(self) -> list[dict]:
+        if self.loaded is None:
+            self.loaded = self.reader.examples(self.offset, self.length)
+        return self.loaded
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return self.load()[index]
+
+    def __eq__(self, other):
+        if isinstance(other, PackedExamples):
+            other = other.load()
+        return self.load() == other
+
+    def __repr__(self):
+        return f'PackedExamples(count={self.count})'
+
+
+def write_packed(graph: dict, save_path: str):
+    """
+    Write a graph dictionary with inline example code (see `ReGraph.to_graph(inline=True)`)
+    into a packed ReGraph file.
+    """
+    code_offsets: dict[str, list[int]] = {}
+    edges = []
+    with open(save_path, 'wb') as f:
+        f.write(PACKED_MAGIC)
+
+        def put_code(code: str) -> str:
+            digest = CodeStore.digest(code)
+            if digest not in code_offsets:
+                blob = zlib.compress(code.encode('utf-8'))
+                code_offsets[digest] = [f.tell(), len(blob)]
+                f.write(blob)
+            return digest
+
+        for edge in graph['edge']:
+            examples = [
+                {**example, "before": put_code(example['before']), "after": put_code(example['after'])}
+                for example in edge['examples']
+            ]
+            blob = zlib.compress(json.dumps(examples).encode('utf-8'))
+            edges.append({
+                "src": edge['src'],
+                "tgt": edge['tgt'],
+                "count": len(examples),
+                "offset": f.tell(),
+                "length": len(blob),
+            })
+            f.write(blob)
+
+        index = {key: value for key, value in graph.items() if key not in ('edge', 'code', 'version')}
+        index['edge'] = edges
+        index['code'] = code_offsets
+        index_offset = f.tell()
+        f.write(json.dumps(index).encode('utf-8'))
+        f.write(TRAILER.pack(index_offset))
+
+
+def read_packed(path: str) -> dict:
+    """
+    Read the topology of a packed ReGraph file into a graph dictionary accepted by
+    `ReGraph.from_graph`, with `PackedExamples` in place of the example lists.
+    """
+    reader = PackedReader(path)
+    graph = {key: value for key, value in reader.index.items() if key not in ('edge', 'code')}
+    graph['edge'] = [
+        {
+            "src": edge['src'],
+            "tgt": edge['tgt'],
+            "examples": PackedExamples(reader, edge['offset'], edge['length'], edge['count']),
+        }
+        for edge in reader.index['edge']
+    ]
+    return graph
+
+
+def is_packed(path: str) -> bool:
+    """
+    Check whether a file is a packed ReGraph file.
+    """
+    with open(path, 'rb') as f:
+        return f.read(len(PACKED_MAGIC)) == PACKED_MAGIC
@@ -3,21 +3,29 @@ import sys
 import json
 import re
 import copy
+import time
 import argparse
 import logging
-from typing import Optional
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional
 
 from openai import OpenAI
 
 from ReGraphT.ReGraph import (
     ReGraph, 
     ReGraphNode, 
-    ReGraphEdge
+    ReGraphEdge,
+    ReGraphJournal,
+    MethodIndex
 )
+from ReGraphT.ReGraph.method_index import normalize, same_method
 from ReGraphT.prompt import (
     CUDA_REASONING_SYSTEM_PROMPT,
     CUDA_RELABEL_SYSTEM_PROMPT
 )
+from ReGraphT.engine.scheduler import Scheduler, estimate_tokens
+from ReGraphT.utils import ResponseCache, MetricsRecorder, read_jsonl, parse_shard, get_recorder, set_recorder
 
 logging.basicConfig(
     level=logging.INFO,
@@ -26,17 +34,89 @@ logging.basicConfig(
     filemode="a",
 )
 
+# Retries are left to the scheduler, which also enforces the rate limits
 client = OpenAI(
     api_key=os.environ['OPENAI_API_KEY'], 
-    base_url=os.environ['BASE_URL']
+    base_url=os.environ['BASE_URL'],
+    max_retries=0
 )
 
+def complete(
+    messages: list[dict],
+    model: str,
+    temperature: float,
+    max_tokens: int,
+    top_p: float,
+    cache: Optional[ResponseCache]=None,
+    index: Optional[int]=None,
+    stage: str="",
+    scheduler: Optional[Scheduler]=None
+) -> str:
+    """Send a chat completion request and return the generated content.
+    With a cache, the raw response is keyed by stage, kernel index, model, prompt hash and 
+    sampling parameters, and reused instead of calling the LLM again.
+    With a scheduler, the request is sent within its rate limits and retried on transient errors.
+    Every call is recorded by the metrics recorder under `stage`.
+    """
+    start = time.perf_counter()
+    key = None
+    if cache is not None:
+        key = ResponseCache.make_key(
+            stage=stage,
+            index=index,
+            model=model,
+            prompt=ResponseCache.digest(messages),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=top_p
+        )
+        content = cache.get(key)
+        if content is not None:
+            logging.info(f"{index} {stage} cache hit")
+            get_recorder().record("llm_call", stage, tags={"index": index}, latency=time.perf_counter() - start, cache_hit=1)
+            return content
+    if scheduler is None:
+        scheduler = Scheduler(max_retries=0)
+    try:
+        response = scheduler.call(
+            lambda: client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_p=top_p
+            ),
+            tokens=estimate_tokens(messages, max_tokens),
+            usage=lambda response: response.usage.total_tokens if response.usage else None
+        )
+    except Exception as e:
+        get_recorder().record("llm_call", stage, tags={"index": index, "error_type": type(e).__name__}, latency=time.perf_counter() - start, cache_hit=0, retries=scheduler.last_retries(), error=1)
+        raise
+    content = response.choices[0].message.content
+    usage = response.usage
+    get_recorder().record(
+        "llm_call",
+        stage,
+        tags={"index": index},
+        latency=time.perf_counter() - start,
+        cache_hit=0,
+        retries=scheduler.last_retries(),
+        prompt_tokens=usage.prompt_tokens if usage else None,
+        generation_tokens=usage.completion_tokens if usage else None
+    )
+    if cache is not None:
+        cache.put(key, content)
+    return content
+
+
 def reason(
     kernel: dict, 
     model: str, 
     temperature: float=0.7,
     max_tokens: int=8192,
-    top_p: float=0.9
+    top_p: float=0.9,
+    cache: Optional[ResponseCache]=None,
+    scheduler: Optional[Scheduler]=None
 ) -> Optional[list[dict]]:
     """Perform reasoning on a single CUDA kernel using the LLM.
     Returns a trajectory of optimization steps.
@@ -45,90 +125,219 @@ def reason(
         "kernel": kernel['kernel']
     }
     logging.info(f"{kernel['index']} Kernel: {kernel['name']}, reasoning start")
-    response = client.chat.completions.create(
-        model=model,
+    content = complete(
         messages=[
             {"role": "system", "content": CUDA_REASONING_SYSTEM_PROMPT},
             {"role": "user", "content": json.dumps(code)}
         ],
+        model=model,
         temperature=temperature,
         max_tokens=max_tokens,
-        top_p=top_p
+        top_p=top_p,
+        cache=cache,
+        index=kernel['index'],
+        stage="reason",
+        scheduler=scheduler
     )
     pattern = r'```json\n(.*?)\n```'
-    content = response.choices[0].message.content
     matches = re.findall(pattern, content, re.DOTALL)
-    if matches is None:
+    if len(matches) == 0:
         logging.error(f"Error in {kernel['index']} kernel {kernel['name']}: No matches trajectory found.")
+        get_recorder().record("parse", "reason", tags={"index": kernel['index']}, failure=1)
         return None
     
-    trajectory = json.loads(matches[0])
+    try:
+        trajectory = json.loads(matches[0])
+    except json.JSONDecodeError as e:
+        logging.error(f"Error in {kernel['index']} kernel {kernel['name']}: {e}")
+        get_recorder().record("parse", "reason", tags={"index": kernel['index']}, failure=1)
+        return None
+    get_recorder().record("parse", "reason", tags={"index": kernel['index']}, failure=0)
     logging.info(f"{kernel['index']} Kernel: {kernel['name']}, reasoning end")
     
     return trajectory
 
 
+def reason_in_order(
+    kernels: Iterable[dict],
+    concurrency: int,
+    **kwargs
+) -> Iterator[tuple[dict, Future]]:
+    """Run `reason` for many kernels concurrently, with at most `concurrency` requests in flight.
+    Yields (kernel, future) pairs in kernel order, so that the caller can relabel and merge the
+    trajectories one at a time in a reproducible order.
+    """
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending: deque[tuple[dict, Future]] = deque()
+        for kernel in kernels:
+            pending.append((kernel, pool.submit(reason, kernel=kernel, **kwargs)))
+            # Keep a few requests queued behind the oldest one, so that a slow kernel at 
+            # the head does not leave the other workers idle
+            if len(pending) >= 2 * concurrency:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+
+
 def relabel(
-    trajectory: dict, 
+    trajectories: list[list[dict]], 
     re_graph: ReGraph, 
+    labels: dict[str, str],
     model: str, 
     temperature: float=0.7,
     max_tokens: int=8192,
-    top_p: float=0.9
-) -> dict:
+    top_p: float=0.9,
+    cache: Optional[ResponseCache]=None,
+    indices: Optional[list[int]]=None,
+    method_index: Optional[MethodIndex]=None,
+    scheduler: Optional[Scheduler]=None
+) -> list[Optional[list[dict]]]:
     """
-    Relabel the optimization trajectory according to existing methods in ReGraph.
+    Relabel a batch of optimization trajectories according to existing methods in ReGraph.
+    `labels` caches the canonical name of every method name seen so far. Only method names that
+    are neither cached nor already in ReGraph are relabeled. With a `method_index`, those are first
+    looked up offline and only the ambiguous ones are sent to the LLM, in one request for the whole
+    batch and without the step code. Returns the relabeled trajectories, or None for those that
+    could not be relabeled.
     """
+    # Collect the unseen method names of the batch, each with one description of how it is used
+    unseen = {}
+    for trajectory in trajectories:
+        for step in trajectory:
+            method = step['method']
+            if method in labels or re_graph.get_node(method) is not None:
+                continue
+            unseen.setdefault(method, step['detail'])
     
-    trajectory_ = copy.deepcopy(trajectory)
-    methods = []
-    for re_graph_node in re_graph.regraph_nodes:
-        methods.append(re_graph_node.name)
-    data = {
-        "methods": methods,
-        "process": trajectory
-    }
-    logging.info(f"trajectory relabel start")
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": CUDA_RELABEL_SYSTEM_PROMPT},
-            {"role": "user", "content": json.dumps(data)}
-        ],
-        temperature=temperature,
-        max_tokens=max_tokens,
-        top_p=top_p
-    )
-    
-    pattern = r'```json\n(.*?)\n```'
-    content = response.choices[0].message.content
-    matches = re.findall(pattern, content, re.DOTALL)
-    if matches is None:
-        logging.error(f"Error in relabel: No matches relabels found.")
-        return None
-    
-    labels = json.loads(matches[0])
+    # Resolve the names the offline method index is confident about, new methods are 
+    # indexed right away so that later names of the batch can match them
+    aliases = {}
+    if method_index is not None:
+        ambiguous = {}
+        for method, detail in list(unseen.items()):
+            existed, nearest = method_index.resolve(method, detail)
+            if existed == "yes":
+                labels[method] = nearest
+            elif existed == "no":
+                labels[method] = method
+                method_index.add(method, detail)
+            elif normalize(method) in ambiguous:
+                # Spelling variant of an ambiguous name already sent to the LLM
+                aliases[method] = ambiguous[normalize(method)]
+            else:
+                ambiguous[normalize(method)] = method
+                continue
+            del unseen[method]
     
-    if len(labels) != len(trajectory_):
-        logging.error(f"Error in relabel: The length of relabels is not equal to the length of trajectory.")
-        return None
+    if len(unseen) > 0:
+        methods = []
+        for re_graph_node in re_graph.regraph_nodes:
+            methods.append(re_graph_node.name)
+        data = {
+            "methods": methods,
+            "process": [{"method": method, "detail": detail} for method, detail in unseen.items()]
+        }
+        logging.info(f"trajectory relabel start, {len(trajectories)} trajectories, {len(unseen)} unseen methods")
+        content = complete(
+            messages=[
+                {"role": "system", "content": CUDA_RELABEL_SYSTEM_PROMPT},
+                {"role": "user", "content": json.dumps(data)}
+            ],
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=top_p,
+            cache=cache,
+            index=indices,
+            stage="relabel",
+            scheduler=scheduler
+        )
+        
+        pattern = r'```json\n(.*?)\n```'
+        matches = re.findall(pattern, content, re.DOTALL)
+        if len(matches) == 0:
+            logging.error(f"Error in relabel: No matches relabels found.")
+            get_recorder().record("parse", "relabel", tags={"index": indices}, failure=1)
+            return [None] * len(trajectories)
+        
+        relabels = json.loads(matches[0])
+        
+        if len(relabels) != len(unseen):
+            logging.error(f"Error in relabel: The length of relabels is not equal to the number of unseen methods.")
+            get_recorder().record("parse", "relabel", tags={"index": indices}, failure=1)
+            return [None] * len(trajectories)
+        get_recorder().record("parse", "relabel", tags={"index": indices}, failure=0)
+        
+        # Cache the canonical names, a method that is not in ReGraph yet keeps its own name.
+        # The LLM only compared the names with the methods already in ReGraph, so the new methods
+        # of the batch are resolved against each other to merge spelling variants into one node
+        existed = set(methods)
+        new_methods = MethodIndex()
+        for method, label in zip(unseen, relabels):
+            if label['existed'] == 'yes':
+                if label['method'] not in existed:
+                    logging.error(f"Error in relabel: The relabel method {label['method']} is not in the existed methods.")
+                    continue
+                labels[method] = label['method']
+            elif label['existed'] == 'no':
+                resolved, nearest = new_methods.resolve(method, unseen[method])
+                # All of them are new, so a name spelling the same words as a nearby one is a variant
+                # of it even when their n-grams differ more than `resolve` accepts, e.g. "loop unroll"
+                if resolved == 'yes' or (resolved == 'ambiguous' and same_method(method, nearest)):
+                    labels[method] = nearest
+                    continue
+                new_methods.add(method, unseen[method])
+                labels[method] = method
+                if method_index is not None:
+                    method_index.add(method, unseen[method])
+        for alias, method in aliases.items():
+            if method in labels:
+                labels[alias] = labels[method]
+        logging.info(f"trajectory relabel end")
     
-    # Apply relabels to trajectory
-    for idx, label in enumerate(labels):
-        if label['existed'] == 'yes':
-            if label['method'] not in methods:
-                logging.error(f"Error in relabel: The relabel method {label['method']} is not in the existed methods.")
-                return None
-            trajectory_[idx]['method'] = label['method']
-        elif label['existed'] == 'no':
-            pass
-    logging.info(f"trajectory relabel end")
-    return trajectory_
+    # Apply relabels to trajectories
+    trajectories_ = []
+    for trajectory in trajectories:
+        trajectory_ = copy.deepcopy(trajectory)
+        for step in trajectory_:
+            if re_graph.get_node(step['method']) is not None:
+                continue
+            if step['method'] not in labels:
+                trajectory_ = None
+                break
+            step['method'] = labels[step['method']]
+        trajectories_.append(trajectory_)
+    return trajectories_
+
+
+def reasoned_batches(
+    reasoned: Iterable[tuple[dict, Future]],
+    batch_size: int
+) -> Iterator[list[tuple[dict, list[dict]]]]:
+    """
+    Collect the trajectories of successfully reasoned kernels into batches of `batch_size`, in kernel order.
+    """
+    batch = []
+    for kernel, future in reasoned:
+        # 1. Generate optimization trajectory using LLM
+        try:
+            trajectory = future.result()
+        except Exception as e:
+            logging.error(f"Error in {kernel['index']} kernel {kernel['name']}: {e}")
+            continue
+        if trajectory is None:
+            continue
+        batch.append((kernel, trajectory))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
 
 
-def merge(kernel: dict, trajectory: list[dict], re_graph: ReGraph):
+def merge(kernel: dict, trajectory: list[dict], re_graph: ReGraph, journal: Optional[ReGraphJournal]=None):
     """
-    Merge a kernel's trajectory into the current ReGraph.
+    Merge a kernel's trajectory into the current ReGraph, and record it in the journal.
     """
     name = kernel['name']
     code = kernel['kernel']
@@ -136,38 +345,92 @@ def merge(kernel: dict, trajectory: list[dict], re_graph: ReGraph):
     
     logging.info(f"{index} kernel: {name} merge start")
     re_graph.merge(name=name, code=code, trajectory=trajectory)
+    if journal is not None:
+        journal.append(name=name, code=code, trajectory=trajectory, index=index)
     logging.info(f"{index} kernel: {name} merge end")
     
     
-def save_re_graph(re_graph: ReGraph, save_dir: str, prefix: str, steps: int, final: bool=False):
+def save_re_graph(re_graph: ReGraph, save_dir: str, prefix: str, steps: int):
     """
-    Save the ReGraph to a JSON file.
+    Save the final ReGraph to a JSON file. Intermediate states are checkpointed by the journal instead.
     """
-    if not final:
-        save_path = os.path.join(save_dir, f"{prefix}_{steps}.json")
-    else:
-        save_path = os.path.join(save_dir, f"{prefix}_final.json")
+    save_path = os.path.join(save_dir, f"{prefix}_final.json")
     logging.info(f"ReGraph save steps: {steps}, save path: {save_path}")
+    # The final ReGraph carries its most probable paths, so that reasoners load them precomputed
+    re_graph.get_paths()
     re_graph.save(save_path=save_path)
     logging.info(f"ReGraph save finished")
+
+
+def save_labels(labels: dict[str, str], labels_path: str):
+    """
+    Save the method name relabel cache to a JSON file.
+    """
+    tmp_path = f"{labels_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(labels, f, indent=4)
+    os.replace(tmp_path, labels_path)
+
+
+def checkpoint_re_graph(re_graph: ReGraph, journal: ReGraphJournal, snapshot_path: str, steps: int, compact: bool=False):
+    """
+    Checkpoint the ReGraph by syncing the merge journal, folding it into the snapshot if `compact` is set.
+    """
+    if compact:
+        logging.info(f"ReGraph compact steps: {steps}, snapshot path: {snapshot_path}")
+        journal.compact(re_graph=re_graph, snapshot_path=snapshot_path)
+    else:
+        logging.info(f"ReGraph checkpoint steps: {steps}, journal path: {journal.journal_path}")
+        journal.sync()
+    logging.info(f"ReGraph checkpoint finished")
     
 
+def save_metrics(prometheus_path: Optional[str]):
+    """
+    Flush the metrics event log and write a Prometheus text snapshot of the aggregates.
+    """
+    get_recorder().flush()
+    if prometheus_path is not None:
+        get_recorder().write_prometheus(prometheus_path)
+
+
 def construct_regraph(args):
     """
     Construct ReGraph using LLM.
     """
+    # ReGraph saving parameters
+    save_steps = args.save_steps
+    compact_steps = args.compact_steps
+    save_dir = args.save_dir
+    prefix = args.prefix
+    shard = None
+    if args.shard is not None:
+        # Each shard keeps its own snapshot, journal and final ReGraph
+        shard = parse_shard(args.shard)
+        prefix = f"{prefix}_shard{shard[0]}of{shard[1]}"
+    snapshot_path = os.path.join(save_dir, f"{prefix}.snapshot.json")
+    journal_path = os.path.join(save_dir, f"{prefix}.journal.jsonl")
+    labels_path = os.path.join(save_dir, f"{prefix}.labels.json")
+    
     re_graph_path = args.re_graph
+    re_graph_journal = args.re_graph_journal
+    if re_graph_path is None and args.resume and os.path.exists(snapshot_path):
+        re_graph_path = snapshot_path
+        re_graph_journal = journal_path
+    seq = 0
+    merged = set()
     if re_graph_path is None:
         re_graph = ReGraph()
+    elif re_graph_journal is None:
+        re_graph = ReGraph.load(re_graph_path)
     else:
-        with open(re_graph_path, 'r') as f:
-            graph = json.load(f)
-        re_graph = ReGraph.from_graph(graph)
+        # Resume from a snapshot and the journal appended after it
+        re_graph, seq, merged = ReGraphJournal.replay(snapshot_path=re_graph_path, journal_path=re_graph_journal)
+        logging.info(f"ReGraph resumed at journal seq {seq} with {len(merged)} kernels merged")
         
-    # sequence kernels
+    # stream kernels of this shard, skipping those already merged into a resumed ReGraph
     kernel_path = args.kernel_path
-    with open(kernel_path, 'r') as f:
-        kernels = [json.loads(line) for line in f.readlines()]
+    kernels = read_jsonl(kernel_path, shard=shard, skip=merged)
     
     # LLM parameters 
     model = args.model
@@ -176,57 +439,159 @@ def construct_regraph(args):
     top_k: int = args.top_k
     max_tokens: int = args.max_tokens
     
-    # ReGraph saving parameters
-    save_steps = args.save_steps
-    save_dir = args.save_dir
-    prefix = args.prefix
+    # Canonical names of the method names seen so far, kept next to the snapshot
+    labels = {}
+    if args.resume and os.path.exists(labels_path):
+        with open(labels_path, 'r') as f:
+            labels = json.load(f)
+    
+    # Offline relabel backend, the LLM is only asked about names it finds ambiguous
+    method_index = None
+    if args.relabel_backend == 'ngram':
+        method_index = MethodIndex.from_regraph(re_graph)
+    
+    # Requests are sent within the rate limits of the endpoint and retried on transient errors
+    scheduler = Scheduler(
+        requests_per_minute=args.requests_per_minute,
+        tokens_per_minute=args.tokens_per_minute,
+        max_retries=args.max_retries
+    )
+    
+    # Every LLM call, cache hit and parse failure is recorded, optionally into a JSONL log
+    if args.metrics_path is not None:
+        set_recorder(MetricsRecorder(args.metrics_path))
+    
+    # Raw LLM responses are cached so that a rerun does not pay for them again
+    cache = None
+    if args.cache_path is not None:
+        cache = ResponseCache(args.cache_path)
+    
+    # Every merge is appended to the journal, which is periodically compacted into the snapshot.
+    # Compact once up front so that the journal only holds records made after the loaded ReGraph.
+    journal = ReGraphJournal(journal_path, seq=seq, indices=merged)
+    journal.compact(re_graph=re_graph, snapshot_path=snapshot_path)
     
     steps = 0
-    # Process each kernel and update ReGraph
-    for kernel in kernels:
+    # Process each kernel and update ReGraph. Reasoning runs concurrently, 
+    # while relabel and merge are applied by this thread in kernel order
+    reasoned = reason_in_order(
+        kernels=kernels,
+        concurrency=args.concurrency,
+        model=model, 
+        temperature=temperature,
+        max_tokens=max_tokens,
+        top_p=top_p,
+        cache=cache,
+        scheduler=scheduler
+    )
+    for batch in reasoned_batches(reasoned, batch_size=args.relabel_batch):
+        # 2. Relabel the trajectories of the batch using existing ReGraph methods
         try:
-            # 1. Generate optimization trajectory using LLM
-            trajectory = reason(
-                kernel=kernel, 
-                model=model, 
-                temperature=temperature,
-                max_tokens=max_tokens,
-                top_p=top_p
-            )
-            if trajectory is None:
-                continue
-            # 2. Relabel trajectory using existing ReGraph methods
-            trajectory_ = relabel(
-                trajectory=trajectory, 
+            trajectories_ = relabel(
+                trajectories=[trajectory for _, trajectory in batch], 
                 re_graph=re_graph, 
+                labels=labels,
                 model=model, 
                 temperature=temperature,
                 max_tokens=max_tokens,
-                top_p=top_p
+                top_p=top_p,
+                cache=cache,
+                indices=[kernel['index'] for kernel, _ in batch],
+                method_index=method_index,
+                scheduler=scheduler
             )
-            if trajectory_ is None:
-                continue
-            
-            # 3. Merge trajectory into ReGraph
-            merge(kernel=kernel, trajectory=trajectory_, re_graph=re_graph)
-
-            # 4. Save ReGraph periodically
-            steps += 1
-            if save_steps > 0 and steps % save_steps == 0:
-                save_re_graph(re_graph=re_graph, save_dir=save_dir, prefix=prefix, steps=steps)
         except Exception as e:
-            logging.error(f"Error in {kernel['index']} kernel {kernel['name']}: {e}")
+            logging.error(f"Error in relabel of kernels {[kernel['index'] for kernel, _ in batch]}: {e}")
             continue
+        for (kernel, _), trajectory_ in zip(batch, trajectories_):
+            try:
+                if trajectory_ is None:
+                    continue
+                
+                # 3. Merge trajectory into ReGraph
+                merge(kernel=kernel, trajectory=trajectory_, re_graph=re_graph, journal=journal)
+
+                # 4. Checkpoint ReGraph periodically
+                steps += 1
+                if compact_steps > 0 and steps % compact_steps == 0:
+                    checkpoint_re_graph(re_graph=re_graph, journal=journal, snapshot_path=snapshot_path, steps=steps, compact=True)
+                    save_labels(labels=labels, labels_path=labels_path)
+                elif save_steps > 0 and steps % save_steps == 0:
+                    checkpoint_re_graph(re_graph=re_graph, journal=journal, snapshot_path=snapshot_path, steps=steps)
+                    logging.info(f"LLM scheduler stats: {scheduler.stats()}")
+                    save_metrics(args.prometheus_path)
+            except Exception as e:
+                logging.error(f"Error in {kernel['index']} kernel {kernel['name']}: {e}")
+                continue
         
-    save_re_graph(re_graph=re_graph, save_dir=save_dir, prefix=prefix, steps=steps, final=True)
+    checkpoint_re_graph(re_graph=re_graph, journal=journal, snapshot_path=snapshot_path, steps=steps, compact=True)
+    save_labels(labels=labels, labels_path=labels_path)
+    journal.close()
+    logging.info(f"LLM scheduler stats: {scheduler.stats()}")
+    if cache is not None:
+        logging.info(f"LLM response cache hits: {cache.hits}, misses: {cache.misses}")
+        cache.close()
+    save_re_graph(re_graph=re_graph, save_dir=save_dir, prefix=prefix, steps=steps)
     logging.info(f"ReGraph saved to {save_dir} with prefix {prefix} at step {steps}.")
+    save_metrics(args.prometheus_path)
+    logging.info(f"Metrics: {get_recorder().snapshot()}")
+    get_recorder().close()
+
+
+def merge_shards(args):
+    """
+    Combine the ReGraphs and relabel caches of the `--shard` runs in save dir into one ReGraph, saved
+    as the final ReGraph of the prefix and as a snapshot that an unsharded `--resume` continues from.
+    """
+    save_dir = args.save_dir
+    prefix = args.prefix
+    pattern = re.compile(rf"{re.escape(prefix)}_shard(\d+)of(\d+)\.journal\.jsonl")
+    shards = {}
+    for file in os.listdir(save_dir):
+        match = pattern.fullmatch(file)
+        if match is not None:
+            shards[int(match.group(1))] = int(match.group(2))
+    if len(shards) == 0:
+        raise FileNotFoundError(f"No shard journals of prefix {prefix} found in {save_dir}")
+    if len(set(shards.values())) > 1:
+        raise ValueError(f"Shards of prefix {prefix} in {save_dir} split the kernels differently: {sorted(set(shards.values()))}")
+    n = next(iter(shards.values()))
+    missing = sorted(set(range(n)) - set(shards))
+    if len(missing) > 0:
+        logging.warning(f"Shards {missing} of {n} not found in {save_dir}, merging the {len(shards)} others")
+    
+    paths = []
+    labels = {}
+    for i in sorted(shards):
+        shard_prefix = f"{prefix}_shard{i}of{n}"
+        snapshot_path = os.path.join(save_dir, f"{shard_prefix}.snapshot.json")
+        paths.append((snapshot_path if os.path.exists(snapshot_path) else None, os.path.join(save_dir, f"{shard_prefix}.journal.jsonl")))
+        labels_path = os.path.join(save_dir, f"{shard_prefix}.labels.json")
+        if os.path.exists(labels_path):
+            with open(labels_path, 'r') as f:
+                for method, label in json.load(f).items():
+                    labels.setdefault(method, label)
+    # Nodes are matched by method name: shards relabel independently, so a method named differently
+    # by two shards stays two nodes
+    re_graph, indices = ReGraphJournal.merge_shards(paths)
+    logging.info(f"Merged {len(paths)} shards: {len(indices)} kernels, {len(re_graph.regraph_nodes)} nodes, {len(re_graph.regraph_edges)} edges")
+    
+    journal = ReGraphJournal(os.path.join(save_dir, f"{prefix}.journal.jsonl"), indices=indices)
+    journal.compact(re_graph=re_graph, snapshot_path=os.path.join(save_dir, f"{prefix}.snapshot.json"))
+    journal.close()
+    save_labels(labels=labels, labels_path=os.path.join(save_dir, f"{prefix}.labels.json"))
+    save_re_graph(re_graph=re_graph, save_dir=save_dir, prefix=prefix, steps=len(indices))
 
 
 def parser_args():
     parser = argparse.ArgumentParser(description="ReGraph Construction")
-    parser.add_argument('--re_graph', type=str, default=None, required=False, help='ReGraph path')
-    parser.add_argument('--kernel_path', type=str, default=None, required=True, help='kernel path')
-    parser.add_argument('--save_steps', type=int, default=10, required=False, help='save steps')
+    parser.add_argument('--re_graph', type=str, default=None, required=False, help='ReGraph path, or snapshot path if --re_graph_journal is given')
+    parser.add_argument('--re_graph_journal', type=str, default=None, required=False, help='journal replayed onto the --re_graph snapshot')
+    parser.add_argument('--kernel_path', type=str, default=None, required=False, help='kernel path (JSONL, optionally gzip/zstd compressed)')
+    parser.add_argument('--shard', type=str, default=None, required=False, help='only process shard i/n of the kernels')
+    parser.add_argument('--merge_shards', action='store_true', help='combine the ReGraphs of the shards in save dir instead of constructing')
+    parser.add_argument('--save_steps', type=int, default=10, required=False, help='journal sync steps')
+    parser.add_argument('--compact_steps', type=int, default=100, required=False, help='journal compaction steps')
     parser.add_argument('--save_dir', type=str, required=True, help='ReGraph save dir')
     parser.add_argument('--prefix', type=str, default='ReGraph', required=False, help='ReGraph saved prefix')
     parser.add_argument('--model', type=str, default='deepseek-chat', required=False, help='LLM model')
@@ -234,14 +599,31 @@ def parser_args():
     parser.add_argument('--max_tokens', type=float, default=8192, required=False, help='max_tokens')
     parser.add_argument('--top_p', type=float, default=0.9, required=False, help='top_p')
     parser.add_argument('--top_k', type=int, default=-1, required=False, help='top_k')
+    parser.add_argument('--cache_path', type=str, default=None, required=False, help='LLM response cache path')
+    parser.add_argument('--resume', action='store_true', help='resume from the snapshot and journal in save dir')
+    parser.add_argument('--relabel_backend', type=str, choices=['llm', 'ngram'], default='llm', required=False, help='relabel backend, ngram resolves method names offline and falls back to the LLM')
+    parser.add_argument('--relabel_batch', type=int, default=1, required=False, help='number of kernels relabeled per request')
+    parser.add_argument('--requests_per_minute', type=float, default=None, required=False, help='request rate limit')
+    parser.add_argument('--tokens_per_minute', type=float, default=None, required=False, help='token rate limit')
+    parser.add_argument('--max_retries', type=int, default=5, required=False, help='retries of rate-limited or transient LLM errors')
+    parser.add_argument('--concurrency', type=int, default=1, required=False, help='number of in-flight reasoning requests')
+    parser.add_argument('--metrics_path', type=str, default=None, required=False, help='JSONL log of per-call metrics')
+    parser.add_argument('--prometheus_path', type=str, default=None, required=False, help='Prometheus text snapshot of the aggregated metrics')
     
     args = parser.parse_args()
+    if args.kernel_path is None and not args.merge_shards:
+        parser.error("--kernel_path is required unless --merge_shards is given")
+    if args.re_graph_journal is not None and args.re_graph is None:
+        parser.error("--re_graph_journal requires --re_graph")
     return args
 
 
 def main():
     args = parser_args()
-    construct_regraph(args)
+    if args.merge_shards:
+        merge_shards(args)
+    else:
+        construct_regraph(args)
 
 
 if __name__ == "__main__":
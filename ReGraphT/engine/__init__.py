@@ -1 +1,4 @@
 from .inference_engine import EngineType, EngineConfig, SamplingParams, InferenceEngine
+from .scheduler import Scheduler, TokenBucket
+from .cached_engine import CachedEngine
+from .streaming import JsonFenceDetector
\ No newline at end of file
@@ -0,0 +1,187 @@
+import json
+import logging
+import dataclasses
+from typing import Iterator, Union, Optional
+
+from .inference_engine import (
+    SamplingParams,
+    InferenceEngine
+)
+from ReGraphT.utils import ResponseCache, LRUCache, get_recorder
+
+__all__ = ['CachedEngine', 'normalize_messages']
+
+
+def jsonable(value):
+    """
+    JSON encoding of the non-JSON values of engine outputs, e.g. vLLM token id arrays and logprob objects.
+    Cached outputs hold the encoded values (lists and dicts) instead of the original objects.
+    """
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if hasattr(value, 'keys'):
+        return dict(value)
+    if hasattr(value, '__iter__'):
+        return list(value)
+    if hasattr(value, '__dict__'):
+        return vars(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def normalize_messages(messages: list[dict]) -> list[dict]:
+    """
+    Reduce a conversation to what the model sees: roles and contents, with line endings
+    unified and surrounding whitespace stripped.
+    """
+    return [
+        {
+            'role': message['role'],
+            'content': (message.get('content') or '').replace('\r\n', '\n').strip()
+        }
+        for message in messages
+    ]
+
+
+class CachedEngine(InferenceEngine):
+    def __init__(
+        self,
+        engine: InferenceEngine,
+        cache: Union[ResponseCache, LRUCache, None]=None,
+        deterministic_only: bool=True
+    ):
+        """CachedEngine wraps any InferenceEngine and answers repeated requests from a cache,
+        keyed on the normalized messages, the sampling parameters and the model.
+        engine: Wrapped engine, which serves the cache misses
+        cache: An in-memory `LRUCache` (default) or an on-disk `ResponseCache`
+        deterministic_only: Only cache requests whose generation is reproducible, i.e. sampled
+            at temperature 0 or with a fixed seed
+        """
+        super(CachedEngine, self).__init__(engine.config)
+        self.engine = engine
+        self.cache = cache if cache is not None else LRUCache()
+        self.deterministic_only = deterministic_only
+        self.hits = 0
+        self.misses = 0
+        # Requests that bypassed the cache because they are not deterministic
+        self.bypassed = 0
+        # Generations that could not be stored
+        self.uncached = 0
+
+    def cacheable(self, config: SamplingParams) -> bool:
+        return not self.deterministic_only or config.temperature == 0 or config.seed is not None
+
+    def make_key(self, message: list[dict], config: SamplingParams) -> str:
+        return ResponseCache.make_key(
+            engine=type(self.engine).__name__,
+            model=config.model or self.config.local_model_path or self.config.base_url,
+            messages=normalize_messages(message),
+            sampling_params=dataclasses.asdict(config)
+        )
+
+    def generate(
+        self,
+        prompts: Union[list[dict], list[list[dict]]],
+        config: SamplingParams,
+        **kwargs
+    ) -> list[dict]:
+        if isinstance(prompts, list) and isinstance(prompts[0], dict):
+            messages = [prompts]
+        else:
+            messages = prompts
+        if not self.cacheable(config):
+            if self.bypassed == 0:
+                logging.warning(f"Requests at temperature {config.temperature} without a seed are not reproducible and bypass the response cache; sample at temperature 0 or set a seed to cache them")
+            self.bypassed += len(messages)
+            get_recorder().record("engine_cache", type(self.engine).__name__, bypassed=len(messages))
+            return self.engine.generate(messages, config, **kwargs)
+
+        keys = [self.make_key(message, config) for message in messages]
+        results: list[Optional[list[dict]]] = [None] * len(messages)
+        # Identical prompts of the same batch are only sent once
+        pending: dict[str, list[int]] = {}
+        for i, key in enumerate(keys):
+            if key in pending:
+                pending[key].append(i)
+                continue
+            value = self.cache.get(key)
+            if value is None:
+                pending[key] = [i]
+            else:
+                results[i] = json.loads(value)
+        hits = len(messages) - sum(len(indices) for indices in pending.values())
+        self.hits += hits
+        self.misses += len(pending)
+        get_recorder().record("engine_cache", type(self.engine).__name__, hits=hits, misses=len(pending))
+
+        if len(pending) > 0:
+            missed = [messages[indices[0]] for indices in pending.values()]
+            outputs = self.engine.generate(missed, config, **kwargs)
+            if len(outputs) != len(missed):
+                # The engine did not return one item per conversation (e.g. several choices),
+                # so its outputs cannot be attributed to the cache keys
+                logging.warning(f"{type(self.engine).__name__} returned {len(outputs)} items for {len(missed)} prompts, not caching them")
+                return outputs
+            for (key, indices), output in zip(pending.items(), outputs):
+                try:
+                    self.cache.put(key, json.dumps([output], default=jsonable))
+                except (TypeError, ValueError) as e:
+                    self.uncached += 1
+                    logging.warning(f"Not caching a {type(self.engine).__name__} generation: {e}")
+                for i in indices:
+                    results[i] = [output]
+
+        return [item for items in results for item in items]
+
+    def stream_generation(
+        self,
+        prompt: list[dict],
+        config: SamplingParams,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        Replay a cached generation at once, otherwise stream from the wrapped engine uncached,
+        since a stream that is stopped early is not a complete generation.
+        """
+        if self.cacheable(config):
+            value = self.cache.get(self.make_key(prompt, config))
+            if value is not None:
+                self.hits += 1
+                get_recorder().record("engine_cache", type(self.engine).__name__, hits=1, misses=0)
+                yield json.loads(value)[0]['generation']
+                return
+        yield from self.engine.stream_generation(prompt, config, **kwargs)
+
+    def stats(self) -> dict:
+        """
+        Snapshot of the cache counters: hits, misses, bypassed requests, generations that could not
+        be stored, evictions and size.
+        """
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total > 0 else 0.0,
+            'bypassed': self.bypassed,
+            'uncached': self.uncached,
+            'evictions': self.cache.evictions,
+            'entries': len(self.cache),
+            'size': self.cache.size,
+        }
+
+    def rollout(self, state: dict):
+        return self.engine.rollout(state)
+
+    def generate_available_actions(
+        self,
+        state: dict
+    ) -> list[dict]:
+        return self.engine.generate_available_actions(state)
+
+    def extract_state(
+        self,
+        action: dict,
+        state: dict
+        ) -> dict:
+        return self.engine.extract_state(action, state)
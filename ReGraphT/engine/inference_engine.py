@@ -1,8 +1,11 @@
 import abc
-from typing import Union, Optional
+import json
+from typing import AsyncIterator, Iterator, Union, Optional
 from dataclasses import dataclass
 import enum
 
+from .scheduler import Scheduler
+from .streaming import JsonFenceDetector, stop_at_json_fence, iterate_in_thread
 
 __all__ = ['EngineType', 'EngineConfig', 'SamplingParams', 'InferenceEngine', 'register_engine']
 
@@ -17,16 +20,32 @@ class EngineType(enum.Enum):
 class EngineConfig:
     base_url: Optional[str] = None
     local_model_path: Optional[str] = None
+    # Maximum number of in-flight requests of a remote engine
+    max_concurrency: int = 8
+    # Per-request timeout in seconds of a remote engine
+    request_timeout: Optional[float] = None
+    # Request and token budgets per minute, shared by all engines of the same endpoint
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+    # Retries of rate-limited or transient failures
+    max_retries: int = 5
+    # Reuse the KV cache of prompt prefixes shared across requests of a local engine
+    enable_prefix_caching: bool = True
+    # Shortest prefix, in characters, shared by prompts of a batch that is prefilled once up front
+    min_shared_prefix: int = 1024
 
 
 @dataclass
 class SamplingParams:
     model: Optional[str] = None
-    temperature: float
-    max_tokens: int
+    temperature: float = 0.7
+    max_tokens: int = 8192
     top_p: float = 0.9
-    top_k: float = 0.7
+    # Number of most likely tokens sampled from, -1 to disable as in vLLM
+    top_k: int = -1
     log_probs: Optional[int] = None
+    # Sampling seed, makes generations reproducible (and cacheable) at a non-zero temperature
+    seed: Optional[int] = None
     
 
 def register_engine(
@@ -46,6 +65,12 @@ class InferenceEngine(abc.ABC):
     ):
         super().__init__()
         self.config = config
+        self.scheduler = Scheduler.shared(
+            config.base_url or config.local_model_path or "",
+            requests_per_minute=config.requests_per_minute,
+            tokens_per_minute=config.tokens_per_minute,
+            max_retries=config.max_retries
+        )
         
     @staticmethod
     def create_engine(
@@ -63,17 +88,74 @@ class InferenceEngine(abc.ABC):
         **kwargs
     ) -> list[dict]:
         ...
+
+    def stream_generation(
+        self,
+        prompt: list[dict],
+        config: SamplingParams,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        Yield the generation of a single conversation as text deltas. Engines without native 
+        streaming yield the complete generation at once.
+        """
+        yield self.generate([prompt], config, **kwargs)[0]['generation']
+
+    def stream(
+        self,
+        prompt: list[dict],
+        config: SamplingParams,
+        stop_at_json: bool=False,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        Stream the generation of a single conversation as text deltas.
+        stop_at_json: Stop decoding once the closing fence of the first ```json block is emitted
+        """
+        deltas = self.stream_generation(prompt, config, **kwargs)
+        if stop_at_json:
+            return stop_at_json_fence(deltas)
+        return deltas
+
+    def astream(
+        self,
+        prompt: list[dict],
+        config: SamplingParams,
+        stop_at_json: bool=False,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Asynchronous counterpart of `stream`, decoding in a worker thread.
+        """
+        return iterate_in_thread(self.stream(prompt, config, stop_at_json=stop_at_json, **kwargs))
         
-    @abc.abstractmethod
-    def rollout(self, state: dict):
-        pass
+    def rollout(self, state: dict) -> dict:
+        """
+        Complete the conversation of a search state, held under "messages", in a single generation
+        sampled with the state's "config" (default `SamplingParams`). Returns the generation item.
+        """
+        return self.generate([state['messages']], state.get('config') or SamplingParams())[0]
         
-    @abc.abstractmethod
     def generate_available_actions(
         self,
         state: dict
     ) -> list[dict]:
-        ...
+        """
+        Generate the candidate actions of a search state: the objects of the first ```json block of
+        a rollout, e.g. the {"method", "detail", "code"} steps of a reasoning prompt. Generations 
+        without a valid block yield no action.
+        """
+        detector = JsonFenceDetector()
+        detector.feed(self.rollout(state)['generation'] or '')
+        if detector.block is None:
+            return []
+        try:
+            actions = json.loads(detector.block)
+        except json.JSONDecodeError:
+            return []
+        if isinstance(actions, dict):
+            actions = [actions]
+        return [action for action in actions if isinstance(action, dict)]
 
     def extract_state(
         self, 
@@ -1,26 +1,202 @@
-from typing import Union, Optional
+import os
+import time
+import queue
+import logging
+import itertools
+import threading
+from typing import Iterator, Union, Optional
 
-from transformers import AutoTokenizer
-from vllm import LLM, SamplingParams
+import vllm
+from vllm import LLM
 
 from .inference_engine import (
+    EngineType,
     EngineConfig, 
     SamplingParams, 
     InferenceEngine,
     register_engine
 )
+from ReGraphT.utils import get_recorder
 
 __all__ = ['LocalEngine']
 
-@register_engine
+def timings(output) -> dict:
+    """
+    Read the queue, prefill and decode times of a request, in seconds, and its decode throughput
+    from the metrics vLLM attaches to the output. Fields are None when the engine does not report them.
+    """
+    metrics = getattr(output, 'metrics', None)
+    arrival_time = getattr(metrics, 'arrival_time', None)
+    first_scheduled_time = getattr(metrics, 'first_scheduled_time', None)
+    first_token_time = getattr(metrics, 'first_token_time', None)
+    last_token_time = getattr(metrics, 'last_token_time', None)
+    queue_time = getattr(metrics, 'time_in_queue', None)
+    if queue_time is None and arrival_time is not None and first_scheduled_time is not None:
+        queue_time = first_scheduled_time - arrival_time
+    prefill_time = None
+    if first_scheduled_time is not None and first_token_time is not None:
+        prefill_time = first_token_time - first_scheduled_time
+    decode_time = None
+    if first_token_time is not None and last_token_time is not None:
+        decode_time = last_token_time - first_token_time
+    tokens_per_second = None
+    if decode_time is not None and decode_time > 0:
+        # The first token comes out of the prefill
+        tokens_per_second = (len(output.outputs[0].token_ids) - 1) / decode_time
+    return {
+        'queue_time': queue_time,
+        'prefill_time': prefill_time,
+        'decode_time': decode_time,
+        'tokens_per_second': tokens_per_second
+    }
+
+
+@register_engine(EngineType.LOCAL)
 class LocalEngine(InferenceEngine):
     def __init__(
         self,
         config: EngineConfig
     ):
         super(LocalEngine, self).__init__(config)
-        self.tokenizer = AutoTokenizer.from_pretrained(config.local_model_path, trust_remote_code=True)
-        self.llm = LLM(config.local_model_path)
+        self.llm = LLM(config.local_model_path, enable_prefix_caching=config.enable_prefix_caching)
+        # The chat template is applied with the engine's own tokenizer instead of loading a second copy
+        self.tokenizer = self.llm.get_tokenizer()
+        # Batches and streams add their requests to the same vLLM engine. Each engine step runs under
+        # the lock and hands every output to the queue of its request, so no caller holds the engine
+        # longer than a step and none consumes the outputs of another
+        self.lock = threading.Lock()
+        self.request_ids = itertools.count()
+        self.queues: dict[str, queue.SimpleQueue] = {}
+        # Cumulative prompt and prefix-cache-hit tokens
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def shared_prefixes(self, prompts: list[str]) -> list[str]:
+        """
+        Find the prefixes of at least `min_shared_prefix` characters shared by several of the 
+        sorted `prompts`, e.g. a system prompt followed by the same retrieved examples.
+        In sorted order every shared prefix is a prefix of the common prefix of two neighbours, 
+        and prefixes of a prefix already found are skipped since their blocks come with it.
+        """
+        prefixes = []
+        for prompt, next_prompt in zip(prompts, prompts[1:]):
+            common = os.path.commonprefix([prompt, next_prompt])
+            if len(common) < self.config.min_shared_prefix:
+                continue
+            if len(prefixes) > 0 and prefixes[-1].startswith(common):
+                continue
+            if len(prefixes) > 0 and common.startswith(prefixes[-1]):
+                prefixes[-1] = common
+            else:
+                prefixes.append(common)
+        return prefixes
+
+    def submit(self, prompts: list[str], sampling_params: vllm.SamplingParams) -> list[str]:
+        """
+        Add prompts to the engine together, so that the scheduler admits them in this order.
+        """
+        request_ids = []
+        with self.lock:
+            for prompt in prompts:
+                request_id = str(next(self.request_ids))
+                self.queues[request_id] = queue.SimpleQueue()
+                self.llm.llm_engine.add_request(request_id, prompt, sampling_params)
+                request_ids.append(request_id)
+        return request_ids
+
+    def step(self, request_ids: list[str]):
+        """
+        Step the engine once, unless outputs of `request_ids` are already waiting in their queues.
+        """
+        with self.lock:
+            if any(not self.queues[request_id].empty() for request_id in request_ids):
+                return
+            for output in self.llm.llm_engine.step():
+                outputs = self.queues.get(output.request_id)
+                if outputs is not None:
+                    outputs.put(output)
+
+    def release(self, request_ids: list[str], finished: set[str]):
+        """
+        Forget requests, aborting the unfinished ones to free their sequences and KV cache blocks.
+        """
+        with self.lock:
+            for request_id in request_ids:
+                self.queues.pop(request_id, None)
+            unfinished = [request_id for request_id in request_ids if request_id not in finished]
+            if len(unfinished) > 0:
+                # `abort_request` takes a list of ids, a single string would be read as one id per character
+                self.llm.llm_engine.abort_request(unfinished)
+
+    def run(self, prompts: list[str], sampling_params: vllm.SamplingParams) -> list:
+        """
+        Generate for a batch of prompts and return their final outputs in order.
+        """
+        request_ids = self.submit(prompts, sampling_params)
+        outputs = {}
+        try:
+            while len(outputs) < len(request_ids):
+                pending = [request_id for request_id in request_ids if request_id not in outputs]
+                self.step(pending)
+                for request_id in pending:
+                    while not self.queues[request_id].empty():
+                        output = self.queues[request_id].get()
+                        if output.finished:
+                            outputs[request_id] = output
+        finally:
+            self.release(request_ids, set(outputs))
+        return [outputs[request_id] for request_id in request_ids]
+
+    def sampling_params(self, config: SamplingParams) -> vllm.SamplingParams:
+        return vllm.SamplingParams(
+            temperature=config.temperature,
+            max_tokens=config.max_tokens,
+            top_p=config.top_p,
+            top_k=config.top_k,
+            logprobs=config.log_probs,
+            seed=config.seed
+        )
+
+    @staticmethod
+    def cached_token_ratio(cached_tokens: int, prompt_tokens: int) -> float:
+        return cached_tokens / prompt_tokens if prompt_tokens > 0 else 0.0
+
+    def prefix_cache_stats(self) -> dict:
+        """
+        Cumulative prompt tokens, prompt tokens served from the prefix cache and their ratio.
+        """
+        return {
+            'prompt_tokens': self.prompt_tokens,
+            'cached_tokens': self.cached_tokens,
+            'cached_token_ratio': self.cached_token_ratio(self.cached_tokens, self.prompt_tokens),
+        }
+
+    def stream_generation(
+        self,
+        prompt: list[dict],
+        config: SamplingParams,
+        **kwargs
+    ) -> Iterator[str]:
+        prompt = self.tokenizer.apply_chat_template(prompt, tokenize=False, add_generation_prompt=True)
+        request_ids = self.submit([prompt], self.sampling_params(config))
+        outputs = self.queues[request_ids[0]]
+        text = ''
+        finished = False
+        try:
+            while not finished:
+                self.step(request_ids)
+                while not finished and not outputs.empty():
+                    output = outputs.get()
+                    generation = output.outputs[0].text
+                    finished = output.finished
+                    if len(generation) > len(text):
+                        delta = generation[len(text):]
+                        text = generation
+                        # Yielded without the lock, so a slow consumer does not stall other requests
+                        yield delta
+        finally:
+            # Closing the stream early frees the sequence and its KV cache blocks
+            self.release(request_ids, set(request_ids) if finished else set())
     
     def generate(
         self, 
@@ -29,22 +205,27 @@ class LocalEngine(InferenceEngine):
         **kwargs
     ):
         try:
-            sampling_params = SamplingParams(
-                temperature=config.temperature,
-                max_tokens=config.max_tokens,
-                top_p=config.top_p,
-                top_k=config.top_k,
-                log_probs=config.log_probs
-            )
+            start = time.perf_counter()
+            sampling_params = self.sampling_params(config)
             if isinstance(prompts, list) and isinstance(prompts[0], dict):
                 prompts = [prompts]
             prompts = [self.tokenizer.apply_chat_template(prompt, tokenize=False, add_generation_prompt=True) for prompt in prompts]
-            outputs = self.llm.generate(
-                prompts, 
-                sampling_params
-            )
+            # Sorting the prompts places those sharing a prefix next to each other, so that 
+            # the scheduler admits them together while their prefix blocks are cached
+            order = sorted(range(len(prompts)), key=lambda i: prompts[i])
+            if self.config.enable_prefix_caching:
+                # Prompts prefilled in the same step cannot reuse each other's blocks, 
+                # so every shared prefix is prefilled once before the batch
+                prefixes = self.shared_prefixes([prompts[i] for i in order])
+                if len(prefixes) > 0:
+                    self.run(prefixes, vllm.SamplingParams(max_tokens=1))
+            outputs = self.run([prompts[i] for i in order], sampling_params)
+            outputs = [output for _, output in sorted(zip(order, outputs), key=lambda pair: pair[0])]
             
             batch = []
+            batch_prompt_tokens = 0
+            batch_cached_tokens = 0
+            batch_generation_tokens = 0
             
             for idx, output in enumerate(outputs):
                 prompt = output.prompt
@@ -52,9 +233,14 @@ class LocalEngine(InferenceEngine):
                 generation_ids = output.outputs[0].token_ids
                 logprobs = output.outputs[0].logprobs
                 
-                prompt_tokens = len(self.llm.get_tokenizer().encode(prompt))
+                prompt_tokens = len(output.prompt_token_ids)
                 generation_tokens = len(generation_ids)
                 tokens = prompt_tokens + generation_tokens
+                # Prompt tokens served from the prefix cache instead of being prefilled
+                cached_tokens = getattr(output, 'num_cached_tokens', None) or 0
+                batch_prompt_tokens += prompt_tokens
+                batch_cached_tokens += cached_tokens
+                batch_generation_tokens += generation_tokens
                 item = {
                     'prompt': prompt,
                     'generation': generation,
@@ -62,12 +248,27 @@ class LocalEngine(InferenceEngine):
                     'logprobs': logprobs,
                     'prompt_tokens': prompt_tokens,
                     'generation_tokens': generation_tokens,
-                    'tokens': tokens
+                    'tokens': tokens,
+                    'cached_tokens': cached_tokens,
+                    **timings(output)
                 }
                 batch.append(item)
+
+            self.prompt_tokens += batch_prompt_tokens
+            self.cached_tokens += batch_cached_tokens
+            logging.info(f"batch of {len(batch)} prompts, {batch_cached_tokens}/{batch_prompt_tokens} prompt tokens cached ({self.cached_token_ratio(batch_cached_tokens, batch_prompt_tokens):.1%})")
+            get_recorder().record(
+                "engine_call",
+                type(self).__name__,
+                latency=time.perf_counter() - start,
+                batch_size=len(batch),
+                prompt_tokens=batch_prompt_tokens,
+                generation_tokens=batch_generation_tokens,
+                cached_tokens=batch_cached_tokens
+            )
                 
-        except Exception as e:
-            print(e)
+        except Exception:
+            logging.exception("LocalEngine.generate failed")
             raise
             
         return batch
\ No newline at end of file
@@ -1,26 +1,116 @@
-from typing import Union, Optional
+import logging
+from typing import Iterator, Union, Optional
+from concurrent.futures import ThreadPoolExecutor
 
 import openai
 
 from .inference_engine import (
+    EngineType,
     EngineConfig, 
     SamplingParams, 
     InferenceEngine,
     register_engine
 )
+from .scheduler import estimate_tokens
+from ReGraphT.utils import get_recorder
 
 __all__ = ['RemoteEngine']
 
-@register_engine
+def top_k_body(config: SamplingParams) -> Optional[dict]:
+    """
+    top_k is not part of the OpenAI API; vLLM-compatible servers read it from the request body.
+    It is only sent when enabled, so that other endpoints do not reject the request.
+    """
+    return {'top_k': config.top_k} if config.top_k > 0 else None
+
+@register_engine(EngineType.REMOTE)
 class RemoteEngine(InferenceEngine):
     def __init__(
         self,
         config: EngineConfig
     ):
         super(RemoteEngine, self).__init__(config)
-        self.client = openai.OpenAI(base_url=config.base_url)
+        # Retries are left to the scheduler, which also enforces the rate limits
+        self.client = openai.OpenAI(base_url=config.base_url, max_retries=0)
+        # Requests of a batch are dispatched concurrently, at most `max_concurrency` at a time
+        self.pool = ThreadPoolExecutor(max_workers=config.max_concurrency)
+        
+    def request(
+        self,
+        message: list[dict],
+        config: SamplingParams
+    ) -> list[dict]:
+        """
+        Send a single conversation to the remote endpoint.
+        """
+        with get_recorder().timer("engine_call", type(self).__name__, tags={"model": config.model}) as metrics:
+            response = self.scheduler.call(
+                lambda: self.client.chat.completions.create(
+                    model=config.model,
+                    messages=message,
+                    temperature=config.temperature,
+                    max_tokens=config.max_tokens,
+                    top_p=config.top_p,
+                    logprobs=config.log_probs is not None,
+                    top_logprobs=config.log_probs,
+                    seed=config.seed,
+                    extra_body=top_k_body(config),
+                    timeout=self.config.request_timeout
+                ),
+                tokens=estimate_tokens(message, config.max_tokens),
+                usage=lambda response: response.usage.total_tokens if response.usage else None
+            )
+            usage = response.usage
+            metrics['retries'] = self.scheduler.last_retries()
+            metrics['prompt_tokens'] = usage.prompt_tokens if usage else None
+            metrics['generation_tokens'] = usage.completion_tokens if usage else None
         
+        batch = []
+        for i, choice in enumerate(response.choices):
+            item = {
+                'prompts': message,
+                'generation': choice.message.content,
+                'generation_ids': None,
+                'logprobs': choice.logprobs.dict() if choice.logprobs else None,
+                'prompt_tokens': usage.prompt_tokens if usage else None,
+                'generation_tokens': usage.completion_tokens if usage else None,
+                'tokens': usage.total_tokens if usage else None
+            }
+            batch.append(item)
+        return batch
         
+    def stream_generation(
+        self,
+        prompt: list[dict],
+        config: SamplingParams,
+        **kwargs
+    ) -> Iterator[str]:
+        # Only opening the stream is retried; once tokens flow, errors reach the caller
+        response = self.scheduler.call(
+            lambda: self.client.chat.completions.create(
+                model=config.model,
+                messages=prompt,
+                temperature=config.temperature,
+                max_tokens=config.max_tokens,
+                top_p=config.top_p,
+                seed=config.seed,
+                extra_body=top_k_body(config),
+                stream=True,
+                timeout=self.config.request_timeout
+            ),
+            tokens=estimate_tokens(prompt, config.max_tokens)
+        )
+        try:
+            for chunk in response:
+                if len(chunk.choices) == 0:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        finally:
+            # Closing the connection makes the server stop decoding
+            response.close()
+
     def generate(
         self,
         prompts: Union[list[dict], list[list[dict]]],        
@@ -33,32 +123,11 @@ class RemoteEngine(InferenceEngine):
             else:
                 messages = prompts
             
-            batch = []
-            
-            for idx, message in enumerate(messages):
-                response = self.client.chat.completions.create(
-                    model=config.model,
-                    messages=message,
-                    temperature=config.temperature,
-                    max_tokens=config.max_tokens,
-                    top_p=config.top_p,
-                    logprobs=config.log_probs is not None,
-                    top_logprobs=config.log_probs
-                )
-                
-                for i, choice in enumerate(response):
-                    item = {
-                        'prompts': prompts[idx],
-                        'generation': choice.message.content,
-                        'generation_ids': None,
-                        'logprobs': choice.logprobs.dict() if choice.logprobs else None,
-                        'prompt_tokens': None,
-                        'generation_tokens': None,
-                        'tokens': None
-                    }
-                    batch.append(item)
-        except Exception as e:
-            print(e)
+            # `map` yields results in the order of the prompts, whatever order they complete in
+            results = self.pool.map(lambda message: self.request(message, config), messages)
+            batch = [item for items in results for item in items]
+        except Exception:
+            logging.exception("RemoteEngine.generate failed")
             raise
         
-        return batch
\ No newline at end of file
+        return batch
@@ -0,0 +1,244 @@
+import time
+import random
+import logging
+import threading
+from typing import Any, Callable, Optional
+
+__all__ = ['TokenBucket', 'Scheduler', 'estimate_tokens']
+
+# Errors worth retrying, matched by class name so that no client library has to be imported
+RETRYABLE_ERRORS = {
+    'RateLimitError',
+    'APITimeoutError',
+    'APIConnectionError',
+    'InternalServerError',
+    'TimeoutError',
+    'ConnectionError',
+}
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+SCHEDULER_REGISTRY = {}
+SCHEDULER_REGISTRY_LOCK = threading.Lock()
+
+
+def estimate_tokens(messages: list[dict], max_tokens: int=0) -> int:
+    """
+    Estimate the token budget of a chat request: about four characters per prompt token,
+    plus the requested completion tokens.
+    """
+    return sum(len(message.get('content') or '') for message in messages) // 4 + int(max_tokens)
+
+
+def is_retryable(e: Exception) -> bool:
+    status_code = getattr(e, 'status_code', None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(e).__mro__)
+
+
+def retry_after(e: Exception) -> Optional[float]:
+    """
+    Read the delay requested by the server through a `retry-after` header, if any.
+    """
+    response = getattr(e, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers is None:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket(object):
+    def __init__(self, rate_per_minute: float, capacity: Optional[float]=None):
+        """TokenBucket meters a budget that refills continuously at `rate_per_minute`.
+        Reservations are granted in arrival order; a reservation larger than the current
+        balance drives it negative and the caller waits until the debt is repaid.
+        rate_per_minute: Refill rate of the budget
+        capacity: Largest balance the bucket can accumulate, defaults to one minute of budget
+        """
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.balance = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.balance = min(self.capacity, self.balance + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Reserve `amount` from the budget and return how many seconds to wait before using it.
+        """
+        with self.lock:
+            self.refill()
+            self.balance -= amount
+            if self.balance >= 0:
+                return 0.0
+            return -self.balance / self.rate
+
+    def refund(self, amount: float):
+        """
+        Return an over-estimated part of a reservation to the budget.
+        """
+        with self.lock:
+            self.refill()
+            self.balance = min(self.capacity, self.balance + amount)
+
+
+class Scheduler(object):
+    def __init__(
+        self,
+        requests_per_minute: Optional[float]=None,
+        tokens_per_minute: Optional[float]=None,
+        max_retries: int=5,
+        backoff_base: float=1.0,
+        backoff_max: float=60.0
+    ):
+        """Scheduler runs LLM requests within requests-per-minute and tokens-per-minute budgets,
+        retrying rate-limited and transient failures with jittered exponential backoff, so that
+        throughput stays at the quota instead of dropping work.
+        requests_per_minute: Request budget, unlimited if None
+        tokens_per_minute: Token budget, unlimited if None
+        max_retries: Number of retries of a failing request before its error is raised
+        backoff_base: Backoff of the first retry in seconds, doubled on each further retry
+        backoff_max: Upper bound of the backoff in seconds
+        """
+        # Settings the scheduler was created with, checked when it is shared
+        self.settings = {
+            'requests_per_minute': requests_per_minute,
+            'tokens_per_minute': tokens_per_minute,
+            'max_retries': max_retries,
+            'backoff_base': backoff_base,
+            'backoff_max': backoff_max,
+        }
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.lock = threading.Lock()
+        # Requests waiting for budget or backoff
+        self.queue_depth = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.wait_time = 0.0
+        # Retries of the last request sent by each thread
+        self.local = threading.local()
+
+    @staticmethod
+    def shared(key: str, **kwargs):
+        """
+        Return the process-wide scheduler registered under `key` (e.g. an endpoint URL),
+        creating it with `kwargs` on first use, so that every client of an endpoint shares its quota.
+        Raises ValueError if `kwargs` conflict with the settings of the registered scheduler, since
+        one of the two quotas would silently be ignored.
+        """
+        with SCHEDULER_REGISTRY_LOCK:
+            scheduler = SCHEDULER_REGISTRY.get(key)
+            if scheduler is None:
+                scheduler = Scheduler(**kwargs)
+                SCHEDULER_REGISTRY[key] = scheduler
+                return scheduler
+        conflicts = {
+            name: (scheduler.settings[name], value) for name, value in kwargs.items() if scheduler.settings[name] != value
+        }
+        if len(conflicts) > 0:
+            details = ', '.join(f"{name}={registered} (requested {value})" for name, (registered, value) in conflicts.items())
+            raise ValueError(f"Scheduler of {key!r} already registered with {details}")
+        return scheduler
+
+    def wait(self, seconds: float):
+        if seconds <= 0:
+            return
+        with self.lock:
+            self.queue_depth += 1
+        time.sleep(seconds)
+        with self.lock:
+            self.queue_depth -= 1
+            self.wait_time += seconds
+
+    def acquire(self, tokens: int):
+        delay = 0.0
+        if self.request_bucket is not None:
+            delay = max(delay, self.request_bucket.reserve(1))
+        if self.token_bucket is not None and tokens > 0:
+            delay = max(delay, self.token_bucket.reserve(tokens))
+        self.wait(delay)
+
+    def backoff(self, attempt: int, e: Exception) -> float:
+        delay = retry_after(e)
+        if delay is None:
+            # Full jitter spreads retries of concurrent requests apart
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return delay
+
+    def call(
+        self,
+        fn: Callable[[], Any],
+        tokens: int=0,
+        usage: Optional[Callable[[Any], Optional[int]]]=None
+    ) -> Any:
+        """
+        Run a request within the budgets and retry it on retryable errors.
+        fn: Function sending the request
+        tokens: Estimated token cost, reserved from the token budget before sending
+        usage: Function reading the actual token cost from the result, to refund over-estimates
+        """
+        attempt = 0
+        self.local.retries = 0
+        while True:
+            self.acquire(tokens)
+            with self.lock:
+                self.in_flight += 1
+                self.requests += 1
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    with self.lock:
+                        self.failures += 1
+                    raise
+                delay = self.backoff(attempt, e)
+                logging.warning(f"Retrying request in {delay:.1f}s after {type(e).__name__} (attempt {attempt + 1}/{self.max_retries})")
+                with self.lock:
+                    self.retries += 1
+                attempt += 1
+                self.local.retries = attempt
+                self.wait(delay)
+                continue
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+            if usage is not None and self.token_bucket is not None and tokens > 0:
+                actual = usage(result)
+                if actual is not None and actual < tokens:
+                    self.token_bucket.refund(tokens - actual)
+            return result
+
+    def last_retries(self) -> int:
+        """
+        Number of retries of the last request sent by the calling thread.
+        """
+        return getattr(self.local, 'retries', 0)
+
+    def stats(self) -> dict:
+        """
+        Snapshot of the scheduler state: queue depth, in-flight requests, retries, failures and wait time.
+        """
+        with self.lock:
+            return {
+                'queue_depth': self.queue_depth,
+                'in_flight': self.in_flight,
+                'requests': self.requests,
+                'retries': self.retries,
+                'failures': self.failures,
+                'wait_time': self.wait_time,
+                'mean_wait_time': self.wait_time / self.requests if self.requests > 0 else 0.0,
+            }
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+from typing import AsyncIterator, Iterable, Iterator, Optional
+
+__all__ = ['JsonFenceDetector', 'stop_at_json_fence', 'iterate_in_thread']
+
+JSON_FENCE_OPEN = '```json\n'
+JSON_FENCE_CLOSE = '\n```'
+
+
+class JsonFenceDetector(object):
+    def __init__(self):
+        """JsonFenceDetector watches a streamed generation for the first fenced ```json block,
+        the same block `construct.py` and the reasoners extract with r'```json\\n(.*?)\\n```',
+        and reports when its closing fence has been emitted so that decoding can stop there.
+        Each delta is scanned once, so feeding a whole generation costs O(length).
+        """
+        self.chunks: list[str] = []
+        self.length = 0
+        # Tail of the text already scanned, long enough to hold a fence split across deltas
+        self.tail = ''
+        self.start: Optional[int] = None
+        self.end: Optional[int] = None
+
+    @property
+    def text(self) -> str:
+        return ''.join(self.chunks)
+
+    @property
+    def done(self) -> bool:
+        return self.end is not None
+
+    def feed(self, delta: str) -> bool:
+        """
+        Append a delta of the generation and return whether the JSON block is complete.
+        """
+        if self.done or len(delta) == 0:
+            return self.done
+        window = self.tail + delta
+        offset = self.length - len(self.tail)
+        self.chunks.append(delta)
+        self.length += len(delta)
+        if self.start is None:
+            i = window.find(JSON_FENCE_OPEN)
+            if i >= 0:
+                self.start = offset + i + len(JSON_FENCE_OPEN)
+                window = window[i + len(JSON_FENCE_OPEN):]
+                offset = self.start
+        if self.start is not None:
+            j = window.find(JSON_FENCE_CLOSE, max(0, self.start - offset))
+            if j >= 0:
+                self.end = offset + j
+        self.tail = window[-(len(JSON_FENCE_OPEN) - 1):]
+        return self.done
+
+    @property
+    def block(self) -> Optional[str]:
+        """
+        Content of the JSON block, once it is complete.
+        """
+        if not self.done:
+            return None
+        return self.text[self.start:self.end]
+
+
+def stop_at_json_fence(deltas: Iterable[str]) -> Iterator[str]:
+    """
+    Pass a stream of text deltas through until the closing fence of its first ```json block,
+    then close the underlying stream so that the engine stops decoding.
+    """
+    detector = JsonFenceDetector()
+    try:
+        for delta in deltas:
+            length = detector.length
+            if detector.feed(delta):
+                yield delta[:detector.end + len(JSON_FENCE_CLOSE) - length]
+                return
+            yield delta
+    finally:
+        close = getattr(deltas, 'close', None)
+        if close is not None:
+            close()
+
+
+async def iterate_in_thread(iterator: Iterator) -> AsyncIterator:
+    """
+    Drive a blocking iterator from a worker thread and yield its items to an event loop.
+    Closing the async iterator early closes the blocking one after its next item.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    end = object()
+
+    def worker():
+        try:
+            for item in iterator:
+                loop.call_soon_threadsafe(queue.put_nowait, (item, None))
+                if stop.is_set():
+                    break
+        except BaseException as e:
+            loop.call_soon_threadsafe(queue.put_nowait, (end, e))
+            return
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+        loop.call_soon_threadsafe(queue.put_nowait, (end, None))
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is end:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
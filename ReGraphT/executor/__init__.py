@@ -1,2 +1,3 @@
 from .base import Executor
-from .utils import load_cuda_eval_dataset, load_par_eval_dataset
\ No newline at end of file
+from .parallel import ParallelExecutor
+from .compiler import CompileHarness, CompileResult, RunResult
@@ -1,6 +1,9 @@
 import abc
+import logging
+from typing import Optional
 
 from ReGraphT.reasoner import Reasoner
+from .compiler import CompileHarness
 
 __all__ = ['Executor']
 
@@ -19,10 +22,13 @@ class Executor(abc.ABC):
     def __init__(
         self,
         agent: Reasoner,
+        harness: Optional[CompileHarness]=None,
         **kwargs
 ):
         super(Executor, self).__init__()
         self.agent: Reasoner = agent
+        # Compiles and runs candidate code, so that results do not rest on what the LLM claims
+        self.harness: Optional[CompileHarness] = harness
         
     @staticmethod
     def create_executor(
@@ -33,11 +39,73 @@ class Executor(abc.ABC):
         cls = EXECUTOR_REGISTRY[dataset]
         return cls(agent, **kwargs)
         
-    @abc.abstractmethod
     def run(
         self,
         kernels: list[dict],
-    ):
-        ...
+    ) -> dict:
+        """
+        Run every kernel through `run_kernel`, then report them with `aggregate`. Dataset executors
+        override those two methods rather than `run`, so that `ParallelExecutor` evaluates and
+        reports a parallel run exactly like a serial one.
+        """
+        results = []
+        for kernel in kernels:
+            try:
+                results.append(self.run_kernel(kernel))
+            except Exception as e:
+                logging.error(f"Error in kernel {kernel.get('index')}: {e}")
+                results.append(None)
+        return self.aggregate(kernels, results)
+
+    def run_kernel(
+        self,
+        kernel: dict
+    ) -> dict:
+        """
+        Optimize a single kernel with the agent. Executors that also compile and evaluate 
+        the optimized code override it; `ParallelExecutor` calls it in its workers.
+        """
+        return self.agent.optimize(kernel)
+
+    def aggregate(
+        self,
+        kernels: list[dict],
+        results: list[Optional[dict]]
+    ) -> dict:
+        """
+        Report the results of a run, given in the order of `kernels` with None for failed kernels.
+        Runs without the agent, so that the parent of a parallel run can call it.
+        Results evaluated by the harness (under "evaluation") are summarized as compile and
+        correctness rates and the mean speedup.
+        """
+        completed = [result for result in results if result is not None]
+        report = {
+            "kernels": len(kernels),
+            "completed": len(completed),
+            "failed": len(kernels) - len(completed),
+        }
+        evaluations = [result['evaluation'] for result in completed if isinstance(result.get('evaluation'), dict)]
+        if len(evaluations) > 0:
+            speedups = [evaluation['speedup'] for evaluation in evaluations if evaluation.get('correct') and evaluation.get('speedup')]
+            report["compiled"] = sum(bool(evaluation.get('compiled')) for evaluation in evaluations)
+            report["correct"] = sum(bool(evaluation.get('correct')) for evaluation in evaluations)
+            report["mean_speedup"] = sum(speedups) / len(speedups) if len(speedups) > 0 else None
+        logging.info(f"{report['completed']}/{report['kernels']} kernels completed")
+        report["results"] = results
+        return report
+
+    def evaluate(
+        self,
+        code: str,
+        reference: Optional[str]=None,
+        stdin: Optional[str]=None
+    ) -> Optional[dict]:
+        """
+        Compile and run candidate code with the harness, checking it against a reference program
+        (e.g. the original host code) when given. Returns None without a harness.
+        """
+        if self.harness is None:
+            return None
+        return self.harness.evaluate(code, reference=reference, stdin=stdin)
         
     
\ No newline at end of file
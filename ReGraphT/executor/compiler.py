@@ -0,0 +1,521 @@
+import os
+import re
+import json
+import time
+import shutil
+import signal
+import hashlib
+import logging
+import tempfile
+import threading
+import subprocess
+from dataclasses import dataclass, asdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Sequence
+
+__all__ = ['CompileResult', 'RunResult', 'CompileHarness', 'outputs_match', 'rewrite_launches']
+
+# Header force-included when CUDA code is built as C++ on a machine without nvcc. Kernel launches
+# are rewritten into loops running every thread of every block in turn, which is exact for kernels
+# whose threads do not cooperate; `__syncthreads` aborts the program instead of deadlocking.
+CUDA_EMULATION_HEADER = r"""#pragma once
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <cmath>
+#include <algorithm>
+#define __global__
+#define __device__
+#define __host__
+#define __constant__
+#define __shared__ static
+#define __forceinline__ inline
+#define __restrict__ __restrict
+struct dim3 {
+    unsigned int x, y, z;
+    dim3(unsigned int x = 1, unsigned int y = 1, unsigned int z = 1) : x(x), y(y), z(z) {}
+};
+typedef dim3 uint3;
+inline dim3 threadIdx, blockIdx, blockDim, gridDim;
+template <class F>
+inline void cuda_emulation_launch(dim3 grid, dim3 block, F kernel) {
+    gridDim = grid;
+    blockDim = block;
+    for (unsigned int bz = 0; bz < grid.z; ++bz)
+    for (unsigned int by = 0; by < grid.y; ++by)
+    for (unsigned int bx = 0; bx < grid.x; ++bx) {
+        blockIdx = dim3(bx, by, bz);
+        for (unsigned int tz = 0; tz < block.z; ++tz)
+        for (unsigned int ty = 0; ty < block.y; ++ty)
+        for (unsigned int tx = 0; tx < block.x; ++tx) {
+            threadIdx = dim3(tx, ty, tz);
+            kernel();
+        }
+    }
+}
+inline void __syncthreads() {
+    std::fprintf(stderr, "__syncthreads is not supported by the CUDA emulation\n");
+    std::exit(3);
+}
+typedef int cudaError_t;
+typedef void *cudaStream_t;
+enum { cudaSuccess = 0 };
+enum cudaMemcpyKind { cudaMemcpyHostToHost, cudaMemcpyHostToDevice, cudaMemcpyDeviceToHost, cudaMemcpyDeviceToDevice, cudaMemcpyDefault };
+template <class T> inline cudaError_t cudaMalloc(T **ptr, size_t size) { *ptr = (T *)std::malloc(size); return cudaSuccess; }
+template <class T> inline cudaError_t cudaMallocManaged(T **ptr, size_t size, unsigned int = 0) { *ptr = (T *)std::malloc(size); return cudaSuccess; }
+inline cudaError_t cudaFree(void *ptr) { std::free(ptr); return cudaSuccess; }
+inline cudaError_t cudaMemcpy(void *dst, const void *src, size_t size, cudaMemcpyKind) { std::memcpy(dst, src, size); return cudaSuccess; }
+inline cudaError_t cudaMemset(void *ptr, int value, size_t size) { std::memset(ptr, value, size); return cudaSuccess; }
+inline cudaError_t cudaDeviceSynchronize() { return cudaSuccess; }
+inline cudaError_t cudaGetLastError() { return cudaSuccess; }
+inline cudaError_t cudaPeekAtLastError() { return cudaSuccess; }
+inline const char *cudaGetErrorString(cudaError_t) { return "no error"; }
+template <class T> inline T atomicAdd(T *address, T value) { T old = *address; *address += value; return old; }
+template <class T> inline T atomicSub(T *address, T value) { T old = *address; *address -= value; return old; }
+template <class T> inline T atomicMax(T *address, T value) { T old = *address; *address = std::max(old, value); return old; }
+template <class T> inline T atomicMin(T *address, T value) { T old = *address; *address = std::min(old, value); return old; }
+template <class T> inline T atomicExch(T *address, T value) { T old = *address; *address = value; return old; }
+using std::min;
+using std::max;
+"""
+
+LAUNCH_PATTERN = re.compile(r'([A-Za-z_][\w:]*(?:\s*<[^<>;]*>)?)\s*<<<(.*?)>>>\s*\(', re.DOTALL)
+CUDA_MARKERS = ('__global__', '<<<', 'cudaMalloc', '__device__')
+
+
+def split_arguments(text: str) -> list[str]:
+    """
+    Split a comma-separated argument list at the top nesting level.
+    """
+    arguments, depth, start = [], 0, 0
+    for i, c in enumerate(text):
+        if c in '([{<':
+            depth += 1
+        elif c in ')]}>':
+            depth -= 1
+        elif c == ',' and depth == 0:
+            arguments.append(text[start:i].strip())
+            start = i + 1
+    arguments.append(text[start:].strip())
+    return arguments
+
+
+def rewrite_launches(source: str) -> str:
+    """
+    Rewrite `kernel<<<grid, block[, shared, stream]>>>(args)` into a call of the emulated launcher.
+    """
+    output = []
+    position = 0
+    for match in LAUNCH_PATTERN.finditer(source):
+        if match.start() < position:
+            continue
+        # Find the parenthesis closing the kernel arguments
+        depth, end = 1, match.end()
+        while end < len(source) and depth > 0:
+            if source[end] == '(':
+                depth += 1
+            elif source[end] == ')':
+                depth -= 1
+            end += 1
+        grid, block = split_arguments(match.group(2))[:2]
+        arguments = source[match.end():end - 1]
+        output.append(source[position:match.start()])
+        output.append(f"cuda_emulation_launch(dim3({grid}), dim3({block}), [&]() {{ {match.group(1)}({arguments}); }})")
+        position = end
+    output.append(source[position:])
+    return ''.join(output)
+
+
+# Shell run by `unshare` in the new mount namespace: remounts the directory given as first argument
+# read-only, then executes the remaining arguments
+REMOUNT_READONLY = 'mount --bind "$1" "$1" && mount -o remount,bind,ro "$1" && shift && exec "$@"'
+ISOLATIONS = ('auto', 'bwrap', 'unshare', 'none')
+
+
+NUMBER_PATTERN = re.compile(r'[-+]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?|[-+]?(?:inf|nan)', re.IGNORECASE)
+
+
+def outputs_match(expected: str, actual: str, rtol: float=1e-4, atol: float=1e-6) -> bool:
+    """
+    Compare two program outputs token by token, numbers within a relative and absolute tolerance,
+    so that a floating-point reduction in a different order still counts as correct.
+    """
+    expected_tokens, actual_tokens = expected.split(), actual.split()
+    if len(expected_tokens) != len(actual_tokens):
+        return False
+    for e, a in zip(expected_tokens, actual_tokens):
+        if e == a:
+            continue
+        if NUMBER_PATTERN.fullmatch(e) is None or NUMBER_PATTERN.fullmatch(a) is None:
+            return False
+        e, a = float(e), float(a)
+        if e != e and a != a:
+            continue
+        if abs(e - a) > atol + rtol * abs(e):
+            return False
+    return True
+
+
+@dataclass
+class CompileResult:
+    """Result of compiling a source.
+    success: Whether a binary was produced
+    compiler: Compiler command, `nvcc`, or the C++ compiler for host code and emulated CUDA
+    mode: "cuda", "cpp" or "emulated"
+    log: Compiler output
+    binary: Path of the binary in the cache
+    compile_time: Compilation wall time in seconds
+    cached: Whether the result was served from the cache
+    timeout: Whether the compiler was killed for exceeding its time limit; such results are not cached
+    """
+    success: bool
+    compiler: str
+    mode: str
+    log: str = ""
+    binary: Optional[str] = None
+    compile_time: float = 0.0
+    cached: bool = False
+    timeout: bool = False
+
+
+@dataclass
+class RunResult:
+    """Result of running a binary.
+    success: Whether it exited with code 0 within its time limit
+    returncode: Exit code, None after a timeout
+    stdout: Standard output
+    stderr: Standard error
+    time: Fastest wall time in seconds over the repeats
+    timeout: Whether it was killed for exceeding its time limit
+    """
+    success: bool
+    returncode: Optional[int]
+    stdout: str = ""
+    stderr: str = ""
+    time: float = 0.0
+    timeout: bool = False
+
+
+class CompileHarness(object):
+    def __init__(
+        self,
+        cache_dir: str,
+        max_workers: int=4,
+        compile_timeout: float=120.0,
+        run_timeout: float=30.0,
+        memory_limit_mb: Optional[int]=4096,
+        nvcc: Optional[str]='nvcc',
+        cxx: str='g++',
+        nvcc_flags: Sequence[str]=('-O3',),
+        cxx_flags: Sequence[str]=('-O2', '-std=c++17'),
+        isolation: str='auto'
+    ):
+        """CompileHarness compiles and runs candidate CUDA/C++ code in sandboxed subprocesses:
+        each build or run gets a fresh temporary directory, a wall-clock timeout that kills its
+        process group, CPU, memory and file size limits (set by `prlimit`), and no network. With
+        bubblewrap the rest of the filesystem is read-only and /tmp private; with `unshare` only
+        the compilation cache is read-only. Compiler results are cached on disk by the hash of the
+        source, the compiler and its flags, and identical sources compiled concurrently share one
+        compilation; timed-out compilations are retried rather than cached. Without nvcc, CUDA code
+        is built as C++ against a CUDA emulation header, so correctness checks and host-side timing
+        run without a GPU.
+        cache_dir: Directory of the compilation cache
+        max_workers: Number of concurrent compilations
+        compile_timeout: Time limit of a compilation in seconds
+        run_timeout: Default time limit of a run in seconds
+        memory_limit_mb: Address space limit of compilers and programs, unlimited if None
+        nvcc: CUDA compiler, CUDA code is emulated if None or not installed
+        cxx: C++ compiler for host code and emulated CUDA
+        isolation: "bwrap" (bubblewrap), "unshare" (unprivileged user, network and mount namespaces),
+            "none" (limits only), or "auto" for the strongest one available
+        """
+        self.cache_dir = os.path.abspath(cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.compile_timeout = compile_timeout
+        self.run_timeout = run_timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.nvcc = shutil.which(nvcc) if nvcc is not None else None
+        self.cxx = shutil.which(cxx)
+        if self.cxx is None:
+            raise FileNotFoundError(f"C++ compiler {cxx} not found")
+        self.prlimit = shutil.which('prlimit')
+        if self.prlimit is None:
+            raise FileNotFoundError("prlimit (util-linux) not found")
+        self.isolation = self.resolve_isolation(isolation)
+        self.nvcc_flags = list(nvcc_flags)
+        self.cxx_flags = list(cxx_flags)
+        self.include_dir = os.path.join(self.cache_dir, 'include')
+        os.makedirs(self.include_dir, exist_ok=True)
+        for header in ('cuda_emulation.h', 'cuda_runtime.h', 'cuda.h'):
+            with open(os.path.join(self.include_dir, header), 'w') as f:
+                f.write(CUDA_EMULATION_HEADER)
+        self.versions = {
+            compiler: self.version(compiler) for compiler in (self.nvcc, self.cxx) if compiler is not None
+        }
+
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.results: dict[str, CompileResult] = {}
+        # Compilations in progress, so that identical candidates are compiled once
+        self.pending: dict[str, Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def version(compiler: str) -> str:
+        output = subprocess.run([compiler, '--version'], capture_output=True, text=True).stdout
+        return output.strip().splitlines()[-1] if output.strip() else compiler
+
+    @staticmethod
+    def is_cuda(source: str) -> bool:
+        return any(marker in source for marker in CUDA_MARKERS)
+
+    @staticmethod
+    def available(command: list[str]) -> bool:
+        try:
+            return subprocess.run(command, capture_output=True, timeout=10).returncode == 0
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+
+    def resolve_isolation(self, isolation: str) -> str:
+        """
+        Check that the requested isolation works on this machine, picking the strongest one for "auto".
+        """
+        if isolation not in ISOLATIONS:
+            raise ValueError(f"isolation must be one of {ISOLATIONS}, got {isolation}")
+        if isolation in ('auto', 'bwrap'):
+            self.bwrap = shutil.which('bwrap')
+            if self.bwrap is not None and self.available([self.bwrap, '--ro-bind', '/', '/', '--unshare-all', '--', 'true']):
+                return 'bwrap'
+            if isolation == 'bwrap':
+                raise RuntimeError("bubblewrap is not installed or cannot create namespaces")
+        if isolation in ('auto', 'unshare'):
+            self.unshare = shutil.which('unshare')
+            if self.unshare is not None and self.available([self.unshare, '--user', '--map-root-user', '--net', '--mount', '--', 'true']):
+                return 'unshare'
+            if isolation == 'unshare':
+                raise RuntimeError("unshare is not installed or unprivileged user namespaces are disabled")
+        if isolation == 'auto':
+            logging.warning("No sandbox available, compilers and programs keep the filesystem and network access of the harness")
+        return 'none'
+
+    def sandbox(self, command: list[str], cwd: str, timeout: float) -> list[str]:
+        """
+        Wrap a command with its resource limits and isolation. Limits are set by `prlimit` rather than
+        a `preexec_fn`, which is unsafe in the threads of the compilation pool.
+        """
+        cpu = int(timeout) + 1
+        limited = [self.prlimit, f'--cpu={cpu}:{cpu + 1}', f'--fsize={1 << 30}', '--core=0']
+        if self.memory_limit_mb is not None:
+            limited.append(f'--as={self.memory_limit_mb * (1 << 20)}')
+        limited += ['--', *command]
+        if self.isolation == 'bwrap':
+            return [
+                self.bwrap, '--ro-bind', '/', '/', '--dev', '/dev', '--proc', '/proc', '--tmpfs', '/tmp',
+                '--ro-bind', self.cache_dir, self.cache_dir, '--bind', cwd, cwd, '--chdir', cwd,
+                '--unshare-all', '--die-with-parent', '--new-session', '--', *limited
+            ]
+        if self.isolation == 'unshare':
+            return [
+                self.unshare, '--user', '--map-root-user', '--net', '--mount', '--propagation', 'private', '--',
+                'sh', '-c', REMOUNT_READONLY, 'sh', self.cache_dir, *limited
+            ]
+        return limited
+
+    def execute(self, command: list[str], cwd: str, timeout: float, stdin: Optional[str]=None) -> tuple[Optional[int], str, str, float, bool]:
+        """
+        Run a command in the sandbox and its own session, killing the whole process group on timeout.
+        Returns the exit code, stdout, stderr, wall time and whether it timed out.
+        """
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            self.sandbox(command, cwd, timeout),
+            cwd=cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            start_new_session=True
+        )
+        try:
+            stdout, stderr = process.communicate(input=stdin, timeout=timeout)
+            return process.returncode, stdout, stderr, time.perf_counter() - start, False
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            stdout, stderr = process.communicate()
+            return None, stdout, stderr, time.perf_counter() - start, True
+
+    def toolchain(self, source: str, language: Optional[str]=None) -> tuple[str, str, list[str]]:
+        """
+        Choose the mode, compiler and flags of a source: nvcc for CUDA when installed, otherwise
+        the C++ compiler, with the CUDA emulation header for CUDA code.
+        """
+        if language is None:
+            language = 'cuda' if self.is_cuda(source) else 'cpp'
+        if language == 'cuda' and self.nvcc is not None:
+            return 'cuda', self.nvcc, self.nvcc_flags
+        if language == 'cuda':
+            return 'emulated', self.cxx, self.cxx_flags + ['-x', 'c++', '-I', self.include_dir, '-include', 'cuda_emulation.h']
+        return 'cpp', self.cxx, self.cxx_flags
+
+    def key(self, source: str, language: Optional[str]=None) -> str:
+        mode, compiler, flags = self.toolchain(source, language)
+        fields = [mode, compiler, self.versions.get(compiler, ''), *flags, source]
+        return hashlib.sha256('\0'.join(fields).encode('utf-8')).hexdigest()
+
+    def lookup(self, key: str) -> Optional[CompileResult]:
+        result = self.results.get(key)
+        if result is not None:
+            return result
+        path = os.path.join(self.cache_dir, key[:2], key, 'result.json')
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                result = CompileResult(**json.load(f))
+            if result.binary is None or os.path.exists(result.binary):
+                self.results[key] = result
+                return result
+        return None
+
+    def build(self, key: str, source: str, language: Optional[str]) -> CompileResult:
+        mode, compiler, flags = self.toolchain(source, language)
+        if mode == 'emulated':
+            source = rewrite_launches(source)
+        entry_dir = os.path.join(self.cache_dir, key[:2], key)
+        with tempfile.TemporaryDirectory(prefix='regrapht-build-') as build_dir:
+            source_path = os.path.join(build_dir, 'main.cu' if mode == 'cuda' else 'main.cpp')
+            with open(source_path, 'w') as f:
+                f.write(source)
+            binary_path = os.path.join(build_dir, 'main')
+            returncode, stdout, stderr, elapsed, timeout = self.execute(
+                [compiler, *flags, source_path, '-o', binary_path],
+                cwd=build_dir,
+                timeout=self.compile_timeout
+            )
+            result = CompileResult(
+                success=returncode == 0 and not timeout and os.path.exists(binary_path),
+                compiler=compiler,
+                mode=mode,
+                log=(stdout + stderr)[-20000:] + ("\ncompilation timed out" if timeout else ""),
+                compile_time=elapsed,
+                timeout=timeout
+            )
+            if timeout:
+                # A compiler killed on a loaded machine may succeed on retry, so the failure is not cached
+                return result
+            os.makedirs(entry_dir, exist_ok=True)
+            if result.success:
+                result.binary = os.path.join(entry_dir, 'main')
+                os.replace(binary_path, result.binary)
+        tmp_path = os.path.join(entry_dir, 'result.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(asdict(result), f)
+        os.replace(tmp_path, os.path.join(entry_dir, 'result.json'))
+        return result
+
+    def compile_async(self, source: str, language: Optional[str]=None) -> Future:
+        """
+        Compile a source in the pool. The future of an identical source already being compiled is reused.
+        language: "cuda" or "cpp", detected from the source if None
+        """
+        key = self.key(source, language)
+        with self.lock:
+            result = self.lookup(key)
+            if result is not None:
+                self.hits += 1
+                future = Future()
+                future.set_result(CompileResult(**{**asdict(result), 'cached': True}))
+                return future
+            if key in self.pending:
+                self.hits += 1
+                return self.pending[key]
+            self.misses += 1
+            future = self.pool.submit(self.build, key, source, language)
+            self.pending[key] = future
+
+        def done(future: Future):
+            with self.lock:
+                self.pending.pop(key, None)
+                if future.exception() is None and not future.result().timeout:
+                    self.results[key] = future.result()
+        future.add_done_callback(done)
+        return future
+
+    def compile(self, source: str, language: Optional[str]=None) -> CompileResult:
+        return self.compile_async(source, language).result()
+
+    def compile_many(self, sources: Sequence[str], language: Optional[str]=None) -> list[CompileResult]:
+        futures = [self.compile_async(source, language) for source in sources]
+        return [future.result() for future in futures]
+
+    def run(
+        self,
+        result: CompileResult,
+        stdin: Optional[str]=None,
+        args: Sequence[str]=(),
+        timeout: Optional[float]=None,
+        repeats: int=1
+    ) -> RunResult:
+        """
+        Run a compiled binary in a fresh temporary directory, keeping the fastest of `repeats` runs.
+        """
+        if not result.success:
+            return RunResult(success=False, returncode=None, stderr="compilation failed")
+        timeout = timeout if timeout is not None else self.run_timeout
+        best = None
+        for _ in range(repeats):
+            with tempfile.TemporaryDirectory(prefix='regrapht-run-') as run_dir:
+                returncode, stdout, stderr, elapsed, timed_out = self.execute(
+                    [result.binary, *args], cwd=run_dir, timeout=timeout, stdin=stdin
+                )
+            run = RunResult(
+                success=returncode == 0 and not timed_out,
+                returncode=returncode,
+                stdout=stdout,
+                stderr=stderr[-20000:],
+                time=elapsed,
+                timeout=timed_out
+            )
+            if not run.success:
+                return run
+            if best is None or run.time < best.time:
+                best = run
+        return best
+
+    def evaluate(
+        self,
+        source: str,
+        reference: Optional[str]=None,
+        stdin: Optional[str]=None,
+        repeats: int=3,
+        timeout: Optional[float]=None
+    ) -> dict:
+        """
+        Compile and run a candidate, and check it against a reference program (e.g. the original
+        host C++ code) on the same input: outputs must match within tolerance, and the speedup is
+        the ratio of their fastest wall times.
+        """
+        sources = [source] if reference is None else [source, reference]
+        results = self.compile_many(sources)
+        evaluation = {"compiled": results[0].success, "compile": asdict(results[0])}
+        if not results[0].success:
+            return evaluation
+        run = self.run(results[0], stdin=stdin, timeout=timeout, repeats=repeats)
+        evaluation["run"] = asdict(run)
+        if reference is None or not run.success:
+            return evaluation
+        reference_run = self.run(results[1], stdin=stdin, timeout=timeout, repeats=repeats)
+        evaluation["reference_run"] = asdict(reference_run)
+        if reference_run.success:
+            evaluation["correct"] = outputs_match(reference_run.stdout, run.stdout)
+            evaluation["speedup"] = reference_run.time / run.time if run.time > 0 else None
+        return evaluation
+
+    def stats(self) -> dict:
+        """
+        Compilation cache hits (including joins of in-progress compilations) and misses.
+        """
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.results)}
+
+    def close(self):
+        self.pool.shutdown(wait=True)
@@ -0,0 +1,129 @@
+import os
+import json
+import logging
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from .base import Executor
+
+__all__ = ['ParallelExecutor']
+
+# Executor of the current worker process, built once by `init_worker`
+WORKER_EXECUTOR: Optional[Executor] = None
+
+
+def init_worker(build_executor: Callable[[], Executor]):
+    global WORKER_EXECUTOR
+    WORKER_EXECUTOR = build_executor()
+
+
+def run_in_worker(kernel: dict) -> dict:
+    return WORKER_EXECUTOR.run_kernel(kernel)
+
+
+class ParallelExecutor(Executor):
+    def __init__(
+        self,
+        build_executor: Callable[[], Executor],
+        num_workers: int=4,
+        results_path: Optional[str]=None,
+        key: str='index',
+        mp_context: str='spawn',
+        reporter: Optional[Executor]=None
+    ):
+        """ParallelExecutor fans the kernels of a dataset out over a process pool. Every worker
+        builds its own executor, with its own engine, reasoner and read-only ReGraph (a packed
+        ReGraph is memory-mapped, so workers share its pages). Kernels are handed out one at a time,
+        longest first, so a slow kernel holds up a single worker instead of a whole shard.
+        build_executor: Picklable function building the executor of a worker, e.g. a `functools.partial`
+        num_workers: Number of worker processes
+        results_path: JSONL file receiving the result of every kernel as it completes;
+            kernels with a result in it are skipped when the run is resumed
+        key: Kernel field identifying a kernel in the results file
+        mp_context: Start method of the workers, CUDA and vLLM need "spawn"
+        reporter: Executor of the dataset, built without an agent in the parent, whose `aggregate`
+            reports the collected results as a serial run of the dataset would
+        """
+        super(ParallelExecutor, self).__init__(agent=None)
+        self.build_executor = build_executor
+        self.num_workers = num_workers
+        self.results_path = results_path
+        self.key = key
+        self.mp_context = mp_context
+        self.reporter = reporter
+
+    def load_results(self) -> dict:
+        """
+        Read the results checkpointed by a previous run. Failed kernels and lines torn by a crash are ignored.
+        """
+        results = {}
+        if self.results_path is None or not os.path.exists(self.results_path):
+            return results
+        with open(self.results_path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get('error') is None:
+                    results[record['key']] = record['result']
+        return results
+
+    def run(
+        self,
+        kernels: list[dict],
+    ) -> dict:
+        """
+        Run every kernel in the workers and report their results, in the order of `kernels` and None
+        for failed kernels, with the `aggregate` of the reporter.
+        """
+        results = self.load_results()
+        pending = [kernel for kernel in kernels if kernel[self.key] not in results]
+        logging.info(f"{len(kernels) - len(pending)} kernels resumed from {self.results_path}, {len(pending)} to run on {self.num_workers} workers")
+        # Longest kernels first keeps the last busy worker from finishing long after the others
+        pending.sort(key=lambda kernel: len(json.dumps(kernel)), reverse=True)
+
+        file = None
+        if self.results_path is not None:
+            file = open(self.results_path, 'a')
+            if file.tell() > 0:
+                # Terminate a line torn by a crash, so that it does not swallow the next record
+                file.write('\n')
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context(self.mp_context),
+                initializer=init_worker,
+                initargs=(self.build_executor,)
+            ) as pool:
+                futures = {pool.submit(run_in_worker, kernel): kernel for kernel in pending}
+                not_done = set(futures)
+                while len(not_done) > 0:
+                    done, not_done = wait(not_done, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        kernel = futures.pop(future)
+                        record = {"key": kernel[self.key], "result": None, "error": None}
+                        try:
+                            record['result'] = future.result()
+                            results[kernel[self.key]] = record['result']
+                        except BrokenProcessPool:
+                            # A worker died (e.g. out of memory), the kernels still pending are lost 
+                            # with it; completed ones are checkpointed and skipped on resume
+                            logging.error(f"Worker pool broken at kernel {kernel[self.key]}, {len(results)}/{len(kernels)} kernels done")
+                            raise
+                        except Exception as e:
+                            logging.error(f"Error in kernel {kernel[self.key]}: {e}")
+                            record['error'] = f"{type(e).__name__}: {e}"
+                        if file is not None:
+                            file.write(json.dumps(record) + '\n')
+                            file.flush()
+        finally:
+            if file is not None:
+                file.close()
+
+        results = [results.get(kernel[self.key]) for kernel in kernels]
+        if self.reporter is not None:
+            return self.reporter.aggregate(kernels, results)
+        return self.aggregate(kernels, results)
@@ -1,2 +1,2 @@
 from .ReGraph import CUDA_REASONING_SYSTEM_PROMPT, CUDA_RELABEL_SYSTEM_PROMPT
-from .agent import STANDARD_SYSTEM_PROMPT, COT_SYSTEM_PROMPT
+from .agent import STANDARD_SYSTEM_PROMPT, COT_SYSTEM_PROMPT, CODERAG_SYSTEM_PROMPT, REGRAPHT_SYSTEM_PROMPT
@@ -0,0 +1,267 @@
+import re
+import json
+import math
+import logging
+from typing import Callable, Optional
+
+from .base import Reasoner
+from .transposition import TranspositionEntry, TranspositionTable
+from ReGraphT.engine import SamplingParams, InferenceEngine
+from ReGraphT.ReGraph import ReGraph, ReGraphEdge
+from ReGraphT.prompt import REGRAPHT_SYSTEM_PROMPT
+
+__all__ = ['ReGraphTReasoner', 'ReGraphTMCGSReasoner']
+
+
+class ReGraphTReasoner(Reasoner):
+    def __init__(
+        self,
+        engine: InferenceEngine,
+        regraph: ReGraph,
+        config: Optional[SamplingParams]=None,
+        max_depth: int=4
+    ):
+        """ReGraphTReasoner optimizes a kernel by walking the ReGraph from its initial state, following at each
+        step the most probable transition to a method not applied yet. Each method is applied by one generation,
+        prompted with the example of the transition whose code is most similar to the current code.
+        regraph: ReGraph of optimization methods and their examples
+        config: Sampling parameters of the generations
+        max_depth: Number of optimization steps at most
+        """
+        super(ReGraphTReasoner, self).__init__(engine)
+        self.regraph = regraph
+        self.config = config if config is not None else SamplingParams()
+        self.max_depth = max_depth
+
+    def messages(self, edge: ReGraphEdge, code: str) -> list[dict]:
+        """
+        Prompt applying the method of an edge's target to a code, with the edge's most similar example.
+        """
+        examples = self.regraph.similar_examples(edge, code, k=1)
+        example = examples[0] if len(examples) > 0 else {}
+        prompt = {
+            "code": code,
+            "method": self.regraph.regraph_nodes[edge.tgt].name,
+            "example": {
+                "detail": example.get('detail', ''),
+                "before": example.get('before', ''),
+                "after": example.get('after', ''),
+            }
+        }
+        return [
+            {"role": "system", "content": REGRAPHT_SYSTEM_PROMPT},
+            {"role": "user", "content": json.dumps(prompt)}
+        ]
+
+    def parse(self, kernel: dict, generation: str) -> Optional[dict]:
+        """
+        The {"think", "code"} response of a generation, None if it has no valid optimized code.
+        """
+        matches = re.findall(r'```json\n(.*?)\n```', generation, re.DOTALL)
+        if len(matches) == 0:
+            logging.error(f"Error in kernel {kernel.get('name')}: No matches optimization found.")
+            return None
+        try:
+            response = json.loads(matches[0])
+            if not isinstance(response.get('code'), str):
+                return None
+            return response
+        except (json.JSONDecodeError, AttributeError) as e:
+            logging.error(f"Error in kernel {kernel.get('name')}: {e}")
+            return None
+
+    def next_edges(self, node: int, visited: set[int], k: int) -> list[ReGraphEdge]:
+        """
+        The `k` most probable transitions from a node to a method that is not in `visited`.
+        """
+        ranking = self.regraph.top_k_successors(node, k=k + len(visited), score='probability')
+        return [edge for edge, _ in ranking if edge.tgt not in visited][:k]
+
+    def optimize(
+        self,
+        kernel: dict,
+        *args,
+        **kwargs,
+    ) -> dict:
+        node = self.regraph.init_state.index
+        code = kernel['kernel']
+        trajectory = []
+        tags = {"kernel": kernel.get('name')}
+        for _ in range(self.max_depth):
+            edges = self.next_edges(node, {step['node'] for step in trajectory} | {node}, k=1)
+            if len(edges) == 0:
+                break
+            edge = edges[0]
+            with self.step("generate", tags=tags):
+                output = self.engine.generate([self.messages(edge, code)], self.config)[0]
+            response = self.parse(kernel, output['generation'])
+            if response is None:
+                break
+            node = edge.tgt
+            code = response['code']
+            trajectory.append({
+                "node": node,
+                "method": self.regraph.regraph_nodes[node].name,
+                "think": response.get('think'),
+                "code": code,
+            })
+        return {
+            "name": kernel.get('name'),
+            "index": kernel.get('index'),
+            "code": code if len(trajectory) > 0 else None,
+            "trajectory": trajectory,
+        }
+
+
+class ReGraphTMCGSReasoner(ReGraphTReasoner):
+    def __init__(
+        self,
+        engine: InferenceEngine,
+        regraph: ReGraph,
+        config: Optional[SamplingParams]=None,
+        simulations: int=16,
+        branching: int=3,
+        max_depth: int=4,
+        exploration: float=1.0,
+        evaluate: Optional[Callable[[dict, str], float]]=None,
+        table: Optional[TranspositionTable]=None,
+        merge_states: bool=True
+    ):
+        """ReGraphTMCGSReasoner optimizes a kernel by Monte Carlo graph search over the ReGraph. A search state is a
+        ReGraph node with the code reached there; expanding a state applies, in one batched generation, the methods
+        of its `branching` most probable transitions. States are selected by UCT and each simulation evaluates the
+        code of the state it ends in. With `merge_states`, states that different paths reach with the same code
+        at the same node are one state of a `TranspositionTable`: they share their children, visit counts, values
+        and reward, so the search is a graph and a code is expanded and evaluated once.
+        regraph: ReGraph of optimization methods and their examples
+        config: Sampling parameters of the generations
+        simulations: Number of simulations of a search
+        branching: Number of transitions expanded per state
+        max_depth: Number of optimization steps at most
+        exploration: UCT exploration constant
+        evaluate: Reward of a code of a kernel, e.g. its speedup; by default 1.0 for every generated code
+        table: Transposition table of the searches, shared across kernels (e.g. to keep rewards). A new table
+            per search if None
+        merge_states: Merge equivalent states, otherwise each path is a distinct state as in a tree search
+        """
+        super(ReGraphTMCGSReasoner, self).__init__(engine, regraph, config=config, max_depth=max_depth)
+        self.simulations = simulations
+        self.branching = branching
+        self.exploration = exploration
+        self.evaluate = evaluate if evaluate is not None else (lambda kernel, code: 1.0)
+        self.table = table
+        self.merge_states = merge_states
+
+    def expand(self, kernel: dict, path: list[dict]) -> list[dict]:
+        """
+        Children of the last state of a path, one per method that was generated successfully.
+        """
+        state = path[-1]
+        edges = self.next_edges(state['node'], {step['node'] for step in path}, k=self.branching)
+        if len(edges) == 0:
+            return []
+        with self.step("expand", tags={"kernel": kernel.get('name')}, width=len(edges)):
+            outputs = self.engine.generate([self.messages(edge, state['code']) for edge in edges], self.config)
+        children = []
+        for edge, output in zip(edges, outputs):
+            response = self.parse(kernel, output['generation'])
+            if response is not None:
+                children.append({
+                    "node": edge.tgt,
+                    "method": self.regraph.regraph_nodes[edge.tgt].name,
+                    "think": response.get('think'),
+                    "code": response['code'],
+                })
+        return children
+
+    def select(self, parent: TranspositionEntry, children: list[tuple[dict, TranspositionEntry]]) -> int:
+        """
+        Index of the child with the highest UCT score, unvisited children first.
+        """
+        best, best_score = 0, -math.inf
+        for i, (_, entry) in enumerate(children):
+            if entry.visits == 0:
+                return i
+            score = entry.value + self.exploration * math.sqrt(math.log(max(parent.visits, 1)) / entry.visits)
+            if score > best_score:
+                best, best_score = i, score
+        return best
+
+    def optimize(
+        self,
+        kernel: dict,
+        *args,
+        **kwargs,
+    ) -> dict:
+        table = self.table if self.table is not None else TranspositionTable()
+        # Without merging, states are keyed by their whole path and their statistics are kept per search
+        entries: dict[tuple, TranspositionEntry] = {}
+        children: dict[tuple, list[dict]] = {}
+
+        def key(path: list[dict]) -> tuple:
+            if self.merge_states:
+                return table.state_key(path[-1])
+            return tuple(table.state_key(state) for state in path)
+
+        def entry(path: list[dict]) -> TranspositionEntry:
+            if self.merge_states:
+                return table.entry(path[-1]['node'], path[-1]['code'])
+            return entries.setdefault(key(path), TranspositionEntry())
+
+        root = {"node": self.regraph.init_state.index, "code": kernel['kernel']}
+        best = None
+        evaluations = 0
+        for _ in range(self.simulations):
+            # Selection: descend through expanded states
+            path = [root]
+            while len(path) <= self.max_depth and key(path) in children:
+                candidates = children[key(path)]
+                if len(candidates) == 0:
+                    break
+                i = self.select(entry(path), [(child, entry(path + [child])) for child in candidates])
+                path = path + [candidates[i]]
+            # Expansion: states reached through another path are not expanded again
+            if len(path) <= self.max_depth and key(path) not in children:
+                expanded = []
+                for child in self.expand(kernel, path):
+                    if self.merge_states and any(table.state_key(other) == table.state_key(child) for other in expanded):
+                        continue
+                    if self.merge_states:
+                        table.get(child['node'], child['code'])
+                    expanded.append(child)
+                children[key(path)] = expanded
+                if len(expanded) > 0:
+                    path = path + [expanded[0]]
+            # Evaluation of the state the simulation ends in
+            leaf = path[-1]
+            if len(path) == 1:
+                reward = 0.0
+            elif self.merge_states:
+                reward = table.cached_reward(leaf['node'], leaf['code'], lambda: self.evaluate(kernel, leaf['code']))
+            else:
+                reward = self.evaluate(kernel, leaf['code'])
+                evaluations += 1
+            if len(path) > 1 and (best is None or reward > best[0]):
+                best = (reward, path)
+            # Backup
+            for depth in range(len(path)):
+                if self.merge_states:
+                    table.update(path[depth]['node'], path[depth]['code'], reward)
+                else:
+                    state = entry(path[:depth + 1])
+                    state.visits += 1
+                    state.value_sum += reward
+
+        stats = table.stats() if self.merge_states else {'entries': len(entries), 'reward_evaluations': evaluations}
+        logging.info(f"MCGS of kernel {kernel.get('name')}: {stats}")
+        return {
+            "name": kernel.get('name'),
+            "index": kernel.get('index'),
+            "code": best[1][-1]['code'] if best is not None else None,
+            "reward": best[0] if best is not None else None,
+            "trajectory": [
+                {field: state[field] for field in ('node', 'method', 'think', 'code')}
+                for state in best[1][1:]
+            ] if best is not None else [],
+            "search": stats,
+        }
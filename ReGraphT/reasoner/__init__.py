@@ -1,7 +1,6 @@
 from .base import Reasoner
+from .transposition import TranspositionEntry, TranspositionTable
 from .standard import StandardReasoner
 from .cot import CoTReasoner
-from .code_rag import CodeRAGReasoner
-from .rethink_mcts import RethinkMCTSReasoner
-from .mcts_rag import MCTSRAGReasoner
+from .code_rag import CodeRAGReasoner, CodeRetrievalIndex
 from .ReGraphT_reasoner import *
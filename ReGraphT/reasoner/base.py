@@ -1,4 +1,6 @@
 import abc
+from contextlib import contextmanager
+from typing import Optional
 
 from ReGraphT.engine import (
     EngineType, 
@@ -6,6 +8,7 @@ from ReGraphT.engine import (
     SamplingParams, 
     InferenceEngine
 )
+from ReGraphT.utils import get_recorder
 
 __all__ = ['Reasoner']
 
@@ -25,3 +28,13 @@ class Reasoner(abc.ABC):
         **kwargs,
     ) -> dict:
         ...
+
+    @contextmanager
+    def step(self, name: str, tags: Optional[dict]=None, **fields):
+        """
+        Record a reasoner step (e.g. retrieval, expansion, evaluation) with its latency.
+        The yielded dictionary collects further fields, e.g. parse failures or tokens.
+        tags: Identifiers of the step, e.g. the kernel name
+        """
+        with get_recorder().timer("reasoner_step", f"{type(self).__name__}.{name}", tags=tags, **fields) as metrics:
+            yield metrics
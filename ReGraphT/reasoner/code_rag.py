@@ -0,0 +1,353 @@
+import os
+import re
+import json
+import logging
+import argparse
+from typing import Iterable, Optional
+
+import numpy as np
+
+from .base import Reasoner
+from ReGraphT.engine import SamplingParams, InferenceEngine
+from ReGraphT.ReGraph import ReGraph, CodeStore
+from ReGraphT.ReGraph.example_index import MinHasher
+from ReGraphT.prompt import CODERAG_SYSTEM_PROMPT
+from ReGraphT.utils import read_jsonl
+
+__all__ = ['CodeRetrievalIndex', 'CodeRAGReasoner']
+
+# Odd multiplier folding the rows of an LSH band into a bucket key
+BAND_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def regraph_pairs(re_graph: ReGraph) -> Iterable[dict]:
+    """
+    The examples of every edge of a ReGraph as pairs, labeled with the method of the edge's target.
+    """
+    for edge in re_graph.regraph_edges:
+        for example in edge.examples:
+            yield {
+                "name": example.get('name'),
+                "method": re_graph.regraph_nodes[edge.tgt].name,
+                "detail": example.get('detail', ''),
+                "before": example['before'],
+                "after": example['after'],
+            }
+
+
+def pair_digest(pair: dict) -> str:
+    return CodeStore.digest(pair['before'] + '\0' + pair['after'])
+
+
+class CodeRetrievalIndex(object):
+    def __init__(self, num_perm: int=64, bands: int=8, ngram: int=3, seed: int=0):
+        """CodeRetrievalIndex retrieves, from a whole corpus of (before, after) optimization pairs, the pairs
+        whose `before` code is most similar to a query code, locally and without embeddings. Codes are
+        summarized by MinHash signatures over their token n-grams; locality-sensitive hashing over bands of
+        the signatures finds the candidates, which are ranked by their estimated Jaccard similarity.
+        Band buckets are sorted arrays, so a query is a few binary searches, and a saved index is loaded
+        memory-mapped.
+        num_perm: Number of hash permutations of a signature
+        bands: Number of LSH bands, pairs sharing all `num_perm / bands` values of a band are candidates.
+            More bands find less similar candidates, at the cost of more candidates to rank
+        ngram: Number of consecutive tokens of a shingle
+        seed: Seed of the hash permutations
+        """
+        if num_perm % bands != 0:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.hasher = MinHasher(num_perm=num_perm, ngram=ngram, seed=seed)
+        self.bands = bands
+        self.documents: list[dict] = []
+        # Digests of the indexed (before, after) pairs, to skip duplicates
+        self.digests: set[str] = set()
+        self.count = 0
+        self.signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self.band_keys = np.empty((0, bands), dtype=np.uint64)
+        # Per band, the band keys in ascending order and the document of each, rebuilt after additions
+        self.sorted_keys: Optional[np.ndarray] = None
+        self.sorted_ids: Optional[np.ndarray] = None
+
+    def __len__(self):
+        return self.count
+
+    def keys(self, signatures: np.ndarray) -> np.ndarray:
+        """
+        LSH bucket key of every band of a (number of codes, num_perm) signature matrix.
+        """
+        rows = signatures.reshape(len(signatures), self.bands, -1).astype(np.uint64)
+        keys = np.zeros((len(signatures), self.bands), dtype=np.uint64)
+        for i in range(rows.shape[2]):
+            keys = keys * BAND_MULTIPLIER + rows[:, :, i]
+        return keys
+
+    def add(self, before: str, after: str, **metadata) -> bool:
+        """
+        Index a (before, after) pair with its metadata (e.g. kernel name, optimization method and detail).
+        Returns False if the pair is already indexed.
+        """
+        return self.add_pairs([{**metadata, "before": before, "after": after}]) == 1
+
+    def add_pairs(self, pairs: Iterable[dict]) -> int:
+        """
+        Index many pairs, dictionaries with "before" and "after" code and any metadata. Returns the number of new pairs.
+        """
+        signatures = []
+        for pair in pairs:
+            digest = pair_digest(pair)
+            if digest in self.digests:
+                continue
+            self.digests.add(digest)
+            self.documents.append(pair)
+            signatures.append(self.hasher.signature(pair['before']))
+        if len(signatures) == 0:
+            return 0
+        signatures = np.stack(signatures).astype(np.uint32)
+        self.signatures = np.concatenate([self.signatures, signatures])
+        self.band_keys = np.concatenate([self.band_keys, self.keys(signatures)])
+        self.count = len(self.documents)
+        self.sorted_keys = None
+        self.sorted_ids = None
+        return len(signatures)
+
+    @staticmethod
+    def from_regraph(re_graph: ReGraph, **kwargs):
+        """
+        Build an index over the examples of every edge of a ReGraph.
+        """
+        index = CodeRetrievalIndex(**kwargs)
+        index.add_pairs(regraph_pairs(re_graph))
+        return index
+
+    def sort(self):
+        if self.sorted_keys is None:
+            order = np.argsort(self.band_keys, axis=0, kind='stable').T
+            self.sorted_ids = np.ascontiguousarray(order)
+            self.sorted_keys = np.take_along_axis(self.band_keys.T, order, axis=1)
+
+    def candidates(self, keys: np.ndarray) -> list[np.ndarray]:
+        """
+        Documents sharing at least one band bucket with each query, for a (number of queries, bands) key matrix.
+        """
+        self.sort()
+        lows = np.empty(keys.shape, dtype=np.int64)
+        highs = np.empty(keys.shape, dtype=np.int64)
+        for band in range(self.bands):
+            lows[:, band] = np.searchsorted(self.sorted_keys[band], keys[:, band], side='left')
+            highs[:, band] = np.searchsorted(self.sorted_keys[band], keys[:, band], side='right')
+        return [
+            np.unique(np.concatenate([self.sorted_ids[band, lows[i, band]:highs[i, band]] for band in range(self.bands)]))
+            for i in range(len(keys))
+        ]
+
+    def query(self, code: str, k: int=1, exclude: Optional[str]=None, exhaustive: bool=False) -> list[tuple[dict, float]]:
+        """
+        Return the `k` indexed pairs whose `before` code is most similar to `code`, as (pair, similarity), most similar first.
+        """
+        return self.query_many([code], k=k, exclude=[exclude], exhaustive=exhaustive)[0]
+
+    def query_many(
+        self,
+        codes: list[str],
+        k: int=1,
+        exclude: Optional[list[Optional[str]]]=None,
+        exhaustive: bool=False
+    ) -> list[list[tuple[dict, float]]]:
+        """
+        Return the `k` most similar indexed pairs of each code, as in `query`.
+        exclude: Per code, a kernel name whose pairs are not returned, e.g. the kernel being optimized
+        exhaustive: Rank every indexed pair instead of the LSH candidates; queries with fewer than `k`
+            candidates are always ranked exhaustively
+        """
+        if self.count == 0:
+            return [[] for _ in codes]
+        exclude = exclude or [None] * len(codes)
+        signatures = np.stack([self.hasher.signature(code) for code in codes]).astype(np.uint32)
+        if exhaustive:
+            candidates = [None] * len(codes)
+        else:
+            candidates = self.candidates(self.keys(signatures))
+        results = []
+        for signature, ids, name in zip(signatures, candidates, exclude):
+            # Excluded pairs are dropped before deciding on the fallback, so that they do not count as candidates
+            if ids is not None:
+                ids = self.without(ids, name)
+            if ids is None or len(ids) < k:
+                ids = self.without(np.arange(self.count), name)
+            similarities = (self.signatures[ids] == signature).mean(axis=1)
+            if k < len(ids):
+                best = np.argpartition(-similarities, k)[:k]
+            else:
+                best = np.arange(len(ids))
+            best = best[np.argsort(-similarities[best], kind='stable')]
+            results.append([(self.documents[ids[i]], float(similarities[i])) for i in best])
+        return results
+
+    def without(self, ids: np.ndarray, name: Optional[str]) -> np.ndarray:
+        """
+        Drop the pairs of kernel `name` from document ids.
+        """
+        if name is None:
+            return ids
+        return ids[np.fromiter((self.documents[i].get('name') != name for i in ids), dtype=bool, count=len(ids))]
+
+    def save(self, path: str):
+        """
+        Save the index into a directory: the signatures and band keys as NumPy arrays, the pairs as JSONL.
+        """
+        os.makedirs(path, exist_ok=True)
+        # Arrays memory-mapped from the files about to be overwritten are read into memory first
+        self.signatures = np.array(self.signatures)
+        self.band_keys = np.array(self.band_keys)
+        np.save(os.path.join(path, 'signatures.npy'), self.signatures)
+        np.save(os.path.join(path, 'band_keys.npy'), self.band_keys)
+        with open(os.path.join(path, 'documents.jsonl'), 'w') as f:
+            for document in self.documents:
+                f.write(json.dumps(document) + '\n')
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({
+                "num_perm": self.hasher.num_perm,
+                "bands": self.bands,
+                "ngram": self.hasher.ngram,
+                "seed": self.hasher.seed,
+                "vocabulary": self.hasher.vocabulary,
+            }, f)
+
+    @staticmethod
+    def load(path: str):
+        """
+        Load an index saved by `save`. Signatures are memory-mapped until pairs are added.
+        """
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        index = CodeRetrievalIndex(num_perm=meta['num_perm'], bands=meta['bands'], ngram=meta['ngram'], seed=meta['seed'])
+        index.hasher.vocabulary = meta['vocabulary']
+        index.documents = list(read_jsonl(os.path.join(path, 'documents.jsonl')))
+        index.digests = {pair_digest(document) for document in index.documents}
+        index.signatures = np.load(os.path.join(path, 'signatures.npy'), mmap_mode='r')
+        index.band_keys = np.load(os.path.join(path, 'band_keys.npy'), mmap_mode='r')
+        index.count = len(index.documents)
+        return index
+
+
+class CodeRAGReasoner(Reasoner):
+    def __init__(
+        self,
+        engine: InferenceEngine,
+        index: CodeRetrievalIndex,
+        k: int=2,
+        config: Optional[SamplingParams]=None
+    ):
+        """CodeRAGReasoner optimizes a kernel in one generation, prompted with the optimization pairs of the
+        corpus whose code is most similar to the kernel.
+        index: Retrieval index over the (before, after) pairs of a ReGraph or kernel corpus
+        k: Number of retrieved pairs shown in the prompt
+        config: Sampling parameters of the generation
+        """
+        super(CodeRAGReasoner, self).__init__(engine)
+        self.index = index
+        self.k = k
+        self.config = config if config is not None else SamplingParams()
+
+    def messages(self, kernel: dict, examples: list[tuple[dict, float]]) -> list[dict]:
+        prompt = {
+            "kernel": kernel['kernel'],
+            "examples": [
+                {
+                    "method": example.get('method', ''),
+                    "detail": example.get('detail', ''),
+                    "before": example['before'],
+                    "after": example['after'],
+                }
+                for example, _ in examples
+            ]
+        }
+        return [
+            {"role": "system", "content": CODERAG_SYSTEM_PROMPT},
+            {"role": "user", "content": json.dumps(prompt)}
+        ]
+
+    def parse(self, kernel: dict, generation: str, examples: list[tuple[dict, float]]) -> dict:
+        result = {
+            "name": kernel.get('name'),
+            "index": kernel.get('index'),
+            "think": None,
+            "code": None,
+            "examples": [example.get('name') for example, _ in examples],
+            "similarities": [similarity for _, similarity in examples],
+        }
+        matches = re.findall(r'```json\n(.*?)\n```', generation, re.DOTALL)
+        if len(matches) == 0:
+            logging.error(f"Error in kernel {kernel.get('name')}: No matches optimization found.")
+            return result
+        try:
+            response = json.loads(matches[0])
+            result['think'] = response.get('think')
+            result['code'] = response.get('code')
+        except (json.JSONDecodeError, AttributeError) as e:
+            logging.error(f"Error in kernel {kernel.get('name')}: {e}")
+        return result
+
+    def optimize(
+        self,
+        kernel: dict,
+        *args,
+        **kwargs,
+    ) -> dict:
+        return self.optimize_many([kernel])[0]
+
+    def optimize_many(self, kernels: list[dict]) -> list[dict]:
+        """
+        Optimize a batch of kernels with one batched retrieval and one batched generation.
+        Pairs of the kernel being optimized are never retrieved.
+        """
+        tags = {"kernels": len(kernels)}
+        with self.step("retrieve", tags=tags):
+            retrieved = self.index.query_many(
+                [kernel['kernel'] for kernel in kernels],
+                k=self.k,
+                exclude=[kernel.get('name') for kernel in kernels]
+            )
+        with self.step("generate", tags=tags):
+            outputs = self.engine.generate(
+                [self.messages(kernel, examples) for kernel, examples in zip(kernels, retrieved)],
+                self.config
+            )
+        with self.step("parse", tags=tags) as metrics:
+            results = [
+                self.parse(kernel, output['generation'], examples)
+                for kernel, examples, output in zip(kernels, retrieved, outputs)
+            ]
+            metrics['failure'] = sum(result['code'] is None for result in results)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser('CodeRetrievalIndex')
+    parser.add_argument('--regraph_path', type=str, default=None, help="Index the examples of a ReGraph file")
+    parser.add_argument('--corpus_path', type=str, default=None, help="Index the pairs of a JSONL corpus")
+    parser.add_argument('--before_key', type=str, default='before')
+    parser.add_argument('--after_key', type=str, default='after')
+    parser.add_argument('--index_path', type=str, required=True, help="Directory of the index, extended if it exists")
+    parser.add_argument('--num_perm', type=int, default=64)
+    parser.add_argument('--bands', type=int, default=8)
+    args = parser.parse_args()
+
+    if os.path.exists(os.path.join(args.index_path, 'meta.json')):
+        index = CodeRetrievalIndex.load(args.index_path)
+    else:
+        index = CodeRetrievalIndex(num_perm=args.num_perm, bands=args.bands)
+    added = 0
+    if args.regraph_path is not None:
+        added += index.add_pairs(regraph_pairs(ReGraph.load(args.regraph_path)))
+    if args.corpus_path is not None:
+        added += index.add_pairs(
+            {**record, "before": record[args.before_key], "after": record[args.after_key]}
+            for record in read_jsonl(args.corpus_path)
+        )
+    index.save(args.index_path)
+    logging.info(f"Indexed {added} new pairs, {len(index)} in {args.index_path}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
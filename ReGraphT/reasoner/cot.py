@@ -0,0 +1,31 @@
+import json
+
+from .standard import StandardReasoner
+from ReGraphT.prompt import COT_SYSTEM_PROMPT
+
+__all__ = ['CoTReasoner']
+
+
+class CoTReasoner(StandardReasoner):
+    """
+    CoTReasoner optimizes a kernel in one generation listing its optimization steps; the code of the last step
+    is the optimized kernel.
+    """
+    def messages(self, kernel: dict) -> list[dict]:
+        return [
+            {"role": "system", "content": COT_SYSTEM_PROMPT},
+            {"role": "user", "content": json.dumps({"kernel": kernel['kernel']})}
+        ]
+
+    def parse(self, kernel: dict, generation: str) -> dict:
+        response = self.response(kernel, generation)
+        steps = [step for step in response if isinstance(step, dict)] if isinstance(response, list) else []
+        return {
+            "name": kernel.get('name'),
+            "index": kernel.get('index'),
+            "code": steps[-1].get('code') if len(steps) > 0 else None,
+            "trajectory": [
+                {field: step.get(field) for field in ('think', 'method', 'detail', 'code')}
+                for step in steps
+            ],
+        }
@@ -0,0 +1,68 @@
+import re
+import json
+import logging
+from typing import Optional
+
+from .base import Reasoner
+from ReGraphT.engine import SamplingParams, InferenceEngine
+from ReGraphT.prompt import STANDARD_SYSTEM_PROMPT
+
+__all__ = ['StandardReasoner']
+
+
+class StandardReasoner(Reasoner):
+    def __init__(
+        self,
+        engine: InferenceEngine,
+        config: Optional[SamplingParams]=None
+    ):
+        """StandardReasoner optimizes a kernel in one generation, prompted with the kernel alone.
+        config: Sampling parameters of the generation
+        """
+        super(StandardReasoner, self).__init__(engine)
+        self.config = config if config is not None else SamplingParams()
+
+    def messages(self, kernel: dict) -> list[dict]:
+        return [
+            {"role": "system", "content": STANDARD_SYSTEM_PROMPT},
+            {"role": "user", "content": json.dumps({"kernel": kernel['kernel']})}
+        ]
+
+    def response(self, kernel: dict, generation: str):
+        """
+        The JSON object of the first ```json block of a generation, None if there is none or it is invalid.
+        """
+        matches = re.findall(r'```json\n(.*?)\n```', generation, re.DOTALL)
+        if len(matches) == 0:
+            logging.error(f"Error in kernel {kernel.get('name')}: No matches optimization found.")
+            return None
+        try:
+            return json.loads(matches[0])
+        except json.JSONDecodeError as e:
+            logging.error(f"Error in kernel {kernel.get('name')}: {e}")
+            return None
+
+    def parse(self, kernel: dict, generation: str) -> dict:
+        response = self.response(kernel, generation)
+        if not isinstance(response, dict):
+            response = {}
+        return {
+            "name": kernel.get('name'),
+            "index": kernel.get('index'),
+            "think": response.get('think'),
+            "code": response.get('code'),
+        }
+
+    def optimize(
+        self,
+        kernel: dict,
+        *args,
+        **kwargs,
+    ) -> dict:
+        tags = {"kernel": kernel.get('name')}
+        with self.step("generate", tags=tags):
+            output = self.engine.generate([self.messages(kernel)], self.config)[0]
+        with self.step("parse", tags=tags) as metrics:
+            result = self.parse(kernel, output['generation'])
+            metrics['failure'] = int(result['code'] is None)
+        return result
@@ -0,0 +1,144 @@
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional, Union
+
+from ReGraphT.utils import ResponseCache, LRUCache, code_digest
+
+__all__ = ['TranspositionEntry', 'TranspositionTable']
+
+
+@dataclass
+class TranspositionEntry:
+    """Search statistics shared by every path reaching the same state.
+    visits: Number of rollouts backed up through the state
+    value_sum: Sum of the values backed up through the state
+    reward: Reward of the state's code, once evaluated
+    """
+    visits: int = 0
+    value_sum: float = 0.0
+    reward: Optional[float] = None
+
+    @property
+    def value(self) -> float:
+        return self.value_sum / self.visits if self.visits > 0 else 0.0
+
+
+class TranspositionTable(object):
+    def __init__(
+        self,
+        max_entries: Optional[int]=None,
+        reward_store: Union[ResponseCache, LRUCache, None]=None
+    ):
+        """TranspositionTable merges the search states of ReGraphT-MCGS and MCTS reasoners that
+        different paths reach with the same code at the same ReGraph node. States are keyed by
+        the node index and the digest of the normalized code, so candidates that only differ in
+        comments or formatting share their visit counts, value estimates and reward, and a
+        state's reward is evaluated (e.g. compiled and benchmarked) once.
+        max_entries: Number of states kept, the least recently used are evicted; unbounded if None
+        reward_store: Optional `ResponseCache` or `LRUCache` keeping rewards beyond the table,
+            e.g. across runs or after eviction
+        """
+        self.max_entries = max_entries
+        self.reward_store = reward_store
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[tuple[int, str], TranspositionEntry] = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+        self.reward_evaluations = 0
+        self.reward_hits = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def key(node_index: int, code: str) -> tuple[int, str]:
+        return node_index, code_digest(code)
+
+    @staticmethod
+    def state_key(state: dict) -> tuple[int, str]:
+        """
+        Key of a search state holding the index of its ReGraph node under "node" and its code under "code".
+        """
+        return TranspositionTable.key(state['node'], state['code'])
+
+    def entry(self, node_index: int, code: str) -> TranspositionEntry:
+        """
+        Return the entry of a state, creating it on first visit. Not counted as a lookup.
+        """
+        key = self.key(node_index, code)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return entry
+            entry = TranspositionEntry()
+            self.entries[key] = entry
+            if self.max_entries is not None and len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            return entry
+
+    def get(self, node_index: int, code: str) -> Optional[TranspositionEntry]:
+        """
+        Look a state up, None if no path has reached it yet. Lookups and hits are counted here only,
+        so that the hit rate is the share of states the search found already explored.
+        """
+        key = self.key(node_index, code)
+        with self.lock:
+            self.lookups += 1
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return entry
+
+    def update(self, node_index: int, code: str, value: float) -> TranspositionEntry:
+        """
+        Back a rollout value up through a state.
+        """
+        entry = self.entry(node_index, code)
+        with self.lock:
+            entry.visits += 1
+            entry.value_sum += value
+        return entry
+
+    def cached_reward(self, node_index: int, code: str, evaluate: Callable[[], float]) -> float:
+        """
+        Return the reward of a state, calling `evaluate` only if no equivalent state has been evaluated yet.
+        """
+        entry = self.entry(node_index, code)
+        if entry.reward is not None:
+            with self.lock:
+                self.reward_hits += 1
+            return entry.reward
+        store_key = None
+        if self.reward_store is not None:
+            store_key = ResponseCache.make_key(stage="reward", node=node_index, code=code_digest(code))
+            value = self.reward_store.get(store_key)
+            if value is not None:
+                entry.reward = json.loads(value)
+                with self.lock:
+                    self.reward_hits += 1
+                return entry.reward
+        reward = evaluate()
+        entry.reward = reward
+        with self.lock:
+            self.reward_evaluations += 1
+        if self.reward_store is not None:
+            self.reward_store.put(store_key, json.dumps(reward))
+        return reward
+
+    def stats(self) -> dict:
+        """
+        Number of states, state lookups and hits, reward evaluations and rewards served from the table.
+        """
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'hit_rate': self.hits / self.lookups if self.lookups > 0 else 0.0,
+                'reward_evaluations': self.reward_evaluations,
+                'reward_hits': self.reward_hits,
+            }
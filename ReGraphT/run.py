@@ -1,5 +1,7 @@
 import argparse
 import os
+import functools
+import multiprocessing
 import logging
 import json
 
@@ -10,29 +12,30 @@ from ReGraphT.engine import (
     EngineConfig,
     SamplingParams,
     InferenceEngine,
+    CachedEngine,
 )
+from ReGraphT.utils import ResponseCache, LRUCache, MetricsRecorder, get_recorder, set_recorder
 
 from ReGraphT.reasoner import (
     Reasoner,
     StandardReasoner,
     CoTReasoner,
     CodeRAGReasoner,
-    RethinkMCTSReasoner,
-    MCTSRAGReasoner,
+    CodeRetrievalIndex,
     ReGraphTReasoner,
     ReGraphTMCGSReasoner
 )
 
 from ReGraphT.executor import (
     Executor,
-    load_cuda_eval_dataset,
-    load_par_eval_dataset
+    ParallelExecutor,
+    CompileHarness
 )
 
 def parse_args():
     parser = argparse.ArgumentParser('ReGraphT')
     ################################################## baselines
-    parser.add_argument('--method', type=str, choices=['standard', 'CoT', 'RAG', 'RethinkMCTS', 'MCTS-RAG', 'ReGraphT', 'ReGraphT-MCGS'], required=True)
+    parser.add_argument('--method', type=str, choices=['standard', 'CoT', 'RAG', 'ReGraphT', 'ReGraphT-MCGS'], required=True)
     parser.add_argument('--engine', type=str, choices=['local', 'remote'], required=True)
     parser.add_argument('--local_model_path', type=str, default=None)
     ################################################## engine
@@ -42,71 +45,164 @@ def parse_args():
     parser.add_argument('--max_tokens', type=int, default=8196)
     parser.add_argument('--top_p', type=float, default=0.9)
     parser.add_argument('--top_k', type=int, default=-1)
+    parser.add_argument('--seed', type=int, default=None, help="Sampling seed, makes generations at a non-zero temperature reproducible and cacheable")
+    parser.add_argument('--max_concurrency', type=int, default=8, help="Maximum number of in-flight requests of a remote engine")
+    parser.add_argument('--request_timeout', type=float, default=None, help="Per-request timeout in seconds of a remote engine")
+    parser.add_argument('--requests_per_minute', type=float, default=None, help="Request rate limit of the endpoint")
+    parser.add_argument('--tokens_per_minute', type=float, default=None, help="Token rate limit of the endpoint")
+    parser.add_argument('--max_retries', type=int, default=5, help="Retries of rate-limited or transient engine errors")
+    parser.add_argument('--disable_prefix_caching', action='store_true', help="Do not reuse the KV cache of shared prompt prefixes in a local engine")
+    parser.add_argument('--min_shared_prefix', type=int, default=1024, help="Shortest prefix, in characters, prefilled once for a local batch")
     parser.add_argument('--local_regraph_path', type=str)
+    parser.add_argument('--rag_index_path', type=str, default=None, help="Retrieval index of the RAG baseline, built from --local_regraph_path if not given")
+    parser.add_argument('--rag_k', type=int, default=2, help="Number of retrieved examples in a RAG prompt")
+    parser.add_argument('--response_cache', type=str, default=None, help="Cache deterministic generations, 'memory' or the path of a SQLite file; requests are only cached at --temperature 0 or with a --seed")
+    parser.add_argument('--metrics_path', type=str, default=None, help="JSONL log of per-call engine and reasoner metrics")
+    parser.add_argument('--prometheus_path', type=str, default=None, help="Prometheus text snapshot of the aggregated metrics, written at the end of the run")
+    parser.add_argument('--response_cache_mb', type=float, default=None, help="Size above which the response cache evicts its least recently used entries")
     ################################################## dataset
     parser.add_argument('--dataset', type=str, choices=['CUDAEval', 'ParEval'], required=True)
     parser.add_argument('--local_dataset_path', type=str, required=True)
+    ################################################## execution
+    parser.add_argument('--num_workers', type=int, default=1, help="Number of worker processes, each with its own engine and reasoner")
+    parser.add_argument('--compile_cache_dir', type=str, default=None, help="Compile and run candidates, caching compiler results in this directory")
+    parser.add_argument('--compile_workers', type=int, default=4, help="Number of concurrent compilations")
+    parser.add_argument('--compile_isolation', type=str, choices=['auto', 'bwrap', 'unshare', 'none'], default='auto', help="Sandbox of compilers and candidate programs")
+    parser.add_argument('--results_path', type=str, default=None, help="JSONL checkpoint of per-kernel results of a parallel run, resumed if it exists; required with --num_workers > 1")
+    parser.add_argument('--report_path', type=str, default=None, help="JSON file receiving the report of the run")
     
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.num_workers > 1 and args.results_path is None:
+        # Worker results only reach the parent through the checkpoint; without one a crash loses them all
+        parser.error("--results_path is required with --num_workers > 1")
+    return args
 
-def main():
-    args = parse_args()
+def build_executor(args) -> Executor:
+    """
+    Build the engine, reasoner and executor described by the command line arguments.
+    Runs in every worker of a parallel run, so that each holds its own engine and ReGraph.
+    """
+    if args.metrics_path is not None and multiprocessing.parent_process() is not None:
+        # Workers log their metrics next to the parent's
+        set_recorder(MetricsRecorder(f"{args.metrics_path}.{os.getpid()}"))
+    # Engines register themselves when their module is imported; the local one requires vLLM
     if args.engine == 'local':
+        import ReGraphT.engine.local_engine
         engine_type = EngineType.LOCAL
-        local_model_path = args.local_model_path
-        engine_config = EngineConfig(local_model_path=local_model_path)
     if args.engine == 'remote':
+        import ReGraphT.engine.remote_engine
         engine_type = EngineType.REMOTE
-        base_url = args.base_url
-        engine_config = EngineConfig(base_url=base_url)
+    engine_config = EngineConfig(
+        base_url=args.base_url if args.engine == 'remote' else None,
+        local_model_path=args.local_model_path if args.engine == 'local' else None,
+        max_concurrency=args.max_concurrency,
+        request_timeout=args.request_timeout,
+        requests_per_minute=args.requests_per_minute,
+        tokens_per_minute=args.tokens_per_minute,
+        max_retries=args.max_retries,
+        enable_prefix_caching=not args.disable_prefix_caching,
+        min_shared_prefix=args.min_shared_prefix
+    )
 
     inference_engine = InferenceEngine.create_engine(
         engine_type=engine_type,
-        engine_config=engine_config
+        config=engine_config
     )
+    if args.response_cache is not None:
+        max_bytes = int(args.response_cache_mb * 2 ** 20) if args.response_cache_mb is not None else None
+        if args.response_cache == 'memory':
+            cache = LRUCache(max_entries=None, max_bytes=max_bytes)
+        else:
+            cache = ResponseCache(args.response_cache, max_bytes=max_bytes)
+        inference_engine = CachedEngine(inference_engine, cache=cache)
     
     method = args.method
+    sampling_params = SamplingParams(
+        model=args.model,
+        temperature=args.temperature,
+        max_tokens=args.max_tokens,
+        top_p=args.top_p,
+        top_k=args.top_k,
+        seed=args.seed
+    )
     if method == 'standard':
-        reasoner = StandardReasoner(engine=inference_engine)
+        reasoner = StandardReasoner(engine=inference_engine, config=sampling_params)
     if method == 'CoT':
-        reasoner = CoTReasoner(engine=inference_engine)
+        reasoner = CoTReasoner(engine=inference_engine, config=sampling_params)
     if method == 'RAG':
-        reasoner = CodeRAGReasoner(engine=inference_engine)
-    if method == 'RethinkMCTS':
-        reasoner = RethinkMCTSReasoner(engine=inference_engine)
-    if method == 'MCTS-RAG':
-        reasoner = MCTSRAGReasoner(engine=inference_engine)
+        if args.rag_index_path is not None:
+            index = CodeRetrievalIndex.load(args.rag_index_path)
+        else:
+            index = CodeRetrievalIndex.from_regraph(ReGraph.load(args.local_regraph_path))
+        reasoner = CodeRAGReasoner(
+            engine=inference_engine,
+            index=index,
+            k=args.rag_k,
+            config=sampling_params
+        )
     if method == 'ReGraphT':
-        with open(args.local_regraph_path, 'r') as f:
-            regraph_json = json.load(f)
-        regraph = ReGraph.from_graph(regraph_json)
+        regraph = ReGraph.load(args.local_regraph_path)
         reasoner = ReGraphTReasoner(
             engine=inference_engine,
             regraph=regraph
         )
     if method == 'ReGraphT-MCGS':
-        with open(args.local_regraph_path, 'r') as f:
-            regraph_json = json.load(f)
-        regraph = ReGraph.from_graph(regraph_json)
+        regraph = ReGraph.load(args.local_regraph_path)
         reasoner = ReGraphTMCGSReasoner(
             engine=inference_engine,
             regraph=regraph
         )
-    
-    if args.dataset == 'CUDAEval':
-        dataset = load_cuda_eval_dataset(args.local_dataset_path)
-    if args.dataset == 'ParEval':
-        dataset = load_par_eval_dataset(args.local_dataset_path)
         
     meta = {}
+    if args.compile_cache_dir is not None:
+        meta['harness'] = CompileHarness(
+            cache_dir=args.compile_cache_dir,
+            max_workers=args.compile_workers,
+            isolation=args.compile_isolation
+        )
         
     executor: Executor = Executor.create_executor(
         dataset=args.dataset, 
         agent=reasoner,
         **meta
     )
+    return executor
+
+def main():
+    args = parse_args()
+    if args.metrics_path is not None:
+        set_recorder(MetricsRecorder(args.metrics_path))
+    # Only the parent loads the dataset; workers import this module for `build_executor` alone
+    from ReGraphT.executor.utils import load_cuda_eval_dataset, load_par_eval_dataset
+    
+    if args.dataset == 'CUDAEval':
+        dataset = load_cuda_eval_dataset(args.local_dataset_path)
+    if args.dataset == 'ParEval':
+        dataset = load_par_eval_dataset(args.local_dataset_path)
+    
+    if args.num_workers > 1:
+        # Kernels are spread over worker processes, each building its own executor;
+        # a packed ReGraph (see `ReGraph.save_packed`) is memory-mapped and shared by all of them
+        executor = ParallelExecutor(
+            build_executor=functools.partial(build_executor, args),
+            num_workers=args.num_workers,
+            results_path=args.results_path,
+            # Evaluates nothing itself, it only reports the workers' results like a serial run
+            reporter=Executor.create_executor(dataset=args.dataset, agent=None)
+        )
+    else:
+        executor = build_executor(args)
+    
+    report = executor.run(kernels=dataset)
+    summary = {key: value for key, value in report.items() if key != 'results'}
+    logging.info(f"Report: {summary}")
+    if args.report_path is not None:
+        with open(args.report_path, 'w') as f:
+            json.dump(report, f, indent=4)
     
-    executor.run(kernels=dataset)
+    if args.prometheus_path is not None:
+        get_recorder().write_prometheus(args.prometheus_path)
+    get_recorder().close()
     
 if __name__ == '__main__':
     main()
@@ -0,0 +1,4 @@
+from .cache import ResponseCache, LRUCache
+from .jsonl import open_text, read_jsonl, parse_shard
+from .metrics import MetricsRecorder, get_recorder, set_recorder
+from .code import tokenize_code, normalize_code, code_digest
\ No newline at end of file
@@ -0,0 +1,148 @@
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+__all__ = ['ResponseCache', 'LRUCache']
+
+class ResponseCache(object):
+    def __init__(self, cache_path: str, max_bytes: Optional[int]=None):
+        """ResponseCache is a persistent SQLite store for raw LLM responses, so that an interrupted 
+        or repeated run can reuse responses it has already paid for.
+        cache_path: Path of the SQLite database file
+        max_bytes: Total size of the stored values above which the least recently used entries 
+            are evicted, unbounded if None
+        """
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # Caches created before eviction was supported lack the bookkeeping columns
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(cache)")}
+        if 'size' not in columns:
+            self.conn.execute("ALTER TABLE cache ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+            self.conn.execute("UPDATE cache SET size = length(CAST(value AS BLOB))")
+        if 'accessed' not in columns:
+            self.conn.execute("ALTER TABLE cache ADD COLUMN accessed REAL NOT NULL DEFAULT 0")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+        self.conn.commit()
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def digest(obj) -> str:
+        """
+        Hash a JSON-compatible object, independently of dictionary key order.
+        """
+        return hashlib.sha256(json.dumps(obj, sort_keys=True).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def make_key(**fields) -> str:
+        """
+        Build a cache key from named fields, e.g. kernel index, model, prompt hash and sampling parameters.
+        """
+        return ResponseCache.digest(fields)
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if self.max_bytes is not None:
+                self.conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (time.time(), key))
+                self.conn.commit()
+            return row[0]
+
+    def put(self, key: str, value: str):
+        size = len(value.encode('utf-8'))
+        with self.lock:
+            row = self.conn.execute("SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.size -= row[0]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, accessed) VALUES (?, ?, ?, ?)", 
+                (key, value, size, time.time())
+            )
+            self.size += size
+            if self.max_bytes is not None and self.size > self.max_bytes:
+                self.evict()
+            self.conn.commit()
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the cache fits in `max_bytes`.
+        """
+        rows = self.conn.execute("SELECT key, size FROM cache ORDER BY accessed").fetchall()
+        for key, size in rows:
+            if self.size <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self.size -= size
+            self.evictions += 1
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class LRUCache(object):
+    def __init__(self, max_entries: Optional[int]=1024, max_bytes: Optional[int]=None):
+        """LRUCache is an in-memory counterpart of `ResponseCache` with the same interface,
+        evicting the least recently used entries once it exceeds its entry or size budget.
+        max_entries: Number of entries kept, unbounded if None
+        max_bytes: Total size of the values kept, in bytes of their UTF-8 encoding as in 
+            `ResponseCache`, unbounded if None
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[str, str] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str):
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key).encode('utf-8'))
+            self.entries[key] = value
+            self.size += len(value.encode('utf-8'))
+            while len(self.entries) > 1 and (
+                (self.max_entries is not None and len(self.entries) > self.max_entries)
+                or (self.max_bytes is not None and self.size > self.max_bytes)
+            ):
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted.encode('utf-8'))
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+    def close(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
\ No newline at end of file
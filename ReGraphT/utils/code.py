@@ -0,0 +1,36 @@
+import re
+import hashlib
+
+__all__ = ['tokenize_code', 'normalize_code', 'code_digest']
+
+# Comments are dropped, string and character literals are kept whole
+COMMENT_PATTERN = re.compile(r'//[^\n]*|/\*.*?\*/|("(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\')', re.DOTALL)
+# Multi-character operators are single tokens (longest first), so that e.g. `a+++b` and `a+ ++b`
+# stay different; `<<<` and `>>>` delimit CUDA kernel launches
+OPERATOR_PATTERN = r'<<<|>>>|<<=|>>=|<=>|->\*|\.\.\.|::|->|\+\+|--|<<|>>|<=|>=|==|!=|&&|\|\||[-+*/%&|^]=|\.\*|##'
+# Numbers follow the preprocessing-number rule, keeping e.g. `1.5f`, `1e-5` and `0x1p-3` whole
+TOKEN_PATTERN = re.compile(
+    r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|\.?\d(?:[eEpP][-+]|[\w.])*|\w+|' + OPERATOR_PATTERN + r'|\S'
+)
+
+
+def tokenize_code(code: str) -> list[str]:
+    """
+    Split C++/CUDA code into identifier, number, literal and punctuation tokens, without comments.
+    """
+    code = COMMENT_PATTERN.sub(lambda match: match.group(1) or ' ', code)
+    return TOKEN_PATTERN.findall(code)
+
+
+def normalize_code(code: str) -> str:
+    """
+    Canonical form of C++/CUDA code that ignores comments and formatting.
+    """
+    return ' '.join(tokenize_code(code))
+
+
+def code_digest(code: str) -> str:
+    """
+    SHA-256 digest of the canonical form of a code, equal for codes that only differ in comments or formatting.
+    """
+    return hashlib.sha256(normalize_code(code).encode('utf-8')).hexdigest()
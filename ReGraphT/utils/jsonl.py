@@ -0,0 +1,62 @@
+import io
+import gzip
+import json
+from typing import Container, Iterator, Optional
+
+__all__ = ['open_text', 'read_jsonl', 'parse_shard']
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def open_text(path: str) -> io.TextIOBase:
+    """
+    Open a text file for reading, transparently decompressing gzip or zstd input.
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if magic.startswith(ZSTD_MAGIC):
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError(f"Reading zstd-compressed {path} requires the `zstandard` package") from e
+        stream = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def read_jsonl(
+    path: str,
+    shard: Optional[tuple[int, int]]=None,
+    skip: Optional[Container]=None,
+    key: str='index'
+) -> Iterator[dict]:
+    """Stream the records of a (possibly compressed) JSONL file one at a time, so that memory
+    stays flat regardless of the file size.
+    shard: (i, n) to only read the records on lines i, i + n, i + 2n, ... so that n processes
+        can split one file between them
+    skip: Values of `record[key]` to leave out, e.g. indices of kernels already processed
+    key: Record field matched against `skip`
+    """
+    with open_text(path) as f:
+        for line_no, line in enumerate(f):
+            if shard is not None and line_no % shard[1] != shard[0]:
+                continue
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if skip is not None and record.get(key) in skip:
+                continue
+            yield record
+
+
+def parse_shard(shard: str) -> tuple[int, int]:
+    """
+    Parse a shard specification of the form "i/n", with 0 <= i < n.
+    """
+    i, n = (int(part) for part in shard.split('/'))
+    if not 0 <= i < n:
+        raise ValueError(f"Invalid shard {shard}, expected i/n with 0 <= i < n")
+    return i, n
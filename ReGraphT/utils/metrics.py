@@ -0,0 +1,146 @@
+import json
+import math
+import time
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+__all__ = ['MetricsRecorder', 'get_recorder', 'set_recorder']
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, math.inf)
+
+
+class MetricsRecorder(object):
+    def __init__(self, jsonl_path: Optional[str]=None, namespace: str='regrapht'):
+        """MetricsRecorder records one event per engine call, reasoner step or construction stage,
+        e.g. its latency, token usage, cache hits, retries and parse failures. Events are appended
+        to a JSONL file as they come, while numeric fields are aggregated per (kind, name) for a
+        Prometheus-style text snapshot, so memory does not grow with the length of a run.
+        jsonl_path: Path of the JSONL event log, events are only aggregated if None
+        namespace: Prefix of the exported Prometheus metric names
+        """
+        self.jsonl_path = jsonl_path
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        self.file = open(jsonl_path, 'a') if jsonl_path is not None else None
+        # (kind, name) -> field -> sum
+        self.totals: dict[tuple[str, str], dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self.counts: dict[tuple[str, str], int] = defaultdict(int)
+        # (kind, name) -> cumulative count per latency bucket
+        self.buckets: dict[tuple[str, str], list[int]] = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+
+    def record(self, kind: str, name: str="", tags: Optional[dict]=None, **fields):
+        """
+        Record an event. Numeric and boolean fields are summed into the snapshot,
+        `latency` (seconds) also feeds a histogram; other fields only go to the JSONL log.
+        kind: Kind of event, e.g. "engine_call", "reasoner_step" or "llm_call"
+        name: What emitted the event, e.g. an engine class, a reasoner step or a construction stage
+        tags: Identifiers of the event, e.g. a kernel index, only written to the JSONL log
+        """
+        event = {"time": time.time(), "kind": kind, "name": name, **(tags or {}), **fields}
+        with self.lock:
+            key = (kind, name)
+            self.counts[key] += 1
+            totals = self.totals[key]
+            for field, value in fields.items():
+                if isinstance(value, (bool, int, float)):
+                    totals[field] += value
+            latency = fields.get('latency')
+            if isinstance(latency, (int, float)):
+                buckets = self.buckets[key]
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    if latency <= bound:
+                        buckets[i] += 1
+            if self.file is not None:
+                self.file.write(json.dumps(event, default=str) + '\n')
+
+    @contextmanager
+    def timer(self, kind: str, name: str="", tags: Optional[dict]=None, **fields) -> Iterator[dict]:
+        """
+        Time a block and record it as an event. The block may add fields to the yielded dictionary;
+        an exception escaping the block is recorded as `error` and re-raised.
+        """
+        start = time.perf_counter()
+        try:
+            yield fields
+        except Exception as e:
+            fields['error'] = 1
+            tags = {**(tags or {}), 'error_type': type(e).__name__}
+            raise
+        finally:
+            self.record(kind, name, tags=tags, latency=time.perf_counter() - start, **fields)
+
+    def snapshot(self) -> dict:
+        """
+        Aggregated fields per event kind and name, e.g. {"engine_call": {"RemoteEngine": {"count": 3, "latency": 4.2}}}.
+        """
+        with self.lock:
+            snapshot = defaultdict(dict)
+            for (kind, name), count in self.counts.items():
+                snapshot[kind][name] = {"count": count, **self.totals[(kind, name)]}
+            return dict(snapshot)
+
+    def to_prometheus(self) -> str:
+        """
+        Render the aggregates in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            kinds = sorted({kind for kind, _ in self.counts})
+            for kind in kinds:
+                keys = sorted(key for key in self.counts if key[0] == kind)
+                metric = f"{self.namespace}_{kind}"
+                lines.append(f"# TYPE {metric}_total counter")
+                for key in keys:
+                    lines.append(f'{metric}_total{{name="{key[1]}"}} {self.counts[key]}')
+                fields = sorted({field for key in keys for field in self.totals[key]})
+                for field in fields:
+                    if field == 'latency':
+                        continue
+                    lines.append(f"# TYPE {metric}_{field}_total counter")
+                    for key in keys:
+                        lines.append(f'{metric}_{field}_total{{name="{key[1]}"}} {self.totals[key][field]:g}')
+                if 'latency' in fields:
+                    lines.append(f"# TYPE {metric}_latency_seconds histogram")
+                    for key in keys:
+                        if key not in self.buckets:
+                            continue
+                        for bound, count in zip(LATENCY_BUCKETS, self.buckets[key]):
+                            le = '+Inf' if math.isinf(bound) else f'{bound:g}'
+                            lines.append(f'{metric}_latency_seconds_bucket{{name="{key[1]}",le="{le}"}} {count}')
+                        lines.append(f'{metric}_latency_seconds_sum{{name="{key[1]}"}} {self.totals[key]["latency"]:g}')
+                        lines.append(f'{metric}_latency_seconds_count{{name="{key[1]}"}} {self.buckets[key][-1]}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str):
+        with open(path, 'w') as f:
+            f.write(self.to_prometheus())
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+# Process-wide recorder used by engines, reasoners and construction
+RECORDER = MetricsRecorder()
+
+
+def get_recorder() -> MetricsRecorder:
+    return RECORDER
+
+
+def set_recorder(recorder: MetricsRecorder):
+    """
+    Replace the process-wide recorder, e.g. with one that logs events to a JSONL file.
+    """
+    global RECORDER
+    RECORDER = recorder
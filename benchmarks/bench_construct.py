@@ -0,0 +1,64 @@
+"""
+Construct a ReGraph from synthetic kernels against the stub endpoint of tests/stub_server.py at several
+`--concurrency` levels, and print the throughput of each and whether it built the same graph as the first.
+
+    python benchmarks/bench_construct.py --num_kernels 60 --latency 0.2 --concurrency 1 4 16
+
+Relabel requests stay serial, so with `--relabel_batch 1` they bound the gain of concurrent reasoning.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+
+from stub_server import StubServer
+
+
+def main():
+    parser = argparse.ArgumentParser('bench_construct')
+    parser.add_argument('--num_kernels', type=int, default=60)
+    parser.add_argument('--latency', type=float, default=0.2, help="Seconds per request of the stub endpoint")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--relabel_batch', type=int, default=1, help="Kernels relabeled per request, relabels are serial")
+    args = parser.parse_args()
+
+    server = StubServer(latency=args.latency).start()
+    work_dir = tempfile.mkdtemp(prefix='bench_construct')
+    os.environ.update(LOG_PATH=os.path.join(work_dir, 'construct.log'), OPENAI_API_KEY='stub', BASE_URL=server.base_url)
+    from ReGraphT import construct
+
+    kernel_path = os.path.join(work_dir, 'kernels.jsonl')
+    with open(kernel_path, 'w') as f:
+        for i in range(args.num_kernels):
+            f.write(json.dumps({"index": i, "name": f"k{i}", "kernel": f"void k{i}(float* a) {{ a[{i}] = 0; }}"}) + '\n')
+    reference = None
+    base_time = None
+    try:
+        for concurrency in args.concurrency:
+            save_dir = os.path.join(work_dir, f'concurrency{concurrency}')
+            os.makedirs(save_dir)
+            sys.argv = ['construct', '--kernel_path', kernel_path, '--save_dir', save_dir, '--concurrency', str(concurrency),
+                        '--relabel_batch', str(args.relabel_batch)]
+            requests = server.requests
+            start = time.perf_counter()
+            construct.construct_regraph(construct.parser_args())
+            elapsed = time.perf_counter() - start
+            graph = construct.ReGraph.load(os.path.join(save_dir, 'ReGraph_final.json')).to_graph()
+            reference = reference if reference is not None else graph
+            base_time = base_time if base_time is not None else elapsed
+            print(f"concurrency {concurrency:>3}: {elapsed:.1f}s, {args.num_kernels / elapsed:.2f} kernels/s "
+                  f"({base_time / elapsed:.1f}x), {server.requests - requests} requests, identical graph: {graph == reference}")
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Compare the memory and query times of the ReGraph object model with its `ReGraphCSR` view on a random graph:
+successors and predecessors of every node, scoring candidate transitions and top-k successors.
+
+    python benchmarks/bench_csr.py --num_nodes 5000 --num_edges 200000 --num_pairs 1000000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ReGraphT.ReGraph import ReGraph
+
+
+def random_graph(num_nodes: int, num_edges: int, seed: int=0) -> ReGraph:
+    rng = random.Random(seed)
+    # Examples are shared placeholders, only their number matters to the view
+    examples = [{}] * 8
+    re_graph = ReGraph()
+    for i in range(1, num_nodes):
+        re_graph.add_node(f"m{i}")
+    pairs = set()
+    while len(pairs) < num_edges:
+        pairs.add((rng.randrange(num_nodes), rng.randrange(1, num_nodes)))
+    for src, tgt in pairs:
+        re_graph.add_edge(src, tgt).examples = examples[:rng.randint(1, 8)]
+    re_graph.compute_statistics()
+    return re_graph
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser('bench_csr')
+    parser.add_argument('--num_nodes', type=int, default=5000)
+    parser.add_argument('--num_edges', type=int, default=200000)
+    parser.add_argument('--num_pairs', type=int, default=1000000, help="Candidate transitions scored")
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    re_graph = random_graph(args.num_nodes, args.num_edges)
+    object_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    csr, build_time = timed(re_graph.to_csr)
+    print(f"{args.num_nodes} nodes, {args.num_edges} edges: object model {object_bytes / 1e6:.1f} MB, "
+          f"csr {csr.nbytes / 1e6:.1f} MB built in {build_time * 1000:.0f} ms")
+
+    nodes = range(args.num_nodes)
+    expected, object_time = timed(lambda: [[edge.tgt for edge in node.out_edges] for node in re_graph.regraph_nodes])
+    result, csr_time = timed(lambda: [csr.successors(i) for i in nodes])
+    assert all(sorted(a) == list(b) for a, b in zip(expected, result))
+    print(f"successors of every node: objects {object_time * 1000:.1f} ms, csr {csr_time * 1000:.1f} ms")
+    expected, object_time = timed(lambda: [[edge.src for edge in node.in_edges] for node in re_graph.regraph_nodes])
+    result, csr_time = timed(lambda: [csr.predecessors(i) for i in nodes])
+    assert all(sorted(a) == list(b) for a, b in zip(expected, result))
+    print(f"predecessors of every node: objects {object_time * 1000:.1f} ms, csr {csr_time * 1000:.1f} ms")
+
+    rng = np.random.default_rng(0)
+    src = rng.integers(0, args.num_nodes, args.num_pairs)
+    tgt = rng.integers(0, args.num_nodes, args.num_pairs)
+
+    def score_objects():
+        scores = []
+        for s, t in zip(src.tolist(), tgt.tolist()):
+            edge = re_graph.get_edge(s, t)
+            scores.append(re_graph.transition_probability(edge) if edge is not None else 0.0)
+        return scores
+    expected, object_time = timed(score_objects)
+    result, csr_time = timed(lambda: csr.score(src, tgt))
+    assert np.allclose(expected, result)
+    print(f"score {args.num_pairs} transitions: objects {object_time * 1000:.0f} ms, csr {csr_time * 1000:.0f} ms "
+          f"({object_time / csr_time:.0f}x)")
+
+    expected, object_time = timed(lambda: [
+        sorted((len(edge.examples) for edge in node.out_edges), reverse=True)[:args.k] for node in re_graph.regraph_nodes
+    ])
+    result, csr_time = timed(lambda: [csr.top_successors(i, args.k) for i in nodes])
+    assert all(a == [value for _, value in b] for a, b in zip(expected, result))
+    print(f"top-{args.k} successors of every node: objects {object_time * 1000:.0f} ms, csr {csr_time * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
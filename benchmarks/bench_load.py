@@ -0,0 +1,84 @@
+"""
+Load ReGraphs of growing size with `ReGraph.from_graph`, and with the loader that scanned the whole edge
+table for every adjacency entry before, and print the load time of both per graph size.
+
+    python benchmarks/bench_load.py --sizes 1000 10000 50000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ReGraphT.ReGraph import ReGraph, ReGraphEdge, ReGraphNode
+
+
+def make_graph(num_trajectories: int, seed: int=0) -> dict:
+    """
+    The inline JSON dictionary of a ReGraph merged from synthetic trajectories.
+    """
+    rng = random.Random(seed)
+    re_graph = ReGraph()
+    for i in range(num_trajectories):
+        vocabulary = max(20, i // 20)
+        re_graph.merge(f"k{i}", "code", [
+            {"think": "", "method": f"m{rng.randrange(vocabulary)}", "detail": "", "code": "x"}
+            for _ in range(rng.randint(1, 6))
+        ])
+    return re_graph.to_graph(inline=True)
+
+
+def scan_from_graph(graph: dict) -> ReGraph:
+    """
+    Load by scanning every edge for each `in` and `out` entry of each node.
+    """
+    regraph_edges = [ReGraphEdge(src=edge['src'], tgt=edge['tgt'], examples=edge['examples']) for edge in graph['edge']]
+    regraph_nodes = []
+    for node in graph['node']:
+        regraph_node = ReGraphNode(node['index'], node['name'])
+        for src in node['in']:
+            for edge in regraph_edges:
+                if edge.src == src and edge.tgt == node['index']:
+                    regraph_node.in_edges.append(edge)
+                    break
+        for tgt in node['out']:
+            for edge in regraph_edges:
+                if edge.src == node['index'] and edge.tgt == tgt:
+                    regraph_node.out_edges.append(edge)
+        regraph_nodes.append(regraph_node)
+    return ReGraph(regraph_nodes=regraph_nodes, regraph_edges=regraph_edges)
+
+
+def adjacency(re_graph: ReGraph) -> list:
+    positions = {id(edge): i for i, edge in enumerate(re_graph.regraph_edges)}
+    return [
+        ([positions[id(edge)] for edge in node.in_edges], [positions[id(edge)] for edge in node.out_edges])
+        for node in re_graph.regraph_nodes
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser('bench_load')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 10000, 25000, 50000])
+    parser.add_argument('--skip_scan_above', type=int, default=10000, help="Only time the linear loader on larger graphs")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        graph = make_graph(size)
+        start = time.perf_counter()
+        loaded = ReGraph.from_graph(graph)
+        load_time = time.perf_counter() - start
+        line = f"{size:>6} trajectories, {len(graph['node']):>5} nodes, {len(graph['edge']):>6} edges: linear {load_time * 1000:.1f}ms"
+        if size <= args.skip_scan_above:
+            start = time.perf_counter()
+            scanned = scan_from_graph(graph)
+            scan_time = time.perf_counter() - start
+            assert adjacency(scanned) == adjacency(loaded)
+            line += f", scan {scan_time:.2f}s"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
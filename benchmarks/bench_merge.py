@@ -0,0 +1,89 @@
+"""
+Merge synthetic trajectories into a ReGraph with the indexed lookups of `ReGraph.merge`, and with the
+linear scans over out-edges and nodes that merge used before, and print the time of both per corpus size.
+
+    python benchmarks/bench_merge.py --sizes 1000 10000 100000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from typing import Iterator
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ReGraphT.ReGraph import ReGraph, ReGraphEdge, ReGraphNode
+
+
+def trajectories(num_trajectories: int, seed: int=0) -> Iterator[list[dict]]:
+    rng = random.Random(seed)
+    for i in range(num_trajectories):
+        # The method vocabulary grows with the corpus, as in real constructions
+        vocabulary = max(20, i // 20)
+        yield [
+            {"think": "", "method": f"m{rng.randrange(vocabulary)}", "detail": "", "code": f"c{i}_{step}"}
+            for step in range(rng.randint(1, 6))
+        ]
+
+
+def scan_merge(re_graph: ReGraph, name: str, code: str, trajectory: list[dict]):
+    """
+    Merge by scanning the out-edges of the current state, then every node, for the method of each step.
+    """
+    state = re_graph.init_state
+    last_code = code
+    for step in trajectory:
+        example = {"name": name, "think": step['think'], "detail": step['detail'], "before": last_code, "after": step['code']}
+        edge = next((edge for edge in state.out_edges if re_graph.regraph_nodes[edge.tgt].name == step['method']), None)
+        if edge is None:
+            node = next((node for node in re_graph.regraph_nodes if node.name == step['method']), None)
+            if node is None:
+                node = ReGraphNode(index=len(re_graph.regraph_nodes), name=step['method'])
+                re_graph.regraph_nodes.append(node)
+            edge = ReGraphEdge(src=state.index, tgt=node.index)
+            re_graph.regraph_edges.append(edge)
+            state.add_out_edge(edge)
+            node.add_in_edge(edge)
+        edge.add_example(example)
+        state = re_graph.regraph_nodes[edge.tgt]
+        last_code = step['code']
+
+
+def run(num_trajectories: int, scan: bool, time_limit: float) -> tuple[float, ReGraph]:
+    """
+    Seconds to merge the corpus, None if it exceeds `time_limit`, and the resulting graph.
+    """
+    re_graph = ReGraph()
+    start = time.perf_counter()
+    for i, trajectory in enumerate(trajectories(num_trajectories)):
+        if scan:
+            scan_merge(re_graph, f"k{i}", "code", trajectory)
+        else:
+            re_graph.merge(f"k{i}", "code", trajectory)
+        if time.perf_counter() - start > time_limit:
+            return None, re_graph
+    return time.perf_counter() - start, re_graph
+
+
+def main():
+    parser = argparse.ArgumentParser('bench_merge')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 10000, 25000, 50000, 100000])
+    parser.add_argument('--time_limit', type=float, default=120.0, help="Seconds after which a run is abandoned")
+    args = parser.parse_args()
+
+    _, scanned = run(3000, scan=True, time_limit=float('inf'))
+    _, indexed = run(3000, scan=False, time_limit=float('inf'))
+    assert [node.name for node in scanned.regraph_nodes] == [node.name for node in indexed.regraph_nodes]
+    assert [(edge.src, edge.tgt, edge.examples) for edge in scanned.regraph_edges] == \
+        [(edge.src, edge.tgt, edge.examples) for edge in indexed.regraph_edges]
+    print("scanned and indexed merges build identical graphs")
+    for size in args.sizes:
+        scan_time, _ = run(size, scan=True, time_limit=args.time_limit)
+        index_time, re_graph = run(size, scan=False, time_limit=args.time_limit)
+        scan_time = f"{scan_time:.2f}s" if scan_time is not None else f">{args.time_limit:.0f}s"
+        print(f"{size:>7} trajectories, {len(re_graph.regraph_nodes):>5} nodes: scan {scan_time}, indexed {index_time:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
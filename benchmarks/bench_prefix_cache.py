@@ -0,0 +1,76 @@
+"""
+Generate for ReGraphT-style prompts, which share the system prompt and in groups the same retrieved example,
+with a small local model through `LocalEngine`, with and without prefix caching, and print the latency,
+prefill time and cached-token ratio of each. Requires vLLM; a sub-1B model runs on CPU builds of vLLM.
+
+    python benchmarks/bench_prefix_cache.py --model Qwen/Qwen2.5-0.5B-Instruct --num_prompts 64 --per_example 8
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ReGraphT.engine import EngineConfig, SamplingParams
+from ReGraphT.prompt import REGRAPHT_SYSTEM_PROMPT
+
+
+def regrapht_prompts(num_prompts: int, per_example: int) -> list[list[dict]]:
+    prompts = []
+    for i in range(num_prompts):
+        example = i % max(num_prompts // per_example, 1)
+        prompts.append([
+            {"role": "system", "content": REGRAPHT_SYSTEM_PROMPT},
+            {"role": "user", "content": json.dumps({
+                "code": f"void scale{i}(float* a, int n) {{ for (int j = 0; j < n; j++) a[j] *= {i}.0f; }}",
+                "method": "shared memory tiling",
+                "example": {
+                    "detail": f"Stage tiles of the input in shared memory (example {example})",
+                    "before": f"void conv{example}(const float* in, float* out, int n) {{ for (int i = 1; i < n - 1; i++) out[i] = in[i - 1] + in[i] + in[i + 1]; }}\n" * 8,
+                    "after": f"__global__ void conv{example}(const float* in, float* out, int n) {{ __shared__ float tile[258]; /* ... */ }}\n" * 8,
+                },
+            })},
+        ])
+    # Interleaved, so that prompts sharing an example are not submitted next to each other
+    return prompts[::2] + prompts[1::2]
+
+
+def main():
+    parser = argparse.ArgumentParser('bench_prefix_cache')
+    parser.add_argument('--model', type=str, required=True, help="Local model path or name, e.g. a sub-1B instruct model")
+    parser.add_argument('--num_prompts', type=int, default=64)
+    parser.add_argument('--per_example', type=int, default=8, help="Prompts sharing each retrieved example")
+    parser.add_argument('--max_tokens', type=int, default=16)
+    parser.add_argument('--prefix_caching', type=str, nargs='+', choices=['on', 'off'], default=['off', 'on'],
+                        help="Settings to run, each in its own process since vLLM holds the device")
+    args = parser.parse_args()
+
+    if len(args.prefix_caching) > 1:
+        import subprocess
+        for setting in args.prefix_caching:
+            subprocess.run([sys.executable, __file__, *sys.argv[1:], '--prefix_caching', setting], check=True)
+        return
+
+    from ReGraphT.engine.local_engine import LocalEngine
+    enable = args.prefix_caching[0] == 'on'
+    engine = LocalEngine(EngineConfig(local_model_path=args.model, enable_prefix_caching=enable))
+    prompts = regrapht_prompts(args.num_prompts, args.per_example)
+    config = SamplingParams(temperature=0.0, max_tokens=args.max_tokens)
+    # Warm the engine up on unrelated prompts, so that the timed batch does not pay for compilation
+    engine.generate([[{"role": "user", "content": "warm up"}]], config)
+    warm_stats = engine.prefix_cache_stats()
+    start = time.perf_counter()
+    outputs = engine.generate(prompts, config)
+    elapsed = time.perf_counter() - start
+    prefill = [output['prefill_time'] for output in outputs if output['prefill_time'] is not None]
+    prompt_tokens = engine.prompt_tokens - warm_stats['prompt_tokens']
+    cached_tokens = engine.cached_tokens - warm_stats['cached_tokens']
+    print(f"prefix caching {args.prefix_caching[0]:>3}: {elapsed:.2f}s for {len(prompts)} prompts, "
+          f"mean prefill {sum(prefill) / len(prefill) * 1000 if prefill else float('nan'):.1f}ms, "
+          f"{cached_tokens}/{prompt_tokens} prompt tokens cached ({LocalEngine.cached_token_ratio(cached_tokens, prompt_tokens):.1%})")
+
+
+if __name__ == '__main__':
+    main()
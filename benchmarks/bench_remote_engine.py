@@ -0,0 +1,48 @@
+"""
+Send a batch of prompts through `RemoteEngine.generate` to the stub endpoint of tests/stub_server.py at
+several `max_concurrency` levels, and print the batch latency and the speedup over sequential requests.
+
+    python benchmarks/bench_remote_engine.py --num_prompts 32 --latency 0.2 --max_concurrency 1 4 16 32
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+
+from stub_server import StubServer
+from ReGraphT.engine import EngineConfig, SamplingParams
+from ReGraphT.engine.remote_engine import RemoteEngine
+
+
+def main():
+    parser = argparse.ArgumentParser('bench_remote_engine')
+    parser.add_argument('--num_prompts', type=int, default=32)
+    parser.add_argument('--latency', type=float, default=0.2, help="Seconds per request of the stub endpoint")
+    parser.add_argument('--max_concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    os.environ.setdefault('OPENAI_API_KEY', 'stub')
+    prompts = [[{"role": "user", "content": json.dumps({"kernel": f"k{i}"})}] for i in range(args.num_prompts)]
+    base_time = None
+    for max_concurrency in args.max_concurrency:
+        # A server per level, so that each engine registers its own scheduler for the endpoint
+        server = StubServer(latency=args.latency).start()
+        try:
+            engine = RemoteEngine(EngineConfig(base_url=server.base_url, max_concurrency=max_concurrency))
+            start = time.perf_counter()
+            outputs = engine.generate(prompts, SamplingParams(model='stub'))
+            elapsed = time.perf_counter() - start
+        finally:
+            server.stop()
+        assert [output['prompts'] for output in outputs] == prompts
+        base_time = base_time if base_time is not None else elapsed
+        print(f"max_concurrency {max_concurrency:>3}: {elapsed:.2f}s, speedup {base_time / elapsed:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
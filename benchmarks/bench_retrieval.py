@@ -0,0 +1,136 @@
+"""
+Build a `CodeRetrievalIndex` over a synthetic corpus of kernel families, each a base kernel with mutated
+variants, and print the build rate, query latency (LSH, batched and exhaustive), recall@k of the LSH
+candidates against an exhaustive MinHash scan and against exact Jaccard similarity, and save/load times.
+
+    python benchmarks/bench_retrieval.py --num_families 2000 --per_family 25 --num_queries 300
+"""
+import os
+import re
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ReGraphT.reasoner import CodeRetrievalIndex
+from ReGraphT.utils import tokenize_code
+
+OPERATORS = ['+', '-', '*']
+FUNCTIONS = ['sqrtf', 'expf', 'fabsf', 'logf', 'sinf', 'cosf', 'tanhf']
+
+
+def base_kernel(rng: random.Random, family: int) -> list[str]:
+    lines = [f"void kernel_{family}(const float* a, const float* b, float* out, int n) {{"]
+    for j in range(rng.randint(15, 40)):
+        kind = rng.random()
+        if kind < 0.3:
+            lines.append(f"    for (int i{j} = 0; i{j} < n; ++i{j}) {{ out[i{j}] {rng.choice(OPERATORS)}= a[i{j}] {rng.choice(OPERATORS)} b[i{j}]; }}")
+        elif kind < 0.6:
+            lines.append(f"    float v{rng.randint(0, 9)}_{j} = {rng.choice(FUNCTIONS)}(a[{rng.randint(0, 64)}]) {rng.choice(OPERATORS)} {rng.random():.3f}f;")
+        else:
+            lines.append(f"    if (n > {rng.randint(1, 1000)}) {{ out[{rng.randint(0, 64)}] = {rng.choice(FUNCTIONS)}(b[{rng.randint(0, 64)}]); }}")
+    return lines + ["}"]
+
+
+def mutate(rng: random.Random, lines: list[str], mutations: int=3) -> str:
+    lines = list(lines)
+    for _ in range(mutations):
+        j = rng.randrange(1, len(lines) - 1)
+        lines[j] = lines[j].replace(rng.choice(OPERATORS), rng.choice(OPERATORS), 1).replace(rng.choice(FUNCTIONS), rng.choice(FUNCTIONS))
+        if rng.random() < 0.3:
+            lines.insert(j, f"    // tweak {rng.random()}")
+    return "\n".join(lines)
+
+
+def shingles(code: str, ngram: int=3) -> set[str]:
+    tokens = tokenize_code(code)
+    return {' '.join(tokens[i:i + ngram]) for i in range(len(tokens) - ngram + 1)}
+
+
+def names(results: list[list[tuple[dict, float]]]) -> list[list[str]]:
+    return [[pair['name'] for pair, _ in pairs] for pairs in results]
+
+
+def main():
+    parser = argparse.ArgumentParser('bench_retrieval')
+    parser.add_argument('--num_families', type=int, default=2000)
+    parser.add_argument('--per_family', type=int, default=25)
+    parser.add_argument('--num_queries', type=int, default=300)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--exact_queries', type=int, default=30, help="Queries checked against exact Jaccard similarity")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    families = [base_kernel(rng, family) for family in range(args.num_families)]
+    pairs = [
+        {"name": f"k{family}_{i}", "method": "tiling", "detail": "", "before": mutate(rng, families[family]), "after": f"// {family} {i}"}
+        for family in range(args.num_families) for i in range(args.per_family)
+    ]
+    index = CodeRetrievalIndex()
+    start = time.perf_counter()
+    index.add_pairs(pairs)
+    build_time = time.perf_counter() - start
+    print(f"build: {len(index)} pairs in {build_time:.1f}s ({len(index) / build_time:.0f} pairs/s)")
+
+    queries = [mutate(rng, families[rng.randrange(args.num_families)]) for _ in range(args.num_queries)]
+    # The first query sorts the band buckets
+    index.query(queries[0])
+    start = time.perf_counter()
+    lsh = [index.query(query, k=args.k) for query in queries]
+    lsh_time = (time.perf_counter() - start) / len(queries)
+    start = time.perf_counter()
+    batched = index.query_many(queries, k=args.k)
+    batched_time = (time.perf_counter() - start) / len(queries)
+    start = time.perf_counter()
+    exhaustive = [index.query(query, k=args.k, exhaustive=True) for query in queries]
+    exhaustive_time = (time.perf_counter() - start) / len(queries)
+    assert names(lsh) == names(batched)
+    print(f"latency per query: LSH {lsh_time * 1000:.2f} ms, batched {batched_time * 1000:.2f} ms, exhaustive {exhaustive_time * 1000:.2f} ms")
+
+    # Recall by similarity, since variants of a family often tie
+    recall = sum(
+        len(set(round(s, 6) for _, s in a) & set(round(s, 6) for _, s in b)) / len(set(round(s, 6) for _, s in b))
+        for a, b in zip(lsh, exhaustive)
+    ) / len(queries)
+    family = lambda code: re.search(r'kernel_(\d+)', code).group(1)
+    same_family = sum(all(family(pair['before']) == family(query) for pair, _ in results) for query, results in zip(queries, lsh)) / len(queries)
+    pair_shingles = [shingles(pair['before']) for pair in pairs]
+    positions = {pair['name']: i for i, pair in enumerate(pairs)}
+    found = 0
+    for query, results in list(zip(queries, lsh))[:args.exact_queries]:
+        query_shingles = shingles(query)
+        jaccard = [len(query_shingles & other) / len(query_shingles | other) for other in pair_shingles]
+        # A retrieved pair counts if it is as similar as the k-th most similar pair, whatever the ties
+        threshold = sorted(jaccard, reverse=True)[args.k - 1]
+        found += sum(jaccard[positions[pair['name']]] >= threshold for pair, _ in results)
+    print(f"recall@{args.k}: vs exhaustive MinHash {recall:.3f}, vs exact Jaccard {found / (args.k * min(args.exact_queries, len(queries))):.3f}; "
+          f"top-{args.k} all from the query's family {same_family:.3f}")
+
+    path = tempfile.mkdtemp(prefix='bench_retrieval')
+    try:
+        start = time.perf_counter()
+        index.save(path)
+        save_time = time.perf_counter() - start
+        start = time.perf_counter()
+        loaded = CodeRetrievalIndex.load(path)
+        load_time = time.perf_counter() - start
+        start = time.perf_counter()
+        assert names(loaded.query_many(queries, k=args.k)) == names(batched)
+        first_time = time.perf_counter() - start
+        print(f"save {save_time:.1f}s, load {load_time:.1f}s (memory-mapped), first batch after load {first_time:.2f}s")
+        start = time.perf_counter()
+        new_code = queries[0] + "\nint added_pair_marker;"
+        added = loaded.add_pairs(pairs[:100] + [{"name": "new", "before": new_code, "after": ""}])
+        add_time = time.perf_counter() - start
+        assert added == 1 and loaded.query(new_code)[0][0]['name'] == "new"
+        print(f"incremental add: 1 new pair of 101 in {add_time * 1000:.1f} ms, retrieved first")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
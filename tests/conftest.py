@@ -0,0 +1,19 @@
+import os
+import sys
+
+# The package is imported as `ReGraphT` from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from stub_server import StubServer
+
+
+@pytest.fixture(scope="session")
+def stub_server():
+    """
+    A stub OpenAI-compatible endpoint shared by the tests, answering without latency unless a test sets one.
+    """
+    server = StubServer().start()
+    yield server
+    server.stop()
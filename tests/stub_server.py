@@ -0,0 +1,147 @@
+"""
+Local stand-in for an OpenAI-compatible chat completions endpoint, with a fixed latency per request.
+
+- Reasoning prompts (CUDA_REASONING_SYSTEM_PROMPT) get a trajectory of 1-4 steps drawn from the kernel,
+  with method names in varying case;
+- relabel prompts get "yes" for the methods that exist up to case, "no" otherwise;
+- any other prompt gets {"think", "code"} with the code `// optimized`.
+
+Responses are deterministic, so runs against the stub are reproducible. Streaming requests are answered
+as server-sent events. Run standalone for benchmarks:
+
+    python tests/stub_server.py --port 8768 --latency 0.2
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ReGraphT.prompt import CUDA_REASONING_SYSTEM_PROMPT
+
+
+def respond(messages: list[dict]) -> str:
+    user = json.loads(messages[-1]['content'])
+    if messages[0]['content'] == CUDA_REASONING_SYSTEM_PROMPT:
+        kernel = user['kernel']
+        rng = random.Random(kernel)
+        response = [
+            {
+                "think": "",
+                "method": rng.choice([str.title, str.lower, str.upper])(f"method {rng.randrange(40)}"),
+                "detail": "",
+                "code": f"{kernel}\n// step {i}",
+            }
+            for i in range(rng.randint(1, 4))
+        ]
+    elif isinstance(user, dict) and 'methods' in user:
+        methods = {method.lower(): method for method in user['methods']}
+        response = [
+            {"existed": "yes", "method": methods[step['method'].lower()]}
+            if step['method'].lower() in methods else {"existed": "no", "method": step['method']}
+            for step in user['process']
+        ]
+    else:
+        response = {"think": "", "code": "// optimized"}
+    return '```json\n' + json.dumps(response) + '\n```'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with self.server.lock:
+            self.server.requests += 1
+        time.sleep(self.server.latency)
+        content = respond(request['messages'])
+        if request.get('stream'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.end_headers()
+            for i in range(0, len(content), 16):
+                chunk = {
+                    "id": "stub", "object": "chat.completion.chunk", "created": 0, "model": request['model'],
+                    "choices": [{"index": 0, "delta": {"content": content[i:i + 16]}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+            return
+        prompt_tokens = sum(len(message['content']) for message in request['messages']) // 4
+        completion_tokens = len(content) // 4
+        body = json.dumps({
+            "id": "stub", "object": "chat.completion", "created": 0, "model": request['model'],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop", "logprobs": None}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    # Accept a full batch of concurrent connections instead of the default backlog of 5
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class StubServer(object):
+    def __init__(self, port: int=0, latency: float=0.0):
+        """StubServer serves the stub endpoint from a background thread.
+        port: Port to listen on, any free port if 0
+        latency: Seconds every request waits before it is answered
+        """
+        self.server = StubHTTPServer(('127.0.0.1', port), StubHandler)
+        self.server.latency = latency
+        self.server.requests = 0
+        self.server.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    @property
+    def requests(self) -> int:
+        return self.server.requests
+
+    @property
+    def latency(self) -> float:
+        return self.server.latency
+
+    @latency.setter
+    def latency(self, latency: float):
+        self.server.latency = latency
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser('stub_server')
+    parser.add_argument('--port', type=int, default=8768)
+    parser.add_argument('--latency', type=float, default=0.2)
+    args = parser.parse_args()
+    server = StubServer(port=args.port, latency=args.latency)
+    print(f"serving on {server.base_url}, latency {args.latency}s", flush=True)
+    server.server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import json
+import random
+
+from ReGraphT.ReGraph import ReGraph
+from ReGraphT.reasoner import CodeRAGReasoner, CodeRetrievalIndex
+
+OPERATORS = ['+', '-', '*']
+FUNCTIONS = ['sqrtf', 'expf', 'fabsf', 'logf', 'sinf', 'cosf']
+
+
+def kernel(rng: random.Random, family: int) -> list[str]:
+    lines = [f"void kernel_{family}(const float* a, float* out, int n) {{"]
+    for j in range(rng.randint(15, 30)):
+        if rng.random() < 0.5:
+            lines.append(f"    for (int i{j} = 0; i{j} < n; ++i{j}) {{ out[i{j}] {rng.choice(OPERATORS)}= a[i{j}]; }}")
+        else:
+            lines.append(f"    float v{j} = {rng.choice(FUNCTIONS)}(a[{rng.randint(0, 64)}]) {rng.choice(OPERATORS)} {rng.random():.3f}f;")
+    return lines + ["}"]
+
+
+def variant(rng: random.Random, lines: list[str]) -> str:
+    lines = list(lines)
+    for _ in range(2):
+        j = rng.randrange(1, len(lines) - 1)
+        lines[j] = lines[j].replace(rng.choice(FUNCTIONS), rng.choice(FUNCTIONS))
+    return "\n".join(lines)
+
+
+def corpus(num_families: int=50, per_family: int=5, seed: int=0) -> tuple[list[list[str]], list[dict]]:
+    rng = random.Random(seed)
+    families = [kernel(rng, family) for family in range(num_families)]
+    pairs = [
+        {"name": f"k{family}_{i}", "method": "tiling", "detail": "", "before": variant(rng, families[family]), "after": f"// {family} {i}"}
+        for family in range(num_families) for i in range(per_family)
+    ]
+    return families, pairs
+
+
+def test_query_finds_the_family():
+    families, pairs = corpus()
+    index = CodeRetrievalIndex()
+    assert index.add_pairs(pairs) == len(pairs)
+    rng = random.Random(1)
+    for family in range(0, 50, 7):
+        results = index.query(variant(rng, families[family]), k=3)
+        assert len(results) == 3
+        assert all(pair['name'].startswith(f"k{family}_") for pair, _ in results)
+        assert [similarity for _, similarity in results] == sorted((similarity for _, similarity in results), reverse=True)
+
+
+def test_batched_and_exhaustive_queries_agree():
+    families, pairs = corpus()
+    index = CodeRetrievalIndex()
+    index.add_pairs(pairs)
+    rng = random.Random(2)
+    queries = [variant(rng, families[family]) for family in range(10)]
+    single = [[pair['name'] for pair, _ in index.query(query, k=2)] for query in queries]
+    batched = [[pair['name'] for pair, _ in results] for results in index.query_many(queries, k=2)]
+    assert single == batched
+    # Variants of a family often tie, so the LSH candidates are compared with a full scan by similarity
+    for query in queries:
+        assert [similarity for _, similarity in index.query(query, k=2)] == \
+            [similarity for _, similarity in index.query(query, k=2, exhaustive=True)]
+
+
+def test_exclude_and_incremental_add():
+    families, pairs = corpus(num_families=5)
+    index = CodeRetrievalIndex()
+    index.add_pairs(pairs)
+    code = "\n".join(families[0])
+    assert index.add("int unrelated() { return 0; }", "// new", name="new") is True
+    assert index.add("int unrelated() { return 0; }", "// new", name="new") is False
+    assert index.query("int unrelated() { return 0; }")[0][0]['name'] == "new"
+    # Excluded pairs are never returned, and the other pairs still fill the k results
+    results = index.query(code, k=3, exclude="k0_0")
+    assert len(results) == 3 and all(pair['name'] != "k0_0" for pair, _ in results)
+
+
+def test_save_load_round_trip(tmp_path):
+    families, pairs = corpus(num_families=10)
+    index = CodeRetrievalIndex()
+    index.add_pairs(pairs)
+    index.save(str(tmp_path / "index"))
+    loaded = CodeRetrievalIndex.load(str(tmp_path / "index"))
+    queries = ["\n".join(lines) for lines in families]
+    assert [[pair['name'] for pair, _ in results] for results in loaded.query_many(queries, k=3)] == \
+        [[pair['name'] for pair, _ in results] for results in index.query_many(queries, k=3)]
+    assert loaded.add_pairs(pairs[:5]) == 0
+
+
+def test_from_regraph_and_reasoner():
+    re_graph = ReGraph()
+    re_graph.merge("k0", "void scale(float* a) { a[0] *= 2.0f; }", [
+        {"think": "", "method": "shared memory", "detail": "stage a tile", "code": "__global__ void scale(float* a) {}"}
+    ])
+    index = CodeRetrievalIndex.from_regraph(re_graph)
+    assert len(index) == 1 and index.documents[0]['method'] == "shared memory"
+
+    class Engine(object):
+        def generate(self, prompts, config, **kwargs):
+            # Answers with the `after` code of the first retrieved example
+            return [
+                {"generation": "```json\n" + json.dumps({"think": "", "code": json.loads(prompt[1]['content'])['examples'][0]['after']}) + "\n```"}
+                for prompt in prompts
+            ]
+
+    reasoner = CodeRAGReasoner(Engine(), index, k=1)
+    result = reasoner.optimize({"name": "q", "index": 0, "kernel": "void scale(float* a) { a[0] *= 3.0f; }"})
+    assert result['code'] == "__global__ void scale(float* a) {}"
+    assert result['examples'] == ["k0"]
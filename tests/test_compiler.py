@@ -0,0 +1,97 @@
+import os
+import shutil
+
+import pytest
+
+from ReGraphT.executor import CompileHarness
+
+pytestmark = pytest.mark.skipif(shutil.which('g++') is None or shutil.which('prlimit') is None, reason="needs g++ and prlimit")
+
+HELLO = """#include <cstdio>
+int main() { std::printf("42\\n"); return 0; }
+"""
+
+REFERENCE = """#include <cstdio>
+int main() {
+    float a[256], sum = 0.0f;
+    for (int i = 0; i < 256; ++i) a[i] = i * 0.5f;
+    for (int i = 0; i < 256; ++i) sum += a[i] * 2.0f;
+    std::printf("%f\\n", sum);
+    return 0;
+}
+"""
+
+CUDA = """#include <cstdio>
+#include <cuda_runtime.h>
+__global__ void scale(float* a, int n) {
+    int i = blockIdx.x * blockDim.x + threadIdx.x;
+    if (i < n) a[i] *= 2.0f;
+}
+int main() {
+    float h[256], *d, sum = 0.0f;
+    for (int i = 0; i < 256; ++i) h[i] = i * 0.5f;
+    cudaMalloc(&d, sizeof(h));
+    cudaMemcpy(d, h, sizeof(h), cudaMemcpyHostToDevice);
+    scale<<<4, 64>>>(d, 256);
+    cudaMemcpy(h, d, sizeof(h), cudaMemcpyDeviceToHost);
+    cudaFree(d);
+    for (int i = 0; i < 256; ++i) sum += h[i];
+    std::printf("%f\\n", sum);
+    return 0;
+}
+"""
+
+
+@pytest.fixture
+def harness(tmp_path):
+    # Without nvcc CUDA code is emulated, so the tests run on any machine with a C++ compiler
+    harness = CompileHarness(str(tmp_path / "cache"), max_workers=2, nvcc=None, isolation='none')
+    yield harness
+    harness.close()
+
+
+def test_compile_and_run(harness):
+    result = harness.compile(HELLO)
+    assert result.success and result.mode == 'cpp' and not result.cached
+    run = harness.run(result)
+    assert run.success and run.stdout == "42\n"
+    failed = harness.compile("int main() { return undefined; }")
+    assert not failed.success and "undefined" in failed.log
+    assert not harness.run(failed).success
+
+
+def test_identical_compiles_hit_the_cache(harness, tmp_path):
+    first = harness.compile(HELLO)
+    second = harness.compile(HELLO)
+    assert second.cached and second.binary == first.binary
+    assert harness.stats() == {'hits': 1, 'misses': 1, 'entries': 1}
+    # Concurrent identical sources share one compilation
+    assert all(result.success for result in harness.compile_many([REFERENCE, REFERENCE]))
+    assert harness.stats()['misses'] == 2
+    # The cache is on disk, a new harness reuses it
+    other = CompileHarness(str(tmp_path / "cache"), nvcc=None, isolation='none')
+    assert other.compile(HELLO).cached
+    other.close()
+
+
+def test_timeout_is_not_cached(harness):
+    harness.compile_timeout = 0.001
+    result = harness.compile(HELLO)
+    assert result.timeout and not result.success
+    key = harness.key(HELLO)
+    assert key not in harness.results
+    assert not os.path.exists(os.path.join(harness.cache_dir, key[:2], key, 'result.json'))
+    # The next compilation retries instead of returning the timeout
+    harness.compile_timeout = 120.0
+    retried = harness.compile(HELLO)
+    assert retried.success and not retried.cached
+    assert harness.stats()['misses'] == 2
+
+
+def test_evaluate_emulated_cuda_against_reference(harness):
+    evaluation = harness.evaluate(CUDA, reference=REFERENCE, repeats=1)
+    assert evaluation['compile']['mode'] == 'emulated'
+    assert evaluation['compiled'] and evaluation['correct']
+    assert evaluation['speedup'] is not None
+    wrong = harness.evaluate(CUDA.replace("*= 2.0f", "*= 3.0f"), reference=REFERENCE, repeats=1)
+    assert wrong['compiled'] and not wrong['correct']
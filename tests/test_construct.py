@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+import importlib
+
+import pytest
+from openai import OpenAI
+
+from ReGraphT.ReGraph import ReGraph
+
+
+@pytest.fixture
+def construct(stub_server, tmp_path, monkeypatch):
+    monkeypatch.setenv("LOG_PATH", str(tmp_path / "construct.log"))
+    monkeypatch.setenv("OPENAI_API_KEY", "stub")
+    monkeypatch.setenv("BASE_URL", stub_server.base_url)
+    module = importlib.import_module("ReGraphT.construct")
+    # The client is created on import, possibly by an earlier test against another endpoint
+    monkeypatch.setattr(module, "client", OpenAI(api_key="stub", base_url=stub_server.base_url, max_retries=0))
+    return module
+
+
+def write_kernels(path, num_kernels: int):
+    with open(path, 'w') as f:
+        for i in range(num_kernels):
+            f.write(json.dumps({"index": i, "name": f"k{i}", "kernel": f"void k{i}(float* a) {{ a[{i}] = 0; }}"}) + '\n')
+
+
+def build(construct, monkeypatch, kernel_path, save_dir, *options) -> ReGraph:
+    os.makedirs(save_dir)
+    monkeypatch.setattr(sys, "argv", ["construct", "--kernel_path", str(kernel_path), "--save_dir", str(save_dir), *options])
+    construct.construct_regraph(construct.parser_args())
+    return ReGraph.load(os.path.join(save_dir, "ReGraph_final.json"))
+
+
+def test_concurrent_construction_matches_serial(construct, monkeypatch, tmp_path):
+    kernel_path = tmp_path / "kernels.jsonl"
+    write_kernels(kernel_path, 40)
+    serial = build(construct, monkeypatch, kernel_path, tmp_path / "serial")
+    concurrent = build(construct, monkeypatch, kernel_path, tmp_path / "concurrent", "--concurrency", "8")
+    assert concurrent.to_graph() == serial.to_graph()
+    assert sum(len(edge.examples) for edge in serial.regraph_edges) > 40
+    # Spelling variants of a method are relabeled into one node
+    names = [node.name.lower() for node in serial.regraph_nodes]
+    assert len(names) == len(set(names))
+
+
+def test_resume_skips_merged_kernels(construct, monkeypatch, tmp_path, stub_server):
+    kernel_path = tmp_path / "kernels.jsonl"
+    write_kernels(kernel_path, 20)
+    full = build(construct, monkeypatch, kernel_path, tmp_path / "full")
+    requests = stub_server.requests
+    resumed = build(construct, monkeypatch, kernel_path, tmp_path / "full_again", "--re_graph", str(tmp_path / "full" / "ReGraph.snapshot.json"),
+                    "--re_graph_journal", str(tmp_path / "full" / "ReGraph.journal.jsonl"))
+    assert stub_server.requests == requests
+    assert resumed.to_graph()['node'] == full.to_graph()['node']
+
+
+def steps(*methods: str) -> list[dict]:
+    return [{"think": "", "method": method, "detail": f"apply {method.lower()}", "code": "// code"} for method in methods]
+
+
+def relabeled(trajectories: list[list[dict]]) -> list[list[str]]:
+    return [[step['method'] for step in trajectory] for trajectory in trajectories]
+
+
+def test_relabel_merges_spelling_variants_of_a_batch(construct, stub_server):
+    re_graph = ReGraph()
+    re_graph.merge("k0", "code", steps("shared memory"))
+    labels = {}
+    batch = [steps("Loop Unrolling"), steps("loop-unrolling", "Shared Memory"), steps("loop unroll", "loop fusion")]
+    requests = stub_server.requests
+    result = construct.relabel(batch, re_graph, labels, model="stub")
+    # The new methods of one request are resolved against each other, distinct ones stay apart
+    assert relabeled(result) == [["Loop Unrolling"], ["Loop Unrolling", "shared memory"], ["Loop Unrolling", "loop fusion"]]
+    assert stub_server.requests == requests + 1
+    # Cached labels are applied without another request
+    again = construct.relabel([steps("loop-unrolling", "loop fusion")], re_graph, labels, model="stub")
+    assert relabeled(again) == [["Loop Unrolling", "loop fusion"]]
+    assert stub_server.requests == requests + 1
+
+
+def test_relabel_keeps_close_new_methods_apart(construct):
+    labels = {}
+    result = construct.relabel([steps("float4 vectorized loads", "float2 vectorized loads")], ReGraph(), labels, model="stub")
+    assert relabeled(result) == [["float4 vectorized loads", "float2 vectorized loads"]]
+
+
+def test_relabel_with_method_index(construct, stub_server):
+    re_graph = ReGraph()
+    re_graph.merge("k0", "code", steps("shared memory"))
+    method_index = construct.MethodIndex.from_regraph(re_graph)
+    requests = stub_server.requests
+    # Resolved offline: a spelling variant of a method and an unrelated new method
+    result = construct.relabel([steps("Shared-Memory", "tensor core mma")], re_graph, {}, model="stub", method_index=method_index)
+    assert relabeled(result) == [["shared memory", "tensor core mma"]]
+    assert stub_server.requests == requests and "tensor core mma" in method_index
+    # An ambiguous name goes to the LLM once, with its spelling variants in the batch
+    result = construct.relabel([steps("shared memory tiling"), steps("Shared-Memory Tiling")], re_graph, {}, model="stub", method_index=method_index)
+    assert relabeled(result) == [["shared memory tiling"], ["shared memory tiling"]]
+    assert stub_server.requests == requests + 1
@@ -0,0 +1,68 @@
+import random
+
+import numpy as np
+
+from ReGraphT.ReGraph import ReGraph
+
+
+def random_graph(num_nodes: int, num_edges: int, seed: int=0) -> ReGraph:
+    rng = random.Random(seed)
+    re_graph = ReGraph()
+    for i in range(1, num_nodes):
+        re_graph.add_node(f"m{i}")
+    pairs = set()
+    while len(pairs) < num_edges:
+        pairs.add((rng.randrange(num_nodes), rng.randrange(1, num_nodes)))
+    for src, tgt in sorted(pairs, key=lambda pair: rng.random()):
+        edge = re_graph.add_edge(src, tgt)
+        edge.examples = [{"name": f"k{i}"} for i in range(rng.randint(1, 6))]
+    # Examples are set directly instead of merged, so the supports are recomputed
+    re_graph.compute_statistics()
+    return re_graph
+
+
+def test_adjacency_matches_object_graph():
+    re_graph = random_graph(200, 2000)
+    csr = re_graph.to_csr()
+    for node in re_graph.regraph_nodes:
+        assert list(csr.successors(node.index)) == sorted(edge.tgt for edge in node.out_edges)
+        assert list(csr.predecessors(node.index)) == sorted(edge.src for edge in node.in_edges)
+        for edge_id in csr.successor_edges(node.index):
+            assert re_graph.regraph_edges[edge_id].src == node.index
+    assert list(csr.successors("m1")) == list(csr.successors(1))
+
+
+def test_score_matches_transition_probability():
+    re_graph = random_graph(100, 800)
+    csr = re_graph.to_csr()
+    rng = np.random.default_rng(0)
+    src = rng.integers(0, 100, 5000)
+    tgt = rng.integers(0, 100, 5000)
+    expected = [
+        re_graph.transition_probability(edge) if (edge := re_graph.get_edge(s, t)) is not None else -1.0
+        for s, t in zip(src.tolist(), tgt.tolist())
+    ]
+    assert np.allclose(csr.score(src, tgt, default=-1.0), expected)
+    assert csr.score(0, 0, default=-1.0) == -1.0
+    edge_ids = csr.edge_ids(src, tgt)
+    assert all((edge_id == -1) == (re_graph.get_edge(s, t) is None) for edge_id, s, t in zip(edge_ids, src.tolist(), tgt.tolist()))
+
+
+def test_top_successors():
+    re_graph = random_graph(50, 400)
+    csr = re_graph.to_csr()
+    for node in re_graph.regraph_nodes:
+        expected = sorted((len(edge.examples) for edge in node.out_edges), reverse=True)[:3]
+        assert [value for _, value in csr.top_successors(node.index, 3)] == expected
+
+
+def test_view_is_frozen_and_rebuilt_after_merge():
+    re_graph = random_graph(20, 60)
+    csr = re_graph.to_csr()
+    assert not csr.out_targets.flags.writeable
+    assert re_graph.to_csr() is csr
+    re_graph.merge("k", "code", [{"think": "", "method": "new method", "detail": "", "code": ""}])
+    rebuilt = re_graph.to_csr()
+    assert rebuilt is not csr
+    assert rebuilt.num_edges == csr.num_edges + 1
+    assert rebuilt.node_id("new method") in rebuilt.successors(0)
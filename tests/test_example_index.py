@@ -0,0 +1,70 @@
+import random
+
+from ReGraphT.ReGraph import ReGraph
+from ReGraphT.ReGraph.example_index import ExampleIndex
+
+FUNCTIONS = ['sqrtf', 'expf', 'fabsf', 'logf']
+
+
+def base_kernel(rng: random.Random, lines: int=40) -> list[str]:
+    return [f"float v{j} = {rng.choice(FUNCTIONS)}(a[{j}]) * {rng.random():.3f}f;" for j in range(lines)]
+
+
+def rewritten(lines: list[str], changed: int) -> str:
+    # The first `changed` statements are replaced by unrelated ones
+    return "\n".join([f"out[{j}] += b[{j} * {j}];" for j in range(changed)] + lines[changed:])
+
+
+def graph_with_examples(codes: list[str]) -> ReGraph:
+    re_graph = ReGraph()
+    for i, code in enumerate(codes):
+        re_graph.merge(f"k{i}", code, [{"think": "", "method": "tiling", "detail": f"example {i}", "code": "// tiled"}])
+    return re_graph
+
+
+def test_examples_ranked_by_similarity():
+    lines = base_kernel(random.Random(0))
+    changes = [30, 0, 40, 10, 20]
+    re_graph = graph_with_examples([rewritten(lines, changed) for changed in changes])
+    edge = re_graph.get_edge(0, re_graph.get_node("tiling").index)
+    results = re_graph.get_example_index().query(edge, "\n".join(lines), k=3)
+    assert [example['detail'] for example, _ in results] == ["example 1", "example 3", "example 4"]
+    assert results[0][1] == 1.0
+    assert [similarity for _, similarity in results] == sorted((similarity for _, similarity in results), reverse=True)
+    assert re_graph.similar_examples(edge, "\n".join(lines), k=1)[0]['detail'] == "example 1"
+
+
+def test_k_at_least_the_number_of_examples():
+    lines = base_kernel(random.Random(1))
+    re_graph = graph_with_examples([rewritten(lines, changed) for changed in (20, 0, 40)])
+    edge = re_graph.get_edge(0, re_graph.get_node("tiling").index)
+    for k in (3, 10):
+        assert [example['detail'] for example in re_graph.similar_examples(edge, "\n".join(lines), k=k)] == \
+            ["example 1", "example 0", "example 2"]
+
+
+def test_edge_without_examples():
+    re_graph = ReGraph()
+    tiling = re_graph.add_node("tiling")
+    edge = re_graph.add_edge(0, tiling.index)
+    assert re_graph.similar_examples(edge, "int x = 0;", k=2) == []
+    assert ExampleIndex().query(edge, "", k=1) == []
+
+
+def test_examples_merged_after_the_first_query():
+    rng = random.Random(2)
+    lines, other = base_kernel(rng), base_kernel(rng)
+    re_graph = graph_with_examples([rewritten(lines, 20)])
+    edge = re_graph.get_edge(0, re_graph.get_node("tiling").index)
+    index = re_graph.get_example_index()
+    assert re_graph.similar_examples(edge, "\n".join(other))[0]['detail'] == "example 0"
+    # A merge signs the new example right away through `add`
+    re_graph.merge("k1", "\n".join(other), [{"think": "", "method": "tiling", "detail": "merged", "code": "// tiled"}])
+    assert index.edges[id(edge)].count == len(edge.examples) == 2
+    assert re_graph.similar_examples(edge, "\n".join(other))[0]['detail'] == "merged"
+    # Examples added to the edge without the index are signed by `index` on the next query
+    edge.add_example({"name": "k2", "think": "", "detail": "appended", "before": "\n".join(lines), "after": "// tiled"})
+    assert index.edges[id(edge)].count == 2
+    results = index.query(edge, "\n".join(lines), k=3)
+    assert results[0] == (edge.examples[2], 1.0)
+    assert index.edges[id(edge)].count == 3 and len(index) == 1
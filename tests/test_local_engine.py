@@ -0,0 +1,155 @@
+import sys
+import json
+import types
+import importlib
+from types import SimpleNamespace
+
+import pytest
+
+from ReGraphT.engine import EngineConfig, SamplingParams
+from ReGraphT.prompt import REGRAPHT_SYSTEM_PROMPT
+
+# Characters per KV cache block of the fake engine, whose tokens are characters
+BLOCK_SIZE = 16
+
+
+class FakeLLMEngine(object):
+    """
+    Stand-in for the vLLM engine: tokens are characters, every step decodes one token of every request,
+    and a request reuses the cached blocks of the prompts prefilled in earlier steps, as in prefix caching.
+    """
+    def __init__(self, enable_prefix_caching: bool):
+        self.enable_prefix_caching = enable_prefix_caching
+        self.requests = {}
+        self.blocks = set()
+        self.prompts = []
+
+    def add_request(self, request_id, prompt, sampling_params):
+        self.requests[request_id] = {"prompt": prompt, "tokens": 0, "cached": None, "max_tokens": sampling_params.max_tokens}
+        self.prompts.append(prompt)
+
+    def abort_request(self, request_ids):
+        # As in vLLM's V1 engine, ids come as a list
+        assert isinstance(request_ids, list)
+        for request_id in request_ids:
+            self.requests.pop(request_id, None)
+
+    def step(self):
+        outputs = []
+        prefilled = []
+        for request_id, request in list(self.requests.items()):
+            prompt = request['prompt']
+            if request['cached'] is None:
+                cached = 0
+                while self.enable_prefix_caching and cached + BLOCK_SIZE <= len(prompt) and prompt[:cached + BLOCK_SIZE] in self.blocks:
+                    cached += BLOCK_SIZE
+                request['cached'] = cached
+                prefilled.append(prompt)
+            request['tokens'] += 1
+            finished = request['tokens'] >= request['max_tokens']
+            outputs.append(SimpleNamespace(
+                request_id=request_id,
+                prompt=prompt,
+                prompt_token_ids=list(prompt),
+                num_cached_tokens=request['cached'],
+                finished=finished,
+                metrics=None,
+                outputs=[SimpleNamespace(text=f"{prompt[-8:]}|{request['tokens']}", token_ids=list(range(request['tokens'])), logprobs=None)]
+            ))
+            if finished:
+                del self.requests[request_id]
+        # Blocks prefilled in this step are only reused from the next one
+        for prompt in prefilled:
+            self.blocks.update(prompt[:end] for end in range(BLOCK_SIZE, len(prompt) + 1, BLOCK_SIZE))
+        return outputs
+
+
+@pytest.fixture
+def local_engine(monkeypatch):
+    vllm = types.ModuleType("vllm")
+    vllm.SamplingParams = lambda max_tokens=16, **kwargs: SimpleNamespace(max_tokens=max_tokens, **kwargs)
+
+    class LLM(object):
+        def __init__(self, model, enable_prefix_caching=True):
+            self.llm_engine = FakeLLMEngine(enable_prefix_caching)
+
+        def get_tokenizer(self):
+            return SimpleNamespace(apply_chat_template=lambda messages, tokenize, add_generation_prompt: ''.join(
+                f"<{message['role']}>{message['content']}" for message in messages
+            ))
+
+    vllm.LLM = LLM
+    monkeypatch.setitem(sys.modules, "vllm", vllm)
+    monkeypatch.delitem(sys.modules, "ReGraphT.engine.local_engine", raising=False)
+    return importlib.import_module("ReGraphT.engine.local_engine").LocalEngine
+
+
+def regrapht_prompts(num_examples: int, per_example: int) -> list[list[dict]]:
+    """
+    Prompts sharing the system prompt, and in groups of `per_example` the same retrieved example.
+    """
+    prompts = []
+    for i in range(num_examples * per_example):
+        example = {"detail": f"tile loop {i % num_examples}", "before": "for (...) {}" * 40, "after": f"__global__ void k{i % num_examples}() {{}}" * 20}
+        prompts.append([
+            {"role": "system", "content": REGRAPHT_SYSTEM_PROMPT},
+            {"role": "user", "content": json.dumps({"method": "tiling", "example": example, "code": f"void kernel{i}() {{}}"})}
+        ])
+    return prompts
+
+
+def test_shared_prefixes(local_engine):
+    engine = local_engine(EngineConfig(local_model_path="fake", min_shared_prefix=8))
+    prompts = sorted(["system A x", "system A y", "system B long tail 1", "system B long tail 2", "other"])
+    assert engine.shared_prefixes(prompts) == ["system A ", "system B long tail "]
+    engine.config.min_shared_prefix = 12
+    assert engine.shared_prefixes(prompts) == ["system B long tail "]
+
+
+def test_generate_keeps_order_and_reports_cached_tokens(local_engine):
+    engine = local_engine(EngineConfig(local_model_path="fake"))
+    prompts = regrapht_prompts(num_examples=3, per_example=4)
+    # Shuffled so that prompts sharing an example are not neighbours
+    prompts = prompts[::2] + prompts[1::2]
+    outputs = engine.generate(prompts, SamplingParams(max_tokens=4))
+    assert [output['prompt'] for output in outputs] == [engine.tokenizer.apply_chat_template(prompt, tokenize=False, add_generation_prompt=True) for prompt in prompts]
+    assert all(output['generation'].endswith("|4") for output in outputs)
+    # Shared prefixes are prefilled before the batch, so every prompt of the batch starts from cached blocks
+    assert all(output['cached_tokens'] >= len(REGRAPHT_SYSTEM_PROMPT) - 2 * 16 for output in outputs)
+    stats = engine.prefix_cache_stats()
+    assert stats['prompt_tokens'] == sum(output['prompt_tokens'] for output in outputs)
+    assert stats['cached_tokens'] == sum(output['cached_tokens'] for output in outputs)
+    assert stats['cached_token_ratio'] > 0.8
+    assert len(engine.queues) == 0
+
+
+def test_prefix_caching_disabled(local_engine):
+    engine = local_engine(EngineConfig(local_model_path="fake", enable_prefix_caching=False))
+    outputs = engine.generate(regrapht_prompts(num_examples=2, per_example=2), SamplingParams(max_tokens=2))
+    assert all(output['cached_tokens'] == 0 for output in outputs)
+    # Without prefix caching no prefix is prefilled up front
+    assert len(engine.llm.llm_engine.prompts) == len(outputs)
+    assert engine.prefix_cache_stats()['cached_token_ratio'] == 0.0
+
+
+def test_prefixes_prefilled_before_batch(local_engine):
+    # Prompts admitted in the same step cannot reuse each other's blocks, only the warmed-up prefixes
+    prompts = regrapht_prompts(num_examples=2, per_example=3)
+    warm = local_engine(EngineConfig(local_model_path="fake"))
+    warm.generate(prompts, SamplingParams(max_tokens=2))
+    cold = local_engine(EngineConfig(local_model_path="fake", min_shared_prefix=10 ** 9))
+    cold.generate(prompts, SamplingParams(max_tokens=2))
+    assert cold.prefix_cache_stats()['cached_tokens'] == 0
+    assert warm.prefix_cache_stats()['cached_token_ratio'] > 0.8
+    assert len(warm.llm.llm_engine.prompts) > len(prompts)
+
+
+def test_closed_stream_aborts_its_request(local_engine):
+    engine = local_engine(EngineConfig(local_model_path="fake"))
+    stream = engine.stream_generation(regrapht_prompts(num_examples=1, per_example=1)[0], SamplingParams(max_tokens=64))
+    next(stream)
+    assert len(engine.llm.llm_engine.requests) == 1
+    stream.close()
+    # The unfinished request is aborted, freeing its KV cache blocks
+    assert len(engine.llm.llm_engine.requests) == 0
+    assert len(engine.queues) == 0
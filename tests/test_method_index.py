@@ -0,0 +1,63 @@
+from ReGraphT.ReGraph import ReGraph
+from ReGraphT.ReGraph.method_index import MethodIndex
+
+METHODS = {
+    "float4 vectorized loads": "load four floats per thread with float4",
+    "shared memory": "stage the tile in shared memory",
+    "grid stride loop": "loop over the array with a grid stride",
+    "fp16 arithmetic": "compute in half precision",
+    "loop unrolling": "unroll the inner loop",
+    "warp shuffle reduction": "reduce within a warp with shuffles",
+}
+
+
+def method_index() -> MethodIndex:
+    index = MethodIndex()
+    for name, description in METHODS.items():
+        index.add(name, description)
+    return index
+
+
+def test_spelling_variants_resolve_to_the_method():
+    index = method_index()
+    assert index.resolve("Grid-Stride Loops", "grid stride over the array") == ("yes", "grid stride loop")
+    assert index.resolve("loop unrollings") == ("yes", "loop unrolling")
+    assert index.resolve("shared_memory") == ("yes", "shared memory")
+
+
+def test_distinct_methods_with_similar_spellings_stay_apart():
+    index = method_index()
+    # Regression: these used to be relabeled to the nearest method
+    for name in ("float2 vectorized loads", "shared memory tiling", "bf16 arithmetic"):
+        existed, nearest = index.resolve(name)
+        assert existed != "yes", (name, nearest)
+    assert index.resolve("float2 vectorized loads")[0] == "ambiguous"
+    assert index.resolve("tensor core mma")[0] == "no"
+
+
+def test_added_methods_are_matched():
+    index = method_index()
+    assert "kernel fusion" not in index
+    index.add("kernel fusion", "fuse the two kernels")
+    index.add("kernel fusion", "added twice")
+    assert len(index) == len(METHODS) + 1
+    assert index.resolve("Kernel-Fusion") == ("yes", "kernel fusion")
+    assert index.query("kernel fusions", k=2)[0][0] == "kernel fusion"
+
+
+def test_norms_follow_the_weights_snapshot():
+    index = MethodIndex()
+    for i in range(40):
+        index.add(f"method {i} variant", "")
+        # Every norm, computed on add or by a refresh, is the one of the current weights snapshot
+        assert all(abs(norm - index.norm(index.ngrams(name))) < 1e-9 for name, norm in zip(index.names, index.norms))
+    # Weights were refreshed as the index grew, not on every add
+    assert 0 < index.weights_size < len(index)
+
+
+def test_from_regraph_describes_methods_by_their_examples():
+    re_graph = ReGraph()
+    re_graph.merge("k0", "code", [{"think": "", "method": "shared memory", "detail": "stage the tile", "code": "// a"}])
+    index = MethodIndex.from_regraph(re_graph)
+    assert index.names == ["init state", "shared memory"]
+    assert index.resolve("Shared-Memory", "stage the tile") == ("yes", "shared memory")
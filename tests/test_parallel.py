@@ -0,0 +1,102 @@
+import sys
+import json
+import functools
+
+import pytest
+
+from ReGraphT.executor import Executor, ParallelExecutor
+from ReGraphT.executor.base import EXECUTOR_REGISTRY
+from ReGraphT.reasoner import Reasoner
+
+
+class ReverseReasoner(Reasoner):
+    def __init__(self, resumed: set[int]=frozenset()):
+        """
+        Reverses the code of a kernel; raises on kernels that a resumed run must not run again.
+        """
+        super(ReverseReasoner, self).__init__(engine=None)
+        self.resumed = resumed
+
+    def optimize(self, kernel: dict, *args, **kwargs) -> dict:
+        if kernel['index'] in self.resumed:
+            raise RuntimeError(f"kernel {kernel['index']} ran again after resuming")
+        if kernel['kernel'] == "crash":
+            raise ValueError("unparsable kernel")
+        return {"index": kernel['index'], "code": kernel['kernel'][::-1]}
+
+
+def build_executor(resumed: set[int]=frozenset()) -> Executor:
+    return Executor(ReverseReasoner(resumed))
+
+
+# Lengths vary so that the longest-first dispatch reorders them
+KERNELS = [{"index": i, "kernel": "crash" if i == 5 else f"void k{i}() {{}}" + " " * (i * 7 % 11)} for i in range(12)]
+
+
+def test_parallel_report_matches_serial():
+    serial = Executor(ReverseReasoner()).run(KERNELS)
+    parallel = ParallelExecutor(functools.partial(build_executor), num_workers=3, mp_context='fork').run(KERNELS)
+    assert parallel == serial
+    assert parallel['failed'] == 1 and parallel['results'][5] is None
+    assert [result['index'] for result in parallel['results'] if result is not None] == [i for i in range(12) if i != 5]
+
+
+def test_resume_from_checkpoint(tmp_path):
+    results_path = str(tmp_path / "results.jsonl")
+    ParallelExecutor(functools.partial(build_executor), num_workers=2, results_path=results_path, mp_context='fork').run(KERNELS[:7])
+    with open(results_path, 'a') as f:
+        # A record torn by a crash
+        f.write('{"key": 7, "res')
+    # Completed kernels are not run again, the failed kernel 5 and the torn kernel 7 are
+    resumed = ParallelExecutor(
+        functools.partial(build_executor, resumed={0, 1, 2, 3, 4, 6}),
+        num_workers=2,
+        results_path=results_path,
+        mp_context='fork'
+    )
+    report = resumed.run(KERNELS)
+    assert report == Executor(ReverseReasoner()).run(KERNELS)
+    records = []
+    with open(results_path, 'r') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                pass
+    assert sorted(record['key'] for record in records if record['error'] is None) == [i for i in range(12) if i != 5]
+    assert [record['key'] for record in records if record['error'] is not None] == [5, 5]
+
+
+def test_run_builds_workers_from_arguments(stub_server, monkeypatch, tmp_path):
+    from ReGraphT import run
+
+    monkeypatch.setenv("OPENAI_API_KEY", "stub")
+    monkeypatch.setitem(EXECUTOR_REGISTRY, 'CUDAEval', Executor)
+    monkeypatch.setattr(sys, 'argv', [
+        'run', '--method', 'standard', '--engine', 'remote', '--base_url', stub_server.base_url, '--model', 'stub',
+        '--dataset', 'CUDAEval', '--local_dataset_path', 'unused', '--num_workers', '2',
+        '--results_path', str(tmp_path / "results.jsonl")
+    ])
+    args = run.parse_args()
+    executor = ParallelExecutor(
+        build_executor=functools.partial(run.build_executor, args),
+        num_workers=args.num_workers,
+        results_path=args.results_path,
+        mp_context='fork'
+    )
+    kernels = [{"name": f"k{i}", "index": i, "kernel": f"void k{i}() {{}}"} for i in range(6)]
+    report = executor.run(kernels)
+    assert report['completed'] == 6
+    assert [result['name'] for result in report['results']] == [kernel['name'] for kernel in kernels]
+    assert all(result['code'] == "// optimized" for result in report['results'])
+
+
+def test_results_path_required_with_workers(monkeypatch):
+    from ReGraphT import run
+
+    monkeypatch.setattr(sys, 'argv', [
+        'run', '--method', 'standard', '--engine', 'remote', '--dataset', 'CUDAEval',
+        '--local_dataset_path', 'unused', '--num_workers', '2'
+    ])
+    with pytest.raises(SystemExit):
+        run.parse_args()
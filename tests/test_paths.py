@@ -0,0 +1,89 @@
+import random
+
+from ReGraphT.ReGraph import ReGraph
+
+METHODS = [f"m{i}" for i in range(6)]
+
+
+def trajectories(num_trajectories: int, seed: int) -> list[list[str]]:
+    # Methods in a fixed order, so the graph is acyclic and `compute_paths` is exact
+    rng = random.Random(seed)
+    return [sorted(rng.sample(METHODS, rng.randint(1, 4))) for _ in range(num_trajectories)]
+
+
+def build(re_graph: ReGraph, methods_list: list[list[str]], offset: int=0):
+    for i, methods in enumerate(methods_list):
+        re_graph.merge(f"k{offset + i}", "code", [{"think": "", "method": method, "detail": "", "code": f"// {method}"} for method in methods])
+
+
+def brute_force(re_graph: ReGraph) -> tuple[list[float], list[list[float]]]:
+    """
+    Probabilities of every complete path and of every path to each node, enumerated exhaustively.
+    """
+    arrivals = [0] * len(re_graph.regraph_nodes)
+    for edge in re_graph.regraph_edges:
+        arrivals[edge.tgt] += len(edge.examples)
+    arrivals[0] += re_graph.init_state.support
+    top, to = [], [[] for _ in re_graph.regraph_nodes]
+
+    def walk(nodes: list[int], probability: float):
+        index = nodes[-1]
+        to[index].append(probability)
+        node = re_graph.regraph_nodes[index]
+        total = max(arrivals[index], node.support)
+        if total == 0:
+            return
+        if total > node.support and len(nodes) > 1:
+            top.append(probability * (total - node.support) / total)
+        for edge in node.out_edges:
+            walk(nodes + [edge.tgt], probability * len(edge.examples) / total)
+
+    walk([0], 1.0)
+    return sorted(top, reverse=True), [sorted(probabilities, reverse=True) for probabilities in to]
+
+
+def assert_paths_match(re_graph: ReGraph, k: int):
+    top, to = brute_force(re_graph)
+    paths = re_graph.get_paths(k)
+    assert [round(path['probability'], 9) for path in paths['top']] == [round(p, 9) for p in top[:k]]
+    for index, probabilities in enumerate(to):
+        assert [round(path['probability'], 9) for path in paths['to'][index]] == [round(p, 9) for p in probabilities[:k]]
+
+
+def test_paths_match_exhaustive_enumeration():
+    re_graph = ReGraph()
+    build(re_graph, trajectories(200, seed=0))
+    assert_paths_match(re_graph, k=5)
+    best = re_graph.most_supported_paths(1)[0]
+    assert best['nodes'][0] == 0 and best['support'] > 0
+
+
+def test_paths_recomputed_after_merge():
+    first, second = trajectories(100, seed=1), trajectories(60, seed=2)
+    re_graph = ReGraph()
+    build(re_graph, first)
+    before = re_graph.get_paths(4)
+    assert re_graph.get_paths(4) is before
+    build(re_graph, second, offset=len(first))
+    assert re_graph.paths_dirty
+    assert_paths_match(re_graph, k=4)
+    # The refreshed paths are those of a graph built from all trajectories at once
+    fresh = ReGraph()
+    build(fresh, first + second)
+    assert re_graph.get_paths(4) == fresh.get_paths(4)
+    # A trajectory through a new method changes the paths through it
+    build(re_graph, [["m0", "new"]] * 500, offset=1000)
+    assert re_graph.most_supported_paths(1)[0]['nodes'] == [0, re_graph.get_node("m0").index, re_graph.get_node("new").index]
+    assert_paths_match(re_graph, k=4)
+
+
+def test_paths_persisted_and_refreshed_after_load():
+    re_graph = ReGraph()
+    build(re_graph, trajectories(80, seed=3))
+    assert "paths" not in re_graph.to_graph()
+    paths = re_graph.get_paths(3)
+    loaded = ReGraph.from_graph(re_graph.to_graph())
+    assert loaded.paths == paths and not loaded.paths_dirty
+    build(loaded, trajectories(40, seed=4), offset=80)
+    assert "paths" not in loaded.to_graph()
+    assert_paths_match(loaded, k=3)
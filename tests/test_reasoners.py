@@ -0,0 +1,44 @@
+import json
+
+from ReGraphT.prompt import STANDARD_SYSTEM_PROMPT, COT_SYSTEM_PROMPT
+from ReGraphT.reasoner import StandardReasoner, CoTReasoner
+
+
+class Engine(object):
+    def __init__(self, generation: str):
+        self.generation = generation
+        self.prompts = []
+
+    def generate(self, prompts, config, **kwargs):
+        self.prompts.extend(prompts)
+        return [{"generation": self.generation} for _ in prompts]
+
+
+KERNEL = {"name": "scale", "index": 3, "kernel": "void scale(float* a) { a[0] *= 2.0f; }"}
+
+
+def test_standard_reasoner():
+    engine = Engine("```json\n" + json.dumps({"think": "one kernel", "code": "__global__ void scale() {}"}) + "\n```")
+    result = StandardReasoner(engine).optimize(KERNEL)
+    assert result == {"name": "scale", "index": 3, "think": "one kernel", "code": "__global__ void scale() {}"}
+    assert engine.prompts[0][0]['content'] == STANDARD_SYSTEM_PROMPT
+    assert json.loads(engine.prompts[0][1]['content']) == {"kernel": KERNEL['kernel']}
+
+
+def test_cot_reasoner_keeps_the_last_step():
+    steps = [
+        {"think": "", "method": "coalescing", "detail": "", "code": "// step 0"},
+        {"think": "", "method": "shared memory", "detail": "", "code": "// step 1"},
+    ]
+    engine = Engine("```json\n" + json.dumps(steps) + "\n```")
+    result = CoTReasoner(engine).optimize(KERNEL)
+    assert result['code'] == "// step 1"
+    assert [step['method'] for step in result['trajectory']] == ["coalescing", "shared memory"]
+    assert engine.prompts[0][0]['content'] == COT_SYSTEM_PROMPT
+
+
+def test_unparsable_generations():
+    assert StandardReasoner(Engine("no fence")).optimize(KERNEL)['code'] is None
+    assert StandardReasoner(Engine("```json\n[1, 2]\n```")).optimize(KERNEL)['code'] is None
+    result = CoTReasoner(Engine("```json\n{not json}\n```")).optimize(KERNEL)
+    assert result['code'] is None and result['trajectory'] == []
@@ -0,0 +1,90 @@
+import random
+
+from ReGraphT.ReGraph import ReGraph
+
+
+def trajectory(methods: list[str]) -> list[dict]:
+    return [{"think": "", "method": method, "detail": "", "code": f"// {method}"} for method in methods]
+
+
+def random_graph(num_trajectories: int, seed: int=0) -> ReGraph:
+    rng = random.Random(seed)
+    re_graph = ReGraph()
+    for i in range(num_trajectories):
+        methods = [f"m{rng.randrange(12)}" for _ in range(rng.randint(1, 5))]
+        re_graph.merge(f"k{i}", "code", trajectory(methods))
+    return re_graph
+
+
+def test_merge_reuses_nodes_and_edges():
+    re_graph = ReGraph()
+    re_graph.merge("k0", "code", trajectory(["tiling", "unrolling"]))
+    re_graph.merge("k1", "code", trajectory(["tiling", "shared memory"]))
+    re_graph.merge("k2", "code", trajectory(["tiling", "unrolling"]))
+    assert [node.name for node in re_graph.regraph_nodes] == ["init state", "tiling", "unrolling", "shared memory"]
+    assert len(re_graph.regraph_edges) == 3
+    tiling = re_graph.get_node("tiling")
+    assert len(re_graph.get_edge(0, tiling.index).examples) == 3
+    assert len(re_graph.get_edge(tiling.index, re_graph.get_node("unrolling").index).examples) == 2
+    assert re_graph.get_edge(re_graph.get_node("unrolling").index, tiling.index) is None
+
+
+def test_indices_match_scans():
+    re_graph = random_graph(500)
+    for node in re_graph.regraph_nodes:
+        assert re_graph.get_node(node.name) is next(other for other in re_graph.regraph_nodes if other.name == node.name)
+        assert re_graph.get_state(node.index) is node
+        for edge in node.out_edges:
+            assert re_graph.get_edge(edge.src, edge.tgt) is edge
+    pairs = {(edge.src, edge.tgt) for edge in re_graph.regraph_edges}
+    assert len(pairs) == len(re_graph.regraph_edges)
+    assert re_graph.get_node("missing") is None
+    assert re_graph.get_state(len(re_graph.regraph_nodes)) is None
+
+
+def test_indices_rebuilt_on_load():
+    re_graph = random_graph(200)
+    loaded = ReGraph.from_graph(re_graph.to_graph(inline=True))
+    for node in re_graph.regraph_nodes:
+        assert loaded.get_node(node.name).index == node.index
+    for edge in re_graph.regraph_edges:
+        assert loaded.get_edge(edge.src, edge.tgt).examples == edge.examples
+    loaded.merge("k", "code", trajectory(["m0", "new method"]))
+    assert loaded.get_node("new method").index == len(re_graph.regraph_nodes)
+
+
+def adjacency(re_graph: ReGraph) -> tuple[list, list]:
+    """
+    Nodes with their in/out edges as positions in `regraph_edges`, and the edges, to compare object graphs.
+    """
+    positions = {id(edge): i for i, edge in enumerate(re_graph.regraph_edges)}
+    nodes = [
+        (node.index, node.name, [positions[id(edge)] for edge in node.in_edges], [positions[id(edge)] for edge in node.out_edges])
+        for node in re_graph.regraph_nodes
+    ]
+    return nodes, [(edge.src, edge.tgt, edge.examples) for edge in re_graph.regraph_edges]
+
+
+def test_from_graph_round_trip():
+    re_graph = random_graph(300)
+    assert adjacency(ReGraph.from_graph(re_graph.to_graph(inline=True))) == adjacency(re_graph)
+    assert adjacency(ReGraph.from_graph(re_graph.to_graph())) == adjacency(re_graph)
+
+
+def test_from_graph_duplicate_edges():
+    graph = {
+        "node": [
+            {"index": 0, "name": "init state", "in": [], "out": [1]},
+            {"index": 1, "name": "tiling", "in": [0], "out": []},
+        ],
+        "edge": [
+            {"src": 0, "tgt": 1, "examples": [{"name": "first"}]},
+            {"src": 0, "tgt": 1, "examples": [{"name": "second"}]},
+        ],
+    }
+    re_graph = ReGraph.from_graph(graph)
+    first, second = re_graph.regraph_edges
+    # An `in` entry wires the first of the duplicates, an `out` entry all of them in edge-table order
+    assert re_graph.regraph_nodes[1].in_edges == [first] and re_graph.regraph_nodes[1].in_edges[0] is first
+    assert [id(edge) for edge in re_graph.regraph_nodes[0].out_edges] == [id(first), id(second)]
+    assert re_graph.get_edge(0, 1) is first
@@ -0,0 +1,58 @@
+import json
+import time
+
+import openai
+import pytest
+
+from ReGraphT.engine import EngineConfig, SamplingParams
+from ReGraphT.engine.remote_engine import RemoteEngine
+from ReGraphT.prompt import CUDA_REASONING_SYSTEM_PROMPT
+from stub_server import StubServer, respond
+
+
+@pytest.fixture(autouse=True)
+def api_key(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "stub")
+
+
+@pytest.fixture
+def slow_server():
+    # A server per test, so that each engine registers its own scheduler for the endpoint
+    server = StubServer(latency=0.1).start()
+    yield server
+    server.stop()
+
+
+def prompts(num_prompts: int) -> list[list[dict]]:
+    return [
+        [{"role": "system", "content": CUDA_REASONING_SYSTEM_PROMPT}, {"role": "user", "content": json.dumps({"kernel": f"k{i}"})}]
+        for i in range(num_prompts)
+    ]
+
+
+def test_generate_preserves_order(stub_server):
+    engine = RemoteEngine(EngineConfig(base_url=stub_server.base_url, max_concurrency=8))
+    batch = prompts(32)
+    outputs = engine.generate(batch, SamplingParams(model="stub"))
+    assert [output['prompts'] for output in outputs] == batch
+    assert [output['generation'] for output in outputs] == [respond(messages) for messages in batch]
+    assert engine.generate(batch[0], SamplingParams(model="stub"))[0]['generation'] == outputs[0]['generation']
+
+
+def test_generate_dispatches_concurrently(slow_server):
+    engine = RemoteEngine(EngineConfig(base_url=slow_server.base_url, max_concurrency=8))
+    start = time.perf_counter()
+    engine.generate(prompts(16), SamplingParams(model="stub"))
+    elapsed = time.perf_counter() - start
+    # Two waves of 8 requests instead of 16 requests one after another
+    assert elapsed < 16 * slow_server.latency / 3
+    assert slow_server.requests == 16
+
+
+def test_request_timeout(slow_server):
+    slow_server.latency = 2.0
+    engine = RemoteEngine(EngineConfig(base_url=slow_server.base_url, request_timeout=0.2, max_retries=0))
+    start = time.perf_counter()
+    with pytest.raises(openai.APITimeoutError):
+        engine.generate(prompts(2), SamplingParams(model="stub"))
+    assert time.perf_counter() - start < 1.0
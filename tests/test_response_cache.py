@@ -0,0 +1,148 @@
+from ReGraphT.engine import EngineConfig, SamplingParams
+from ReGraphT.engine.cached_engine import CachedEngine
+from ReGraphT.utils import ResponseCache, LRUCache
+
+
+class CountingEngine(object):
+    """
+    A stand-in for an InferenceEngine answering every prompt with its last message, counting requests.
+    """
+    def __init__(self):
+        self.config = EngineConfig(base_url="test://counting")
+        self.prompts = []
+
+    def generate(self, prompts, config, **kwargs):
+        outputs = []
+        for messages in prompts:
+            self.prompts.append(messages)
+            outputs.append({'generation': f"{messages[-1]['content']} #{len(self.prompts)}"})
+        return outputs
+
+    def stream_generation(self, prompt, config, **kwargs):
+        yield from self.generate([prompt], config)[0]['generation'].split(" ")
+
+
+def prompt(content: str) -> list[dict]:
+    return [{'role': 'system', 'content': 'optimize'}, {'role': 'user', 'content': content}]
+
+
+def test_deterministic_requests_hit_the_cache():
+    engine = CountingEngine()
+    cached = CachedEngine(engine)
+    firsts = []
+    for config in (SamplingParams(temperature=0), SamplingParams(temperature=0.7, seed=1)):
+        firsts.append(cached.generate([prompt("a"), prompt("b")], config))
+        # Whitespace and line endings do not change the key
+        again = cached.generate([prompt("b\r\n"), prompt("  a")], config)
+        assert again == firsts[-1][::-1]
+    # The sampling parameters are part of the key
+    assert firsts[0] != firsts[1]
+    assert len(engine.prompts) == 4
+    stats = cached.stats()
+    assert stats['hits'] == 4 and stats['misses'] == 4 and stats['hit_rate'] == 0.5
+    assert stats['bypassed'] == 0 and stats['entries'] == 4
+    # A single conversation is accepted too
+    assert cached.generate(prompt("a"), SamplingParams(temperature=0)) == firsts[0][:1]
+
+
+def test_sampled_requests_bypass_the_cache():
+    engine = CountingEngine()
+    cached = CachedEngine(engine)
+    config = SamplingParams(temperature=0.7)
+    outputs = [cached.generate([prompt("a")], config)[0]['generation'] for _ in range(3)]
+    assert len(set(outputs)) == 3 and len(engine.prompts) == 3
+    assert cached.stats()['bypassed'] == 3 and cached.stats()['entries'] == 0
+    # Unless only deterministic requests are cached
+    cached = CachedEngine(engine, deterministic_only=False)
+    cached.generate([prompt("a")], config)
+    assert cached.generate([prompt("a")], config) == cached.generate([prompt("a")], config)
+    assert len(engine.prompts) == 4 and cached.bypassed == 0
+
+
+def test_identical_prompts_of_a_batch_are_sent_once():
+    engine = CountingEngine()
+    cached = CachedEngine(engine)
+    outputs = cached.generate([prompt("a"), prompt("b"), prompt("a ")], SamplingParams(temperature=0))
+    assert len(engine.prompts) == 2
+    assert outputs[0] == outputs[2] != outputs[1]
+    # Duplicates are neither hits nor misses
+    assert cached.misses == 2 and cached.hits == 0
+
+
+def test_unserializable_outputs_are_not_cached():
+    engine = CountingEngine()
+    engine.generate = lambda prompts, config, **kwargs: [{'generation': "x", 'logprobs': object()} for _ in prompts]
+    cached = CachedEngine(engine)
+    cached.generate([prompt("a")], SamplingParams(temperature=0))
+    assert cached.uncached == 1 and len(cached.cache) == 0
+
+
+def test_stream_replays_cached_generations():
+    engine = CountingEngine()
+    cached = CachedEngine(engine)
+    config = SamplingParams(temperature=0)
+    # A stream is never stored, since it may be stopped early
+    assert "".join(cached.stream_generation(prompt("a b"), config)) == "ab#1"
+    assert len(cached.cache) == 0
+    generation = cached.generate([prompt("a b")], config)[0]['generation']
+    assert list(cached.stream_generation(prompt("a b"), config)) == [generation]
+    assert len(engine.prompts) == 2 and cached.hits == 1
+
+
+def test_lru_cache_evicts_by_entries():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+    # b is the least recently used
+    assert cache.get("b") is None and cache.get("a") == "1" and cache.get("c") == "3"
+    cache.put("a", "11")
+    assert len(cache) == 2 and cache.size == 3 and cache.evictions == 1
+    assert cache.hits == 3 and cache.misses == 1
+
+
+def test_lru_cache_evicts_by_bytes():
+    cache = LRUCache(max_entries=None, max_bytes=10)
+    # Sizes are counted in UTF-8 bytes, not characters
+    cache.put("a", "é" * 4)
+    assert cache.size == 8
+    cache.put("b", "xyz")
+    assert cache.get("a") is None and cache.size == 3 and cache.evictions == 1
+    # A value larger than the budget is still kept on its own
+    cache.put("c", "x" * 20)
+    assert len(cache) == 1 and cache.get("c") == "x" * 20 and cache.size == 20
+    cache.close()
+    assert len(cache) == 0 and cache.size == 0
+
+
+def test_response_cache_persists_and_evicts(tmp_path):
+    path = str(tmp_path / "responses.db")
+    cache = ResponseCache(path, max_bytes=10)
+    key = ResponseCache.make_key(kernel=0, prompt={'b': 1, 'a': 2})
+    assert key == ResponseCache.make_key(prompt={'a': 2, 'b': 1}, kernel=0)
+    cache.put(key, "é" * 3)
+    cache.put("other", "abc")
+    assert cache.size == 9 and cache.get(key) == "é" * 3
+    cache.put("last", "xy")
+    # "other" is the least recently used entry
+    assert cache.get("other") is None and cache.evictions == 1 and cache.size == 8
+    cache.close()
+
+    reopened = ResponseCache(path)
+    assert len(reopened) == 2 and reopened.size == 8
+    assert reopened.get(key) == "é" * 3
+    reopened.close()
+
+
+def test_cached_engine_on_disk(tmp_path):
+    engine = CountingEngine()
+    config = SamplingParams(temperature=0, seed=3)
+    cached = CachedEngine(engine, ResponseCache(str(tmp_path / "responses.db")))
+    first = cached.generate([prompt("a")], config)
+    cached.cache.close()
+    # A new run reuses the responses of the previous one
+    cached = CachedEngine(CountingEngine(), ResponseCache(str(tmp_path / "responses.db")))
+    assert cached.generate([prompt("a")], config) == first
+    assert cached.engine.prompts == [] and cached.stats()['hits'] == 1
+    cached.cache.close()
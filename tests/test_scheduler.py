@@ -0,0 +1,102 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from ReGraphT.engine import Scheduler, TokenBucket
+
+
+class APIStatusError(Exception):
+    def __init__(self, status_code: int, headers: dict=None):
+        super(APIStatusError, self).__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+class RateLimitError(Exception):
+    pass
+
+
+def failing(errors: list[Exception], result: str="ok"):
+    """
+    A request raising the given errors in turn, then returning `result`.
+    """
+    calls = []
+
+    def fn():
+        calls.append(time.monotonic())
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+    return fn, calls
+
+
+def test_retry_after_is_honored():
+    scheduler = Scheduler(max_retries=3, backoff_base=10.0)
+    fn, calls = failing([APIStatusError(429, {'retry-after': '0.2'})])
+    assert scheduler.call(fn) == "ok"
+    assert len(calls) == 2 and calls[1] - calls[0] >= 0.2
+    # The server's delay replaces the 10 s backoff
+    assert calls[1] - calls[0] < 1.0
+    assert scheduler.last_retries() == 1
+    stats = scheduler.stats()
+    assert stats['retries'] == 1 and stats['requests'] == 2 and stats['failures'] == 0
+    assert stats['wait_time'] == pytest.approx(0.2)
+
+
+def test_backoff_without_retry_after():
+    scheduler = Scheduler(max_retries=5, backoff_base=0.01, backoff_max=0.02)
+    fn, calls = failing([APIStatusError(503, {'retry-after': 'soon'}), RateLimitError(), TimeoutError()])
+    assert scheduler.call(fn) == "ok"
+    assert len(calls) == 4 and scheduler.last_retries() == 3
+    assert scheduler.stats()['wait_time'] <= 3 * 0.02
+
+
+def test_non_retryable_and_exhausted_errors_are_raised():
+    scheduler = Scheduler(max_retries=2, backoff_base=0.001)
+    fn, calls = failing([APIStatusError(400)])
+    with pytest.raises(APIStatusError):
+        scheduler.call(fn)
+    assert len(calls) == 1
+    fn, calls = failing([APIStatusError(500)] * 5)
+    with pytest.raises(APIStatusError):
+        scheduler.call(fn)
+    assert len(calls) == 3
+    assert scheduler.stats()['failures'] == 2 and scheduler.stats()['in_flight'] == 0
+
+
+def test_token_bucket_waits_for_its_debt():
+    bucket = TokenBucket(rate_per_minute=60, capacity=2)
+    assert bucket.reserve(1) == 0.0 and bucket.reserve(1) == 0.0
+    # One request a second: the third waits about a second, the fourth two
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+    assert bucket.reserve(1) == pytest.approx(2.0, abs=0.05)
+    bucket.refund(3)
+    assert bucket.reserve(1) == 0.0
+
+
+def test_request_budget_paces_calls():
+    scheduler = Scheduler(requests_per_minute=600)
+    scheduler.request_bucket = TokenBucket(600, capacity=1)
+    start = time.monotonic()
+    for _ in range(4):
+        scheduler.call(lambda: None)
+    # One request at once, then one every 0.1 s
+    assert time.monotonic() - start == pytest.approx(0.3, abs=0.1)
+
+
+def test_token_usage_is_refunded():
+    scheduler = Scheduler(tokens_per_minute=1000)
+    scheduler.call(lambda: SimpleNamespace(total_tokens=100), tokens=600, usage=lambda response: response.total_tokens)
+    assert scheduler.token_bucket.balance == pytest.approx(900, abs=1)
+    # Without usage the estimate is kept
+    scheduler.call(lambda: None, tokens=600)
+    assert scheduler.token_bucket.balance == pytest.approx(300, abs=1)
+
+
+def test_shared_schedulers():
+    first = Scheduler.shared("test://shared", requests_per_minute=60)
+    assert Scheduler.shared("test://shared", requests_per_minute=60) is first
+    assert Scheduler.shared("test://other", requests_per_minute=60) is not first
+    with pytest.raises(ValueError, match="requests_per_minute=60"):
+        Scheduler.shared("test://shared", requests_per_minute=120)
@@ -0,0 +1,84 @@
+import math
+import random
+
+from ReGraphT.ReGraph import ReGraph
+from ReGraphT.ReGraph.ReGraph import SUCCESSOR_SCORES
+
+
+def trajectory(methods: list[str]) -> list[dict]:
+    return [{"think": "", "method": method, "detail": "", "code": f"// {method}"} for method in methods]
+
+
+def random_graph(num_trajectories: int, seed: int=0) -> ReGraph:
+    rng = random.Random(seed)
+    re_graph = ReGraph()
+    for i in range(num_trajectories):
+        re_graph.merge(f"k{i}", "code", trajectory([f"m{rng.randrange(10)}" for _ in range(rng.randint(1, 5))]))
+    return re_graph
+
+
+def test_probabilities_sum_to_one():
+    re_graph = random_graph(400)
+    for node in re_graph.regraph_nodes:
+        if len(node.out_edges) == 0:
+            assert node.support == 0
+            continue
+        assert node.support == sum(len(edge.examples) for edge in node.out_edges)
+        assert math.isclose(sum(re_graph.transition_probability(edge) for edge in node.out_edges), 1.0)
+
+
+def test_rankings_match_scores():
+    re_graph = random_graph(400)
+    for node in re_graph.regraph_nodes:
+        by_support = re_graph.top_k_successors(node, k=len(node.out_edges))
+        assert [score for _, score in by_support] == sorted((len(edge.examples) for edge in node.out_edges), reverse=True)
+        by_probability = re_graph.top_k_successors(node.index, k=3, score='probability')
+        assert all(score == re_graph.transition_probability(edge) for edge, score in by_probability)
+        assert [edge for edge, _ in by_probability] == [edge for edge, _ in by_support[:3]]
+    # The current state is ranked by default
+    assert re_graph.top_k_successors(k=1) == re_graph.top_k_successors(re_graph.init_state, k=1)
+
+
+def test_cache_invalidated_by_merge():
+    re_graph = ReGraph()
+    re_graph.merge("k0", "code", trajectory(["tiling", "unrolling"]))
+    re_graph.merge("k1", "code", trajectory(["tiling", "shared memory"]))
+    re_graph.merge("k2", "code", trajectory(["fusion"]))
+    tiling = re_graph.get_node("tiling")
+    assert re_graph.top_k_successors(tiling, k=1, score='probability')[0][1] == 0.5
+    re_graph.top_k_successors(tiling, k=1)
+    re_graph.top_k_successors(re_graph.get_node("fusion"), k=1)
+    assert set(re_graph.successor_cache[tiling.index]) == {'support', 'probability'}
+    # A merge through tiling drops its rankings and keeps those of untouched nodes
+    re_graph.merge("k3", "code", trajectory(["tiling", "shared memory"]))
+    assert tiling.index not in re_graph.successor_cache
+    assert re_graph.get_node("fusion").index in re_graph.successor_cache
+    edge, probability = re_graph.top_k_successors(tiling, k=1, score='probability')[0]
+    assert re_graph.regraph_nodes[edge.tgt].name == "shared memory" and math.isclose(probability, 2 / 3)
+    assert re_graph.top_k_successors(tiling, k=1)[0][1] == 2
+
+
+def test_cache_invalidated_by_depth_update(monkeypatch):
+    monkeypatch.setitem(SUCCESSOR_SCORES, 'depth', lambda re_graph, edge: re_graph.regraph_nodes[edge.tgt].depth)
+    re_graph = ReGraph()
+    re_graph.merge("k0", "code", trajectory(["tiling", "unrolling"]))
+    re_graph.merge("k1", "code", trajectory(["tiling", "fusion", "shared memory"]))
+    re_graph.merge("k2", "code", trajectory(["fusion", "unrolling"]))
+    fusion = re_graph.get_node("fusion")
+    assert {re_graph.regraph_nodes[edge.tgt].name: score for edge, score in re_graph.top_k_successors(fusion, k=2, score='depth')} == \
+        {"unrolling": 2, "shared memory": 2}
+    # Reaching shared memory straight from the initial state does not pass through fusion,
+    # yet fusion's ranking by the depth of its successors is refreshed
+    re_graph.merge("k3", "code", trajectory(["shared memory"]))
+    assert fusion.index not in re_graph.successor_cache
+    assert {re_graph.regraph_nodes[edge.tgt].name: score for edge, score in re_graph.top_k_successors(fusion, k=2, score='depth')} == \
+        {"unrolling": 2, "shared memory": 1}
+
+
+def test_compute_statistics_matches_incremental():
+    re_graph = random_graph(300, seed=1)
+    incremental = [(node.support, node.depth) for node in re_graph.regraph_nodes]
+    re_graph.top_k_successors(0, k=2)
+    re_graph.compute_statistics()
+    assert [(node.support, node.depth) for node in re_graph.regraph_nodes] == incremental
+    assert re_graph.successor_cache == {}
@@ -0,0 +1,113 @@
+import re
+import json
+import itertools
+
+from ReGraphT.ReGraph import ReGraph
+from ReGraphT.reasoner import TranspositionTable, ReGraphTMCGSReasoner
+from ReGraphT.utils import LRUCache
+
+METHODS = ["tiling", "unrolling", "shared memory"]
+
+
+def commuting_graph() -> ReGraph:
+    """
+    Every order of the methods, so that a state is reached through several paths.
+    """
+    re_graph = ReGraph()
+    for i, methods in enumerate(itertools.permutations(METHODS)):
+        re_graph.merge(f"k{i}", "int kernel = 0;", [
+            {"think": "", "method": method, "detail": "", "code": f"int {method.replace(' ', '_')} = 1;"} for method in methods
+        ])
+    return re_graph
+
+
+class CommutingEngine(object):
+    """
+    Applies a method by adding its statement, so the code depends on the set of applied methods only.
+    """
+    def __init__(self):
+        self.generations = 0
+
+    def generate(self, prompts, config, **kwargs):
+        outputs = []
+        for prompt in prompts:
+            user = json.loads(prompt[1]['content'])
+            methods = set(re.findall(r'int (\w+) = 1;', user['code'])) | {user['method'].replace(' ', '_')}
+            code = "int kernel = 0;\n" + "\n".join(f"int {method} = 1;" for method in sorted(methods))
+            outputs.append({"generation": "```json\n" + json.dumps({"think": "", "code": code}) + "\n```"})
+        self.generations += len(prompts)
+        return outputs
+
+
+class Evaluator(object):
+    def __init__(self):
+        self.codes = []
+
+    def __call__(self, kernel: dict, code: str) -> float:
+        self.codes.append(code)
+        return float(code.count(" = 1;"))
+
+
+def test_equivalent_codes_share_an_entry():
+    table = TranspositionTable()
+    table.update(1, "a[i] = b[i] + 1; // first", 1.0)
+    entry = table.update(1, "a[i]   =  b[i]+1;", 0.5)
+    assert entry.visits == 2 and entry.value == 0.75
+    assert table.get(2, "a[i] = b[i] + 1;") is None
+    assert table.get(1, "/* same */ a[i] = b[i] + 1;") is entry
+    assert table.stats()['lookups'] == 2 and table.stats()['hits'] == 1
+
+
+def test_cached_reward_evaluates_once():
+    calls = []
+    table = TranspositionTable()
+    assert table.cached_reward(1, "x = 1;", lambda: calls.append(1) or 2.0) == 2.0
+    assert table.cached_reward(1, "x  =  1; // again", lambda: calls.append(1) or 3.0) == 2.0
+    assert len(calls) == 1
+    assert table.stats()['reward_evaluations'] == 1 and table.stats()['reward_hits'] == 1
+
+
+def test_reward_store_outlives_eviction():
+    store = LRUCache(max_entries=None)
+    table = TranspositionTable(max_entries=1, reward_store=store)
+    table.cached_reward(1, "x = 1;", lambda: 2.0)
+    table.cached_reward(2, "y = 1;", lambda: 1.0)
+    assert len(table) == 1 and table.get(1, "x = 1;") is None
+    assert table.cached_reward(1, "x = 1;", lambda: 5.0) == 2.0
+    # Another table, e.g. of a later run, reads the rewards from the store
+    assert TranspositionTable(reward_store=store).cached_reward(2, "y = 1;", lambda: 5.0) == 1.0
+
+
+def test_merged_states_skip_repeated_evaluations():
+    kernel = {"name": "k", "index": 0, "kernel": "int kernel = 0;"}
+    results = {}
+    for merge_states in (False, True):
+        engine, evaluator = CommutingEngine(), Evaluator()
+        reasoner = ReGraphTMCGSReasoner(
+            engine, commuting_graph(), simulations=60, branching=3, max_depth=3, evaluate=evaluator, merge_states=merge_states
+        )
+        results[merge_states] = (reasoner.optimize(kernel), engine, evaluator)
+
+    tree, tree_engine, tree_evaluator = results[False]
+    graph, graph_engine, graph_evaluator = results[True]
+    # Without merging every simulation evaluates its leaf, even a code it has evaluated before
+    assert len(tree_evaluator.codes) == 60
+    assert len(set(tree_evaluator.codes)) < len(tree_evaluator.codes)
+    # With merging a state is evaluated once: 3 + 6 + 3 (node, code) states for three commuting methods
+    assert len(graph_evaluator.codes) == graph['search']['reward_evaluations'] <= 12
+    assert graph['search']['reward_hits'] > 0
+    assert graph_engine.generations <= tree_engine.generations
+    assert graph['reward'] == tree['reward'] == 3.0
+    assert len(graph['trajectory']) == 3
+
+
+def test_shared_table_reuses_rewards_across_searches():
+    kernel = {"name": "k", "index": 0, "kernel": "int kernel = 0;"}
+    table = TranspositionTable()
+    evaluator = Evaluator()
+    reasoner = ReGraphTMCGSReasoner(CommutingEngine(), commuting_graph(), simulations=30, max_depth=3, evaluate=evaluator, table=table)
+    first = reasoner.optimize(kernel)
+    evaluations = len(evaluator.codes)
+    second = reasoner.optimize(kernel)
+    assert len(evaluator.codes) == evaluations
+    assert second['reward'] == first['reward']